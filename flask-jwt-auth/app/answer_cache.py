@@ -0,0 +1,184 @@
+import hashlib
+import threading
+import time
+import numpy as np
+from .db import get_connection
+from .quotes import get_snapshot
+from .vector_index import use_local_index, get_local_index
+from config import Config
+
+# -----------------------------
+# Semantic answer cache
+# -----------------------------
+# Near-identical questions ("is RELIANCE a buy today?" / "Is Reliance a buy
+# today") get the stored answer instead of a new completion. Entries are
+# (unit-normalized question embedding, answer, data version). A lookup is one
+# matrix-vector product over the live entries of the current version; the
+# best match is a hit when its cosine similarity reaches
+# ANSWER_CACHE_THRESHOLD and it is younger than ANSWER_CACHE_TTL. The data
+# version combines a digest of the stock_data snapshot and the size of
+# stock_documents, so an answer is never served after the data behind it moved.
+# When full, the least recently used entry is replaced.
+
+
+def _unit(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class CacheHit:
+    def __init__(self, answer, similarity, age, saved_seconds):
+        self.answer = answer
+        self.similarity = similarity
+        self.age = age
+        self.saved_seconds = saved_seconds
+
+
+class SemanticCache:
+    def __init__(self, capacity, dim, threshold, ttl):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._used = np.zeros(capacity, dtype=bool)
+        self._created = np.zeros(capacity)
+        self._last_used = np.zeros(capacity)
+        self._answers = [None] * capacity
+        # Seconds the original answer took to produce, i.e. what a hit saves
+        self._cost = np.zeros(capacity)
+        # Only entries of the latest data version seen are kept
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stores": 0,
+            "evictions": 0,
+            "saved_seconds_total": 0.0,
+            "hit_similarity_total": 0.0,
+        }
+
+    def _switch_version(self, version):
+        if version != self._version:
+            # Entries of older versions can never hit again
+            self._used[:] = False
+            self._answers = [None] * self.capacity
+            self._version = version
+
+    def lookup(self, embedding, version):
+        """CacheHit for the closest stored question of this version, or None."""
+        query = _unit(embedding)
+        now = time.time()
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._switch_version(version)
+            live = np.flatnonzero(self._used)
+            if len(live):
+                fresh = now - self._created[live] < self.ttl
+                expired = live[~fresh]
+                if len(expired):
+                    self._used[expired] = False
+                    self._stats["expired"] += len(expired)
+                live = live[fresh]
+            if len(live):
+                similarities = self._vectors[live] @ query
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                if similarity >= self.threshold:
+                    slot = live[best]
+                    cost = float(self._cost[slot])
+                    self._last_used[slot] = now
+                    self._stats["hits"] += 1
+                    self._stats["saved_seconds_total"] += cost
+                    self._stats["hit_similarity_total"] += similarity
+                    return CacheHit(self._answers[slot], similarity, now - float(self._created[slot]), cost)
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, embedding, answer, version, cost_seconds):
+        now = time.time()
+        with self._lock:
+            if self.capacity == 0 or version != self._version:
+                # The data moved while this answer was generated
+                return
+            empty = np.flatnonzero(~self._used)
+            if len(empty):
+                slot = int(empty[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._stats["evictions"] += 1
+            self._vectors[slot] = _unit(embedding)
+            self._used[slot] = True
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._answers[slot] = answer
+            self._cost[slot] = cost_seconds
+            self._stats["stores"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = int(np.count_nonzero(self._used))
+        stats["capacity"] = self.capacity
+        stats["threshold"] = self.threshold
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["hit_similarity_avg"] = stats["hit_similarity_total"] / stats["hits"] if stats["hits"] else 0.0
+        return stats
+
+
+# -----------------------------
+# Data version
+# -----------------------------
+_documents_version = None
+_documents_checked = 0.0
+_documents_lock = threading.Lock()
+
+
+def _count_documents():
+    if use_local_index():
+        return len(get_local_index("stock_documents"))
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*), coalesce(max(id), 0) FROM stock_documents")
+            return tuple(cur.fetchone())
+
+
+def documents_version():
+    """Size of stock_documents, re-read at most every ANSWER_CACHE_DOCUMENTS_CHECK seconds."""
+    global _documents_version, _documents_checked
+    if time.monotonic() - _documents_checked < Config.ANSWER_CACHE_DOCUMENTS_CHECK:
+        return _documents_version
+    with _documents_lock:
+        if time.monotonic() - _documents_checked >= Config.ANSWER_CACHE_DOCUMENTS_CHECK:
+            _documents_version = _count_documents()
+            _documents_checked = time.monotonic()
+    return _documents_version
+
+
+def quotes_version():
+    """Digest of the stock_data snapshot content, computed once per snapshot."""
+    snapshot = get_snapshot()
+    return snapshot.encoded(("digest",), lambda: hashlib.blake2b(snapshot.rows_json, digest_size=16).hexdigest())
+
+
+def data_version():
+    return quotes_version(), documents_version()
+
+
+answer_cache = SemanticCache(
+    Config.ANSWER_CACHE_SIZE,
+    Config.EMBED_DIM,
+    Config.ANSWER_CACHE_THRESHOLD,
+    Config.ANSWER_CACHE_TTL,
+)
+
+
+def cache_enabled():
+    return Config.ANSWER_CACHE_SIZE > 0
+
+
+def answer_cache_stats():
+    return dict(answer_cache.stats(), enabled=cache_enabled())
@@ -0,0 +1,512 @@
+import asyncio
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from . import create_app, CORS_ORIGINS
+from .async_clients import AsyncClients
+from .answer_cache import answer_cache
+from .auth import record_chart
+from .chat import pipeline as chat_pipeline, StageTimer, sse_event, cache_metadata, record_stream
+from .llm import build_prompt
+from .marketdata import (
+    get_market_client, MarketstackError, slice_series, find_latest_row,
+    AsyncSingleFlight, chart_cache, chart_cache_ttl, chart_symbol
+)
+from .metrics import CHART_REQUESTS, request_scope, observe_request
+from .notification_hub import async_notification_stream
+from config import Config
+
+# -----------------------------
+# Async serving mode
+# -----------------------------
+# An ASGI application (run with `uvicorn asgi:application`). The endpoints
+# that spend their time waiting on Ollama, OpenAI, Marketstack and Postgres
+# (/auth/chat, /auth/chat/stream, /auth/api/chart) are served as coroutines on
+# one event loop through the pooled clients in async_clients.py, so a slow
+# completion holds a socket and a coroutine instead of a worker thread. The
+# never-ending /auth/notifications/stream is served on the loop as well, fed
+# by the process's notification hub. Every other route goes to the unchanged
+# Flask app on a pool of ASYNC_WSGI_THREADS threads; a request there holds a
+# thread until its response is finished, so at most that many Flask requests
+# run at once and long-lived responses must not be left on that path.
+#
+# The answer cache, chart cache, chat stats and /metrics are shared with the
+# Flask code paths, so both modes report the same series.
+
+
+# -----------------------------
+# Requests and responses
+# -----------------------------
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+class AsyncRequest:
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query_string = scope.get("query_string", b"").decode("latin-1")
+        self.headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        self.args = {key: values[0] for key, values in parse_qs(self.query_string).items()}
+        self.body = body
+
+    @property
+    def full_path(self):
+        return f"{self.path}?{self.query_string}" if self.query_string else self.path
+
+    def json(self):
+        try:
+            payload = json.loads(self.body or b"null")
+        except ValueError:
+            return None
+        return payload if isinstance(payload, dict) else None
+
+
+def cors_headers(request):
+    """What flask_cors adds for an allowed origin; preflights are answered by the Flask app."""
+    origin = request.headers.get("origin")
+    if origin not in CORS_ORIGINS:
+        return []
+    return [
+        (b"access-control-allow-origin", origin.encode("latin-1")),
+        (b"access-control-allow-credentials", b"true"),
+        (b"vary", b"Origin"),
+    ]
+
+
+async def send_json(send, request, status, payload):
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers + cors_headers(request)})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_events(send, request, events):
+    headers = [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]
+    await send({"type": "http.response.start", "status": 200, "headers": headers + cors_headers(request)})
+    async for event in events:
+        await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+# -----------------------------
+# Flask app on a thread pool
+# -----------------------------
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1")
+        if name == "content-length":
+            key = "CONTENT_LENGTH"
+        elif name == "content-type":
+            key = "CONTENT_TYPE"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WsgiBridge:
+    """
+    Run a WSGI app for ASGI requests on its own thread pool, streaming the response.
+
+    asgiref's WsgiToAsgi would run every request on one shared thread; here
+    each request gets a pool thread and its chunks are handed to the event
+    loop as they are produced, so streamed responses keep working. A client
+    that disconnects stops the iteration at the next chunk. Requests beyond
+    the pool size wait for a free thread.
+    """
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    def _run(self, environ, push, disconnected):
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [{
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+            }]
+            return lambda data: push({"type": "http.response.body", "body": data, "more_body": True})
+
+        sent_start = False
+        try:
+            iterable = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if disconnected.is_set():
+                        break
+                    if not sent_start:
+                        push(started[0])
+                        sent_start = True
+                    if chunk:
+                        push({"type": "http.response.body", "body": chunk, "more_body": True})
+                if not sent_start:
+                    push(started[0])
+                    sent_start = True
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()
+        except Exception as e:
+            print(f"WSGI request failed: {e}")
+            if not sent_start:
+                push({"type": "http.response.start", "status": 500, "headers": [(b"content-type", b"text/plain")]})
+                push({"type": "http.response.body", "body": b"Internal Server Error", "more_body": True})
+        finally:
+            push(None)
+
+    async def __call__(self, scope, body, receive, send):
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        disconnected = threading.Event()
+
+        def push(message):
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+        watcher.add_done_callback(lambda _: disconnected.set())
+        loop.run_in_executor(self.executor, self._run, build_environ(scope, body), push, disconnected)
+        try:
+            while True:
+                message = await messages.get()
+                if message is None:
+                    break
+                await send(message)
+            await send({"type": "http.response.body", "body": b""})
+        except OSError:
+            # The client went away mid-response
+            pass
+        finally:
+            disconnected.set()
+            watcher.cancel()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+# -----------------------------
+# Chat
+# -----------------------------
+class AsyncChatPipeline:
+    """ChatPipeline with the I/O awaited: the same stages, answer cache, stats and timings."""
+
+    def __init__(self, clients, history_k=5, documents_k=5):
+        self.clients = clients
+        self.history_k = history_k
+        self.documents_k = documents_k
+
+    async def retrieve(self, embedding):
+        return await asyncio.gather(
+            self.clients.search("chat_messages", embedding, self.history_k, "<=>"),
+            self.clients.search("stock_documents", embedding, self.documents_k, "<->"),
+        )
+
+    async def lookup_cached(self, embedding):
+        # The data version may read Postgres when it is due for a refresh
+        return await asyncio.to_thread(chat_pipeline.lookup_cached, embedding)
+
+    async def prepare(self, message, embedding, timer):
+        history, documents = await timer.run_async("retrieve", self.retrieve, embedding)
+        return build_prompt(message, documents, history)
+
+    async def run(self, message):
+        timer = StageTimer()
+        total_start = time.perf_counter()
+
+        embedding = await timer.run_async("embed", self.clients.embed, message)
+        version, hit = await timer.run_async("cache", self.lookup_cached, embedding)
+        if hit is not None:
+            response = hit.answer
+        else:
+            answer_start = time.perf_counter()
+            prompt = await self.prepare(message, embedding, timer)
+            response = await timer.run_async("generate", self.clients.generate, prompt)
+            if version is not None:
+                answer_cache.store(embedding, response, version, time.perf_counter() - answer_start)
+        await timer.run_async("persist", self.clients.persist, message, embedding, response)
+
+        timer.timings["total"] = round((time.perf_counter() - total_start) * 1000, 2)
+        return response, {"timings_ms": timer.timings, "cache": cache_metadata(hit)}
+
+    async def stream(self, message):
+        """ChatPipeline.stream as an async generator of SSE messages."""
+        timer = StageTimer()
+        total_start = time.perf_counter()
+        ttft = None
+        parts = []
+        completed = False
+        embedding = None
+        hit = None
+
+        try:
+            embedding = await timer.run_async("embed", self.clients.embed, message)
+            version, hit = await timer.run_async("cache", self.lookup_cached, embedding)
+            if hit is not None:
+                ttft = time.perf_counter() - total_start
+                parts.append(hit.answer)
+                yield sse_event({"token": hit.answer}, "token")
+            else:
+                answer_start = time.perf_counter()
+                prompt = await self.prepare(message, embedding, timer)
+                generate_start = time.perf_counter()
+                async for token in self.clients.stream(prompt):
+                    if ttft is None:
+                        ttft = time.perf_counter() - total_start
+                    parts.append(token)
+                    yield sse_event({"token": token}, "token")
+                timer.timings["generate"] = round((time.perf_counter() - generate_start) * 1000, 2)
+                if version is not None:
+                    answer_cache.store(embedding, "".join(parts).strip(), version, time.perf_counter() - answer_start)
+            completed = True
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event({"error": "Could not generate a response"}, "error")
+        finally:
+            record_stream(ttft, completed)
+            if embedding is not None:
+                response = "".join(parts).strip() if completed else None
+                try:
+                    await timer.run_async("persist", self.clients.persist, message, embedding, response)
+                except Exception as e:
+                    print(f"Chat persist error: {e}")
+
+        if completed:
+            timer.timings["total"] = round((time.perf_counter() - total_start) * 1000, 2)
+            if ttft is not None:
+                timer.timings["ttft"] = round(ttft * 1000, 2)
+            yield sse_event({"timings_ms": timer.timings, "cache": cache_metadata(hit)}, "done")
+
+
+# -----------------------------
+# Application
+# -----------------------------
+class AsyncApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.clients = AsyncClients()
+        self.chat = AsyncChatPipeline(self.clients)
+        self.chart_flight = AsyncSingleFlight()
+        self.wsgi = WsgiBridge(flask_app, Config.ASYNC_WSGI_THREADS)
+        # (method, path) -> (endpoint name as in Flask, handler)
+        self.routes = {
+            ("POST", "/auth/chat"): ("auth.chat", self.chat_view),
+            ("GET", "/auth/chat/stream"): ("auth.chat_stream", self.chat_stream_view),
+            ("POST", "/auth/chat/stream"): ("auth.chat_stream", self.chat_stream_view),
+            ("POST", "/auth/api/chart"): ("auth.chart", self.chart_view),
+            ("GET", "/auth/notifications/stream"): ("auth.stream_notifications", self.notifications_view),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        body = await read_body(receive)
+        if body is None:
+            return
+        route = self.routes.get((scope["method"], scope["path"]))
+        if route is None:
+            return await self.wsgi(scope, body, receive, send)
+
+        endpoint, view = route
+        request = AsyncRequest(scope, body)
+        with request_scope(endpoint) as stats:
+            status = 500
+            try:
+                result = await view(request)
+            except Exception as e:
+                print(f"Async {endpoint} failed: {e}")
+                result = (500, {"error": "Internal server error"})
+            try:
+                if isinstance(result, tuple):
+                    status, payload = result
+                    await send_json(send, request, status, payload)
+                else:
+                    status = 200
+                    await self.stream_events(request, result, receive, send)
+            except OSError:
+                # The client went away mid-response
+                pass
+            finally:
+                observe_request(stats, request.method, request.full_path, status)
+
+    async def stream_events(self, request, events, receive, send):
+        """Send an SSE generator until it ends or the client disconnects."""
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        streaming = asyncio.ensure_future(send_events(send, request, events))
+        try:
+            await asyncio.wait((disconnect, streaming), return_when=asyncio.FIRST_COMPLETED)
+            if not streaming.done():
+                # Closing the generator early stores just the question, as in the Flask mode
+                streaming.cancel()
+            await asyncio.gather(streaming, return_exceptions=True)
+            if not streaming.cancelled() and streaming.exception() is not None:
+                print(f"Event stream failed: {streaming.exception()}")
+        finally:
+            disconnect.cancel()
+            await events.aclose()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.clients.start()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.clients.close()
+                self.wsgi.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---------- auth ----------
+    def identity(self, request):
+        """
+        (user id, None) from the Bearer token, or (None, error response).
+
+        The token goes through verify_jwt_in_request in a Flask request
+        context, so token type, expiry and any blocklist checks match
+        @jwt_required(), and failures are answered by the same error handlers.
+        """
+        headers = {"Authorization": request.headers.get("authorization", "")}
+        with self.flask_app.test_request_context(request.path, method=request.method, headers=headers):
+            try:
+                verify_jwt_in_request()
+                return get_jwt_identity(), None
+            except Exception as e:
+                response = self.flask_app.handle_user_exception(e)
+                return None, (response.status_code, response.get_json())
+
+    # ---------- views ----------
+    async def chat_view(self, request):
+        user_message = (request.json() or {}).get("message")
+        if not user_message:
+            return 400, {"error": "Message is required"}
+        response, metadata = await self.chat.run(user_message)
+        return 200, {"response": response, "metadata": metadata}
+
+    async def chat_stream_view(self, request):
+        if request.method == "POST":
+            user_message = (request.json() or {}).get("message")
+        else:
+            user_message = request.args.get("message")
+        if not user_message:
+            return 400, {"error": "Message is required"}
+        return self.chat.stream(user_message)
+
+    async def notifications_view(self, request):
+        user_id, error = self.identity(request)
+        if error:
+            return error
+        last_id = request.headers.get("last-event-id") or request.args.get("last_id")
+        try:
+            last_id = int(last_id) if last_id else None
+        except ValueError:
+            return 400, {"error": "Last-Event-ID must be a notification id"}
+        return async_notification_stream(user_id, last_id)
+
+    async def chart_view(self, request):
+        user_id, error = self.identity(request)
+        if error:
+            return error
+        body = request.json() or {}
+        symbol = chart_symbol(body.get("symbol"))
+        if not symbol:
+            return 400, {"error": "symbol is required"}
+        try:
+            limit = int(body.get("limit", 1))
+        except (TypeError, ValueError):
+            return 400, {"error": "limit must be an integer"}
+        data_type = body.get("type", "eod")
+
+        key = (symbol, data_type, limit)
+        cached = chart_cache.get(key)
+        if cached is not None:
+            CHART_REQUESTS.inc(("memory",))
+            return 200, cached
+
+        try:
+            (result, source), shared = await self.chart_flight.do(
+                key, lambda: self.load_chart(symbol, data_type, limit, user_id)
+            )
+        except MarketstackError as e:
+            print(f"exception in chart endpoint,{e}")
+            return e.status_code, {"error": str(e)}
+
+        CHART_REQUESTS.inc(("shared" if shared else source,))
+        return 200, result
+
+    async def load_chart(self, symbol, data_type, limit, user_id):
+        """auth.load_chart with the store read and the Marketstack call awaited."""
+        cached = await self.clients.load_cached_series(symbol, data_type, limit)
+        if cached is not None:
+            data = slice_series(cached, limit)
+            latest = find_latest_row(data)
+            if latest:
+                result = {'symbol': symbol, 'latest': latest, 'raw_response': data}
+                chart_cache.set((symbol, data_type, limit), result, chart_cache_ttl(data_type))
+                return result, "store"
+
+        if not get_market_client().configured:
+            raise MarketstackError("Market API key not configured", 500)
+
+        data = await self.clients.ticker_series(symbol, data_type, limit)
+        latest = find_latest_row(data)
+        if not latest:
+            print(f"No valid numeric OHLC data from API for {symbol}")
+            raise MarketstackError("No valid price data available", 404)
+
+        # Saving the series and the price fan-out stay on the psycopg2 code,
+        # once per coalesced fetch
+        return await asyncio.to_thread(record_chart, symbol, data_type, limit, user_id, data, latest), "upstream"
+
+
+def create_asgi_app(config=None):
+    return AsyncApp(create_app(config))
@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+import asyncpg
+import httpx
+import numpy as np
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from pgvector.asyncpg import register_vector
+from .embeddings import get_client as get_embedding_client, cache_key, normalize_text
+from .llm import build_messages
+from .marketdata import get_market_client, MarketstackError, ticker_series_path, cache_max_age
+from .metrics import outbound, record_query
+from .vector_index import use_local_index, search_local, get_local_index
+from config import Config
+
+# -----------------------------
+# Pooled async clients (ASGI serving mode)
+# -----------------------------
+# The event-loop counterparts of the blocking calls behind /auth/chat and
+# /auth/api/chart: Ollama and Marketstack over one pooled httpx.AsyncClient,
+# OpenAI through AsyncOpenAI, Postgres through an asyncpg pool. A waiting call
+# holds a coroutine rather than a thread, so in-flight requests are bounded
+# by these pools and not by a worker pool. The embedding caches, the
+# Marketstack token bucket and the metrics are the ones the threaded code
+# uses.
+
+_OPTION = re.compile(r"-c\s*([\w.]+)=(\S+)")
+
+
+def server_settings(options):
+    """libpq "-c name=value" options (Config.DB_CONFIG["options"]) as asyncpg server_settings."""
+    return dict(_OPTION.findall(options or ""))
+
+
+class AsyncClients:
+    def __init__(self):
+        self.http = None
+        self.openai = None
+        self.db = None
+
+    async def start(self):
+        limits = httpx.Limits(
+            max_connections=Config.ASYNC_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.ASYNC_HTTP_MAX_CONNECTIONS,
+        )
+        self.http = httpx.AsyncClient(limits=limits)
+        self.openai = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=DefaultAsyncHttpxClient(limits=limits),
+        )
+        dsn = Config.DB_CONFIG
+        self.db = await asyncpg.create_pool(
+            host=dsn["host"],
+            port=dsn["port"],
+            user=dsn["user"],
+            password=dsn["password"],
+            database=dsn["dbname"],
+            min_size=Config.ASYNC_DB_POOL_MIN,
+            max_size=Config.ASYNC_DB_POOL_MAX,
+            server_settings=server_settings(dsn.get("options")),
+            init=self._init_connection,
+        )
+        return self
+
+    async def close(self):
+        if self.db is not None:
+            await self.db.close()
+        if self.openai is not None:
+            await self.openai.close()
+        if self.http is not None:
+            await self.http.aclose()
+
+    async def _init_connection(self, conn):
+        # Deployments using the local vector index may not have the extension
+        if not use_local_index():
+            await register_vector(conn)
+
+    # ---------- Postgres ----------
+    def connection(self):
+        return self.db.acquire(timeout=Config.DB_POOL_TIMEOUT)
+
+    async def fetch(self, conn, query, *args):
+        start = time.perf_counter()
+        try:
+            return await conn.fetch(query, *args)
+        finally:
+            record_query("asyncpg", query, time.perf_counter() - start)
+
+    async def fetchval(self, conn, query, *args):
+        start = time.perf_counter()
+        try:
+            return await conn.fetchval(query, *args)
+        finally:
+            record_query("asyncpg", query, time.perf_counter() - start)
+
+    async def execute(self, conn, query, *args):
+        start = time.perf_counter()
+        try:
+            return await conn.execute(query, *args)
+        finally:
+            record_query("asyncpg", query, time.perf_counter() - start)
+
+    async def search(self, table, embedding, k, operator):
+        """Nearest rows of chat_messages/stock_documents, joined like the sync search functions."""
+        if use_local_index():
+            return "\n".join(search_local(table, embedding, k))
+        async with self.connection() as conn:
+            async with conn.transaction():
+                # SET LOCAL, as in tune_vector_search
+                if Config.VECTOR_EF_SEARCH:
+                    await self.execute(conn, f"SET LOCAL hnsw.ef_search = {int(Config.VECTOR_EF_SEARCH)}")
+                if Config.VECTOR_PROBES:
+                    await self.execute(conn, f"SET LOCAL ivfflat.probes = {int(Config.VECTOR_PROBES)}")
+                rows = await self.fetch(
+                    conn,
+                    f"SELECT content FROM {table} ORDER BY embedding {operator} $1 LIMIT $2",
+                    embedding, k
+                )
+        return "\n".join(row[0] for row in rows)
+
+    async def persist(self, message, embedding, response):
+        """ChatPipeline.persist: the question (with its embedding) and the answer, if any."""
+        local = use_local_index()
+        async with self.connection() as conn:
+            async with conn.transaction():
+                if local:
+                    message_id = await self.fetchval(
+                        conn, "INSERT INTO chat_messages (role, content) VALUES ('user', $1) RETURNING id", message
+                    )
+                else:
+                    message_id = await self.fetchval(
+                        conn,
+                        "INSERT INTO chat_messages (role, content, embedding) VALUES ('user', $1, $2) RETURNING id",
+                        message, embedding
+                    )
+                if response is not None:
+                    await self.execute(
+                        conn, "INSERT INTO chat_messages (role, content) VALUES ('assistant', $1)", response
+                    )
+        if local:
+            get_local_index("chat_messages").add([embedding], [{"id": message_id, "content": message}])
+
+    async def load_cached_series(self, symbol, data_type, limit):
+        """marketdata.load_cached_series over the asyncpg pool."""
+        async with self.connection() as conn:
+            rows = await self.fetch(
+                conn,
+                """
+                SELECT payload, bar_limit
+                FROM market_data_cache
+                WHERE symbol = $1 AND data_type = $2
+                  AND fetched_at > $3
+                """,
+                symbol, data_type, datetime.utcnow() - timedelta(seconds=cache_max_age(data_type))
+            )
+        if not rows or rows[0]["bar_limit"] < limit:
+            return None
+        payload = rows[0]["payload"]
+        return json.loads(payload) if isinstance(payload, str) else payload
+
+    # ---------- Ollama ----------
+    async def embed(self, text):
+        """get_embedding() without blocking: cached vectors first, then one Ollama request."""
+        cache = get_embedding_client()
+        key = cache_key(text, cache.model)
+        vector = cache.lookup(key)
+        if vector is None:
+            with outbound("ollama"):
+                res = await self.http.post(
+                    f"{cache.base_url}/api/embeddings",
+                    json={"model": cache.model, "prompt": normalize_text(text)},
+                    timeout=cache.timeout
+                )
+                res.raise_for_status()
+            vector = np.asarray(res.json()["embedding"], dtype=np.float32)
+            cache.remember([key], [vector])
+        return vector.tolist()
+
+    # ---------- OpenAI ----------
+    async def generate(self, prompt):
+        with outbound("openai"):
+            response = await self.openai.chat.completions.create(
+                model="gpt-5",
+                messages=build_messages(prompt),
+            )
+        return response.choices[0].message.content.strip()
+
+    async def stream(self, prompt):
+        """Yield the completion text piece by piece, like llm.stream_answer."""
+        with outbound("openai"):
+            stream = await self.openai.chat.completions.create(
+                model="gpt-5",
+                messages=build_messages(prompt),
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    yield token
+
+    # ---------- Marketstack ----------
+    async def ticker_series(self, symbol, data_type="eod", limit=1):
+        """MarketstackClient.ticker_series, paced by the same token bucket."""
+        market = get_market_client()
+        if not await market.bucket.acquire_async(timeout=market.timeout):
+            raise MarketstackError("Marketstack rate limit exceeded", 429)
+        path = ticker_series_path(symbol, data_type)
+        params = {"limit": limit, "sort": "DESC", "access_key": market.api_key}
+        try:
+            with outbound("marketstack"):
+                res = await self.http.get(f"{market.base_url}{path}", params=params, timeout=market.timeout)
+        except httpx.HTTPError as e:
+            raise MarketstackError(f"Marketstack request failed: {e}")
+        print(f"Marketstack API status: {res.status_code} ({path})")
+        if res.status_code != 200:
+            print(f"Marketstack API error response: {res.text}")
+            raise MarketstackError("Marketstack API failed", res.status_code)
+        return res.json()
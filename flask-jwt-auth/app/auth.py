@@ -1,37 +1,45 @@
-from flask import Flask,request,jsonify
+from flask import Flask,request,jsonify,Response,stream_with_context
 import json
 import random
 from psycopg2 import connect
-import psycopg2
-import os
-import smtplib
-from email.mime.text import MIMEText
-from .llm import call_ai_model
 import uuid
+import time
+import zlib
 from tqdm import tqdm
-import requests
 from flask_cors import CORS, cross_origin
 from .models import User, ChatRequest, StockData, Watchlist, Notification, StockTransaction
-from .rag import retrieve_context
-from sqlalchemy import create_engine
+from .chat import pipeline as chat_pipeline, chat_stats
+from .answer_cache import answer_cache_stats
 from config import Config
 from . import db
-from datetime import datetime
+from .db import get_connection, pool_stats
+from psycopg2.extras import RealDictCursor
+from .quotes import get_snapshot, snapshot_stats, get_quotes, stock_payload, page_rows, PageError
+from .symbol_search import search_symbols, lookup_symbol
+from .serialization import FORMATS, UnsupportedFormat, encode, negotiate_encoding, compress
+from .screener import screen, ScreenError
+from datetime import datetime, timedelta, timezone
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import JWTManager,create_access_token,jwt_required,get_jwt_identity,create_refresh_token
 from werkzeug.security import check_password_hash
 from pgvector.sqlalchemy import Vector
-from pgvector.psycopg2 import register_vector
 from sqlalchemy import Column,Integer
-from .mail import send_confirmation_email
+from .mail import queue_confirmation_email
 from .notifications import update_stock_and_notify
+from .notification_hub import notification_stream, notification_hub_stats
+from .price_bars import (
+    bar_interval, parse_bar_time, load_bars, latest_bars, has_bars, downsample, serialize_bar
+)
+from .indicators import get_indicators, indicator_series, indicator_stats
+from .marketdata import (
+    get_market_client, MarketstackError, load_cached_series, save_series,
+    slice_series, find_latest_row, chart_flight, chart_cache, chart_cache_ttl, chart_symbol, TTLCache
+)
+from .metrics import CHART_REQUESTS
 
 #setting api
 auth_bp = Blueprint("auth", __name__,url_prefix='/auth')
 
-MARKET_API_KEY = os.getenv("MARKET_STACK_API_KEY", "your_api_key_here")  # Add fallback for testing
-# SQLAlchemy engine
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, future=True)
 
 @auth_bp.route("/register",methods=['POST', 'OPTIONS'])
 #validating the user
@@ -56,86 +64,13 @@ def register():
     user = User(username=username, email=email, contact_no=contact_no)
     user.set_password(password)
     db.session.add(user)
+    # Confirmation email is queued with the user and sent by mailer.py
+    queue_confirmation_email(db.session, email)
     db.session.commit()
-    
-    # Send verification email
-    email_sent = send_confirmation_email(email)
-    
-    return jsonify({"msg": "User registered successfully", "email_sent": email_sent}), 201
-
-
 
-# ---------- Ollama embedding ----------
-def get_embedding_ollama(text):
-    response = requests.post(
-        "http://localhost:11434/api/embeddings",
-        json={
-            "model": "nomic-embed-text",
-            "prompt": text
-        },
-        timeout=60
-    )
-    response.raise_for_status()
-    return response.json()["embedding"]
-
-# ---------- PostgreSQL connection ----------
-conn = psycopg2.connect(
-    host="localhost",
-    database="postgres",
-    user="postgres",          
-    password="1234",        
-    port="5432"
-)
-
-register_vector(conn)
+    return jsonify({"msg": "User registered successfully", "email_queued": True}), 201
 
-cur = conn.cursor()
-
-# ---------- Insert data ----------
-def store_user_message(message: str):
-    # 1️⃣ Get embedding
-    embedding = get_embedding_ollama(message)
-
-    # 2️⃣ Insert user message in DB
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO chat_messages (role, content, embedding)
-            VALUES ('user', %s, %s)
-            """,
-            (message, embedding)
-        )
-        conn.commit()
 
-    # 3️⃣ Retrieve context
-    context = retrieve_context(message)
-
-    # 4️⃣ Generate response
-    prompt = f"""
-    Use the context below to answer the user.
-
-    Context:
-    {context}
-
-    User:
-    {message}
-    """
-    response = call_ai_model(prompt)
-
-    # 5️⃣ Store assistant response
-    if response is not None:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO chat_messages (role, content)
-                VALUES ('assistant', %s)
-                """,
-                (response,)
-            )
-            conn.commit()
-
-    # 6️⃣ Return embedding & response if needed
-    return embedding, response
 
 #----buy stocks----
 @auth_bp.route('/buy', methods=['POST','OPTIONS'])
@@ -232,56 +167,74 @@ def sell_stock():
     return jsonify({"message": f"Successfully sold {quantity} shares of {symbol}"}), 200
 
 #----fetch Portfolio stocks----
+PORTFOLIO_QUERY = """
+    SELECT t.symbol,
+           t.quantity,
+           t.avg_price::float8 AS avg_price,
+           q.last_traded_price::float8 AS current_price,
+           t.profit_loss::float8 AS profit_loss,
+           t.status,
+           (t.quantity * t.avg_price)::float8 AS cost_basis,
+           (t.quantity * q.last_traded_price)::float8 AS market_value,
+           (t.quantity * (q.last_traded_price - t.avg_price))::float8 AS unrealized_pnl,
+           ((q.last_traded_price - t.avg_price) / NULLIF(t.avg_price, 0) * 100)::float8 AS unrealized_pnl_percent,
+           (t.quantity * q.price_change)::float8 AS day_change
+    FROM portfolio_stocks t
+    LEFT JOIN LATERAL (
+        SELECT s.last_traded_price, s.price_change
+        FROM stock_data s
+        WHERE s.symbol = t.symbol
+        ORDER BY s.id
+        LIMIT 1
+    ) q ON true
+    WHERE t.user_id = %s
+    ORDER BY t.id
+"""
+
+def portfolio_totals(holdings):
+    priced = [h for h in holdings if h['market_value'] is not None]
+    cost_basis = sum(h['cost_basis'] for h in holdings)
+    priced_cost = sum(h['cost_basis'] for h in priced)
+    market_value = sum(h['market_value'] for h in priced)
+    day_change = sum(h['day_change'] or 0 for h in priced)
+    unrealized = market_value - priced_cost
+    previous_value = market_value - day_change
+    return {
+        'positions': len(holdings),
+        'cost_basis': round(cost_basis, 2),
+        'market_value': round(market_value, 2),
+        'unrealized_pnl': round(unrealized, 2),
+        'unrealized_pnl_percent': round(unrealized / priced_cost * 100, 2) if priced_cost else 0.0,
+        'day_change': round(day_change, 2),
+        'day_change_percent': round(day_change / previous_value * 100, 2) if previous_value else 0.0,
+        'unpriced_symbols': [h['symbol'] for h in holdings if h['market_value'] is None]
+    }
+
 @auth_bp.route('/portfolio', methods=['GET','OPTIONS'])
 @cross_origin()
 @jwt_required()
 def get_portfolio():
+    """
+    Holdings valued in one joined query.
+
+    ?include=totals wraps the list as {"holdings": [...], "totals": {...}}.
+    """
     user_id = get_jwt_identity()
     if request.method=='OPTIONS':
         return jsonify({"msg": "CORS OK"}), 200
-    transactions = StockTransaction.query.filter_by(user_id=user_id).all()  
-    portfolio = []
-    for transaction in transactions:
-        stock = StockData.query.filter_by(symbol=transaction.symbol).first()
-        portfolio.append({
-            'symbol': transaction.symbol,
-            'quantity': transaction.quantity,
-            'avg_price': transaction.avg_price,
-            'current_price': stock.last_traded_price if stock else None,
-            'profit_loss': transaction.profit_loss,
-            'status': transaction.status
-        })
-    return jsonify(portfolio), 200
-
-
-
-#send verification email
-def send_email_verification():
-    data = request.get_json()
-    email = data.get("email")
-    sender_email = "freeapiacc97@gmail.com"
-    password = "wijy eadx meep fxly"
-
-    msg = MIMEText("Hello! This is a confirmation email that you have successfully created an account in AI-Powered Stock Screener and Advisory platform.")
-    msg['Subject'] = "Successful Account Creation"
-    msg['From'] = sender_email
-    msg['To'] = email
-    print("here")
 
-    try:
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(sender_email, password)
-        server.sendmail(sender_email, email, msg.as_string())
-        server.quit()
-        print("Email sent successfully!")
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(PORTFOLIO_QUERY, (int(user_id),))
+            portfolio = cur.fetchall()
 
+    if request.args.get('include') == 'totals':
+        return jsonify({
+            'holdings': portfolio,
+            'totals': portfolio_totals(portfolio)
+        }), 200
+    return jsonify(portfolio), 200
 
-    return jsonify({"message": f"Verification email sent to {email}"}), 200
 
 
 #login
@@ -325,35 +278,129 @@ def chat():
     if not user_message:
         return jsonify({"error": "Message is required"}), 400
 
-    # 1️⃣ Store user message in DB with embedding
-    embedding, response = store_user_message(user_message)
-
+    # 1️⃣ Embed once, retrieve, generate and store both messages
+    response, metadata = chat_pipeline.run(user_message)
 
     # 2️⃣ Return response to frontend
     return jsonify({
-        "response": response
+        "response": response,
+        "metadata": metadata
     })
 
+@auth_bp.route('/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    """Stream the answer token by token as Server-Sent Events"""
+    if request.method == 'POST':
+        user_message = (request.get_json(silent=True) or {}).get("message")
+    else:
+        user_message = request.args.get("message")
+    if not user_message:
+        return jsonify({"error": "Message is required"}), 400
+
+    return Response(
+        stream_with_context(chat_pipeline.stream(user_message)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@auth_bp.route('/chat/stats', methods=['GET'])
+def get_chat_stats():
+    return jsonify(chat_stats())
+
+
+@auth_bp.route('/chat/cache/stats', methods=['GET'])
+def get_answer_cache_stats():
+    return jsonify(answer_cache_stats())
+
+LISTING_MAX_LIMIT = 5000
+PAGE_PARAMS = ('fields', 'limit', 'after', 'sort')
+
+def encoded_response(body, mimetype, etag, cache=None):
+    """Compress per Accept-Encoding (cached via `cache(key, build)` when given) and answer conditionally."""
+    coding = negotiate_encoding(request.headers.get('Accept-Encoding'), len(body))
+    if coding:
+        body = cache(coding, lambda: compress(body, coding)) if cache else compress(body, coding)
+    response = Response(body, mimetype=mimetype)
+    if coding:
+        response.headers['Content-Encoding'] = coding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f"{etag}-{coding or 'identity'}")
+    return response.make_conditional(request)
+
+def snapshot_response(snapshot, dataset, rows=None):
+    """
+    Serve a snapshot dataset ("rows" for /stock_data, "stocks" for /stocks).
+
+    ?format=json|columnar|msgpack picks the representation and Accept-Encoding
+    the compression; each variant is built once per snapshot and has its own
+    ETag, so unchanged clients get a 304.
+
+    ?fields=symbol,price  only these columns
+    ?sort=-changePercent  order by a column ("-" for descending; default symbol)
+    ?limit=50             page size; X-Next-Cursor is set when more rows follow
+    ?after=<cursor>       resume after the X-Next-Cursor of the previous page
+
+    `rows` restricts the listing to a subset (one symbol's rows).
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    if rows is None and not any(param in request.args for param in PAGE_PARAMS):
+        # Whole listing: every variant is cached on the snapshot
+        try:
+            if fmt == 'json':
+                body = snapshot.rows_json if dataset == 'rows' else snapshot.stocks_json
+                mimetype = 'application/json'
+            else:
+                body, mimetype = snapshot.encoded((dataset, fmt), lambda: encode(snapshot.dataset(dataset), fmt))
+        except UnsupportedFormat as e:
+            return jsonify({"error": str(e)}), 406
+        return encoded_response(body, mimetype, f"{snapshot.etag}-{fmt}",
+                                cache=lambda coding, build: snapshot.encoded((dataset, fmt, coding), build))
+
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        if not 1 <= limit <= LISTING_MAX_LIMIT:
+            return jsonify({"error": f"limit must be between 1 and {LISTING_MAX_LIMIT}"}), 400
+    try:
+        page, next_cursor = page_rows(
+            snapshot, dataset,
+            sort=request.args.get('sort', 'symbol'),
+            after=request.args.get('after'),
+            limit=limit,
+            fields=fields,
+            rows=rows,
+        )
+        body, mimetype = encode(page, fmt, columns=fields)
+    except PageError as e:
+        return jsonify({"error": str(e)}), 400
+    except UnsupportedFormat as e:
+        return jsonify({"error": str(e)}), 406
+
+    query = zlib.crc32(request.query_string)
+    response = encoded_response(body, mimetype, f"{snapshot.etag}-{fmt}-{query:08x}")
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
 @auth_bp.route('/stocks', methods=['GET'])
 def get_stocks():
-    # Fetch stock data from database, ensuring unique symbols
-    stocks = StockData.query.all()
-    stock_data = []
-    seen_symbols = set()
-    for stock in stocks:
-        if stock.symbol not in seen_symbols:
-            seen_symbols.add(stock.symbol)
-            stock_data.append({
-                'symbol': stock.symbol,
-                'name': stock.company,
-                'price': stock.last_traded_price,
-                'change': stock.price_change,
-                'changePercent': stock.percentage_change,
-                'volume': stock.share_volume,
-                'marketCap': stock.value_inr,
-                'industry': stock.industry or 'Unknown'
-            })
-    return jsonify(stock_data)
+    # Served from the shared snapshot, already deduplicated by symbol
+    snapshot = get_snapshot()
+    return snapshot_response(snapshot, 'stocks')
+
+@auth_bp.route('/stocks/snapshot', methods=['GET'])
+def get_stocks_snapshot_stats():
+    return jsonify(snapshot_stats())
+
 def calculate_change(old, new):
     if old == 0 or old is None:
         return 0
@@ -382,130 +429,123 @@ def set_favorite_stock():
 
     email_id = user.email
 
-    # Use a new connection for this operation
-    conn_local = psycopg2.connect(
-        host="localhost",
-        database="postgres",
-        user="postgres",
-
-        password="1234",
-        port="5432"
-    )
-
     try:
-        with conn_local.cursor() as cur:
-            if status == "selected":
-                # Insert or update to selected
-                cur.execute(
-                    """
-                    INSERT INTO watchlist_selected_item_history (email_id, symbol_name, status, selected_at)
-                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                   
-                    """,
-                    (email_id, symbol, status)
-                )
-            elif status == "unselected":
-                # Delete the entry
-                cur.execute(
-                    """
-                    DELETE FROM watchlist_selected_item_history
-                    WHERE email_id = %s AND symbol_name = %s
-                    """,
-                    (email_id, symbol)
-                )
+        with get_connection() as conn_local:
+            with conn_local.cursor() as cur:
+                if status == "selected":
+                    # Insert or update to selected
+                    cur.execute(
+                        """
+                        INSERT INTO watchlist_selected_item_history (email_id, symbol_name, status, selected_at)
+                        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                       
+                        """,
+                        (email_id, symbol, status)
+                    )
+                elif status == "unselected":
+                    # Delete the entry
+                    cur.execute(
+                        """
+                        DELETE FROM watchlist_selected_item_history
+                        WHERE email_id = %s AND symbol_name = %s
+                        """,
+                        (email_id, symbol)
+                    )
             conn_local.commit()
     except Exception as e:
-        conn_local.rollback()
         print(f"Database error: {e}")  # Add logging for debugging
         return jsonify({"error": f"Database error occurred: {str(e)}"}), 500
-    finally:
-        conn_local.close()
 
     return jsonify({"message": "Favorite stock updated successfully"}), 200
 @auth_bp.route("/api/chart", methods=["POST"])
 @jwt_required()
 def chart():
-    body = request.json
-    symbol = body["symbol"]
-    limit = body.get("limit", 1)
+    body = request.get_json(silent=True) or {}
+    # One key per symbol however it is typed, so "reliance" and "RELIANCE" share a fetch
+    symbol = chart_symbol(body.get("symbol"))
+    if not symbol:
+        return jsonify({"error": "symbol is required"}), 400
+    try:
+        limit = int(body.get("limit", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
     data_type = body.get("type", "eod")
 
     user_id = get_jwt_identity()
 
-    if not MARKET_API_KEY or MARKET_API_KEY == "your_api_key_here":
-        return jsonify({"error": "Market API key not configured"}), 500
+    key = (symbol, data_type, limit)
+    cached = chart_cache.get(key)
+    if cached is not None:
+        CHART_REQUESTS.inc(("memory",))
+        return jsonify(cached)
 
-    if data_type == "intraday":
-        url = f"https://api.marketstack.com/v2/tickers/{symbol}/intraday"
-    else:
-        url = f"https://api.marketstack.com/v2/tickers/{symbol}/eod"
+    # ✅ One load per key at a time; concurrent requests share its result
+    try:
+        (result, source), shared = chart_flight.do(key, lambda: load_chart(symbol, data_type, limit, user_id))
+    except MarketstackError as e:
+        print(f"exception in chart endpoint,{e}")
+        return jsonify({"error": str(e)}), e.status_code
+
+    CHART_REQUESTS.inc(("shared" if shared else source,))
+    return jsonify(result)
+
+
+def load_chart(symbol, data_type, limit, user_id):
+    """Chart body for one (symbol, type, limit) and where it came from; also cached in memory."""
+    # ✅ Serve from the local store kept fresh by the ingestion worker
+    cached = load_cached_series(symbol, data_type, limit)
+    if cached is not None:
+        data = slice_series(cached, limit)
+        latest = find_latest_row(data)
+        if latest:
+            result = {
+                'symbol': symbol,
+                'latest': latest,
+                'raw_response': data
+            }
+            chart_cache.set((symbol, data_type, limit), result, chart_cache_ttl(data_type))
+            return result, "store"
 
-    params = {
-        "access_key": MARKET_API_KEY,
-        "limit": limit,
-        
-        "sort": "DESC"
-    }
+    market_client = get_market_client()
+    if not market_client.configured:
+        raise MarketstackError("Market API key not configured", 500)
 
-    try:
-        res = requests.get(url, params=params, timeout=10)
-        print(f"Marketstack API status: {res.status_code}")
-
-        if res.status_code != 200:
-            print(f"Marketstack API error response: {res.text}")
-            return jsonify({"error": "Marketstack API failed"}), res.status_code
-
-        data = res.json()
-        print("Marketstack API keys:", data.keys())
-
-        latest = None
-
-        # ✅ Marketstack format handling
-        market_data = data.get("data")
-
-                # Case 1: data is dict { "TSLA": [ ... ] }
-        if isinstance(market_data, dict):
-            for symbol_key, rows in market_data.items():
-                if isinstance(rows, list):
-                    for row in rows:
-                        if isinstance(row.get("open"), (int, float)) and isinstance(row.get("close"), (int, float)):
-                            latest = row
-                            break
-                if latest:
-                    break
-
-        # Case 2: data is list [ ... ]
-        elif isinstance(market_data, list):
-            for row in market_data:
-                if isinstance(row.get("open"), (int, float)) and isinstance(row.get("close"), (int, float)):
-                    latest = row
-                    break
-
-        print("Latest data:", latest)
-
-        if not latest:
-            print(f"No valid numeric OHLC data from API for {symbol}")
-            return jsonify({"error": "No valid price data available"}), 404
-        stock_info = {
-            "open": latest["open"],
-            "high": latest["high"],
-            "low": latest["low"],
-            "close": latest["close"]
-        }
+    data = market_client.ticker_series(symbol, data_type, limit)
 
-        update_stock_and_notify(symbol, user_id, stock_info)
-        print("sending data from backend")
+    latest = find_latest_row(data)
+    print("Latest data:", latest)
 
-        return jsonify({
-            'symbol':symbol,
-            'latest':latest,
-            'raw_response':data
-        })
+    if not latest:
+        print(f"No valid numeric OHLC data from API for {symbol}")
+        raise MarketstackError("No valid price data available", 404)
 
+    return record_chart(symbol, data_type, limit, user_id, data, latest), "upstream"
 
-    except requests.exceptions.RequestException as e:
-        print(f"exception in chart endpoint,{e}")
-        return jsonify({"error": "Internal server error"}), 500
+
+def record_chart(symbol, data_type, limit, user_id, data, latest):
+    """Store a fresh upstream series, apply its latest price and cache the chart body."""
+    try:
+        save_series(symbol, data_type, data, limit)
+    except Exception as e:
+        print(f"Could not cache market data for {symbol}: {e}")
+
+    stock_info = {
+        "open": latest["open"],
+        "high": latest["high"],
+        "low": latest["low"],
+        "close": latest["close"]
+    }
+
+    update_stock_and_notify(symbol, user_id, stock_info)
+    print("sending data from backend")
+
+    result = {
+        'symbol':symbol,
+        'latest':latest,
+        'raw_response':data
+    }
+    chart_cache.set((symbol, data_type, limit), result, chart_cache_ttl(data_type))
+    return result
 
 
 
@@ -567,72 +607,181 @@ def get_favorite_stocks():
 
     email_id = user.email
 
-    # Rollback any aborted transaction to clear the connection state
-    conn.rollback()
-
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT symbol_name, status FROM watchlist_selected_item_history
-            WHERE email_id = %s
-            """,
-            (email_id,)
-        )
-        rows = cur.fetchall()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT symbol_name, status FROM watchlist_selected_item_history
+                WHERE email_id = %s
+                """,
+                (email_id,)
+            )
+            rows = cur.fetchall()
 
     favorite_stocks = [{"symbol": row[0], "status": row[1]} for row in rows]
+
+    # ?expand=quote: attach each symbol's quote from the snapshot
+    if request.args.get('expand') == 'quote':
+        quotes = get_quotes({fav["symbol"] for fav in favorite_stocks})
+        for fav in favorite_stocks:
+            fav["quote"] = quotes.get(fav["symbol"])
     return jsonify(favorite_stocks), 200
 
+BATCH_MAX_SYMBOLS = 500
+
+@auth_bp.route('/stocks/batch', methods=['GET', 'POST'])
+def get_stocks_batch():
+    """
+    Quotes for many symbols in one request, served from the snapshot.
+
+    symbols: comma separated (query string) or a JSON list (POST body)
+    """
+    if request.method == 'POST':
+        symbols = (request.get_json(silent=True) or {}).get('symbols') or []
+    else:
+        symbols = request.args.get('symbols', '').split(',')
+    if isinstance(symbols, str):
+        symbols = symbols.split(',')
+    symbols = list(dict.fromkeys(s.strip() for s in symbols if isinstance(s, str) and s.strip()))
+    if not symbols:
+        return jsonify({"error": "symbols is required"}), 400
+    if len(symbols) > BATCH_MAX_SYMBOLS:
+        return jsonify({"error": f"At most {BATCH_MAX_SYMBOLS} symbols per request"}), 400
+
+    quotes = get_quotes(symbols)
+    return jsonify({
+        "quotes": quotes,
+        "missing": [s for s in symbols if s not in quotes]
+    })
+
 
 @auth_bp.route('/stock/<symbol>', methods=['GET'])
 def get_stock_by_symbol(symbol):
-    # First try to fetch from database
-    stock = StockData.query.filter(StockData.symbol.ilike(f'%{symbol}%')).first()
-    if stock:
-        stock_data = {
-            'name': stock.company,
-            'symbol': stock.symbol,
-            'price': stock.last_traded_price,
-            'change': stock.price_change,
-            'changePercent': stock.percentage_change,
-            'volume': stock.share_volume,
-            'marketCap': stock.value_inr,
-            'industry': stock.industry or 'N/A',
-            'series': stock.series or 'N/A',
-            'open_price': stock.open_price,
-            'high_price': stock.high_price,
-            'low_price': stock.low_price,
-            'previous_close': stock.previous_close,
-            'last_traded_price': stock.last_traded_price,
-            'price_change': stock.price_change,
-            'percentage_change': stock.percentage_change,
-            'day_percentage_change': stock.day_percentage_change,
-            'share_volume': stock.share_volume,
-            'value_inr': stock.value_inr,
-            'week_high': stock.week_high,
-            'week_low': stock.week_low,
-            'daypercentagechange': stock.daypercentagechange
-        }
-        return jsonify(stock_data)
+    # Exact (case-insensitive) match from the snapshot; near misses get suggestions
+    row = lookup_symbol(symbol)
+    if row is None:
+        return jsonify({
+            "error": f"Unknown symbol: {symbol}",
+            "suggestions": search_symbols(symbol, limit=5)
+        }), 404
+    return jsonify(stock_payload(row))
+
+@auth_bp.route('/search', methods=['GET'])
+def search_stocks():
+    """Autocomplete over symbols and company names: exact > prefix > fuzzy"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    limit = max(1, min(limit, 50))
+    return jsonify({"query": query, "results": search_symbols(query, limit)})
+
+HISTORY_DEFAULT_LIMIT = 500
+HISTORY_MAX_LIMIT = 5000
+
+# (symbol, interval) pairs backfilled recently, whatever the outcome, so a
+# symbol Marketstack has no data for (or an outage) costs one upstream call
+# per HISTORY_BACKFILL_RETRY_SECONDS rather than one per request
+backfill_attempts = TTLCache(Config.HISTORY_BACKFILL_CACHE_SIZE)
 
 @auth_bp.route('/stocks/history/<symbol>', methods=['GET'])
+@jwt_required()
 def get_stock_history(symbol):
-    import random
-    # Fetch the stock's current price from database
-    stock = StockData.query.filter(StockData.symbol.ilike(f'%{symbol}%')).first()
-    if stock:
-        base_price = float(stock.last_traded_price)
-    else:
-        base_price = 100 + random.randint(50, 200)  # Fallback if not found
-    history = []
-    for i in range(30):  # Last 30 days
-        price = base_price + random.uniform(-20, 20)
-        history.append({
-            'date': f'2024-01-{i+1:02d}',
-            'price': round(price, 2),
-            'volume': random.randint(1000000, 50000000)
-        })
-    return jsonify(history)
+    """
+    OHLC bars from price_bars, oldest first.
+
+    interval: 1d (default) or 1h; start/end: ISO date or datetime, [start, end).
+    Without start the last 30 days (1d) or 7 days (1h) are returned.
+    points: downsample the whole range to about this many bars (method=lttb|minmax).
+    Otherwise pages of `limit` bars; pass the X-Next-Cursor header back as `after`.
+    """
+    symbol = symbol.upper()
+    try:
+        interval = bar_interval(request.args.get('interval'))
+        start = parse_bar_time(request.args['start']) if request.args.get('start') else None
+        end = parse_bar_time(request.args['end']) if request.args.get('end') else None
+        after = parse_bar_time(request.args['after']) if request.args.get('after') else None
+        points = int(request.args['points']) if request.args.get('points') else None
+        limit = int(request.args.get('limit', HISTORY_DEFAULT_LIMIT))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid history parameters: {e}"}), 400
+    method = request.args.get('method', 'lttb')
+    if method not in ('lttb', 'minmax'):
+        return jsonify({"error": "method must be lttb or minmax"}), 400
+    if points is not None and not 3 <= points <= HISTORY_MAX_LIMIT:
+        return jsonify({"error": f"points must be between 3 and {HISTORY_MAX_LIMIT}"}), 400
+    if not 1 <= limit <= HISTORY_MAX_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {HISTORY_MAX_LIMIT}"}), 400
+
+    if start is None and after is None:
+        days = 30 if interval == '1d' else 7
+        start = (end or datetime.now(timezone.utc)) - timedelta(days=days)
+
+    if not has_bars(symbol, interval):
+        # Only symbols we quote are fetched upstream; anything else just has no bars
+        if lookup_symbol(symbol) is not None:
+            backfill_history(symbol, interval)
+
+    if points is not None:
+        bars = downsample(load_bars(symbol, interval, start, end), points, method)
+        return jsonify([serialize_bar(bar, interval) for bar in bars])
+
+    bars = load_bars(symbol, interval, start, end, after, limit + 1)
+    response = jsonify([serialize_bar(bar, interval) for bar in bars[:limit]])
+    if len(bars) > limit:
+        # UTC with a Z suffix so the cursor survives unencoded in a query string
+        cursor = bars[limit - 1][0].astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+        response.headers['X-Next-Cursor'] = cursor
+    return response
+
+def backfill_history(symbol, interval):
+    """First request for a symbol with no stored bars: fetch a year of history upstream"""
+    market_client = get_market_client()
+    if not market_client.configured:
+        return
+    key = (symbol, interval)
+    if backfill_attempts.get(key) is not None:
+        return
+    # Marked before fetching so concurrent requests do not all go upstream
+    backfill_attempts.set(key, True, Config.HISTORY_BACKFILL_RETRY_SECONDS)
+    data_type = 'intraday' if interval == '1h' else 'eod'
+    try:
+        data = market_client.ticker_series(symbol, data_type, Config.INGEST_HISTORY_LIMIT)
+        save_series(symbol, data_type, data, Config.INGEST_HISTORY_LIMIT)
+    except Exception as e:
+        print(f"History backfill failed for {symbol}: {e}")
+
+@auth_bp.route('/indicators/<symbol>', methods=['GET'])
+def get_symbol_indicators(symbol):
+    """
+    Latest daily SMA/EMA/MACD/RSI/Bollinger/ATR values for a symbol.
+
+    history: also return the indicator series for the last N bars (max 1000)
+    """
+    symbol = symbol.upper()
+    try:
+        history = int(request.args.get('history', 0))
+    except ValueError:
+        return jsonify({"error": "history must be an integer"}), 400
+    if not 0 <= history <= 1000:
+        return jsonify({"error": "history must be between 0 and 1000"}), 400
+
+    latest = get_indicators(symbol)
+    if latest is None:
+        return jsonify({"error": f"No daily bars for {symbol}"}), 404
+
+    body = dict(latest, symbol=symbol)
+    if history:
+        bars = latest_bars(symbol, '1d', history + Config.INDICATOR_LOOKBACK)
+        body["series"] = indicator_series(bars, history)
+    return jsonify(body)
+
+@auth_bp.route('/indicators/stats', methods=['GET'])
+def get_indicator_stats():
+    return jsonify(indicator_stats())
 
 @auth_bp.route('/market/overview', methods=['GET'])
 def get_market_overview():
@@ -648,53 +797,56 @@ def get_market_overview():
 
 @auth_bp.route('/stock_data', methods=['GET'])
 def get_stock_data():
-    from .models import StockData
-    stocks = StockData.query.all()
-    stock_data = [{
-        'company': stock.company,
-        'symbol': stock.symbol,
-        'industry': stock.industry,
-        'series': stock.series,
-        'open_price': float(stock.open_price),
-        'high_price': float(stock.high_price),
-        'low_price': float(stock.low_price),
-        'previous_close': float(stock.previous_close),
-        'last_traded_price': float(stock.last_traded_price),
-        'price_change': float(stock.price_change),
-        'percentage_change': float(stock.percentage_change),
-        'day_percentage_change': float(stock.day_percentage_change),
-        'share_volume': int(stock.share_volume),
-        'value_inr': float(stock.value_inr),
-        'week_high': float(stock.week_high),
-        'week_low': float(stock.week_low),
-        'daypercentagechange': float(stock.daypercentagechange) if stock.daypercentagechange else None
-    } for stock in stocks]
-    return jsonify(stock_data)
+    snapshot = get_snapshot()
+    return snapshot_response(snapshot, 'rows')
+
+@auth_bp.route('/screen', methods=['GET', 'POST'])
+def screen_stocks():
+    """
+    Server-side screener.
+
+    filter: expression over stock_data columns and indicator columns
+            (sma_20, rsi_14, macd, bb_lower, atr_14, ...), e.g.
+            "percentage_change > 2 and share_volume > 1e6 and last_traded_price > 0.9*week_high"
+            "rsi_14 < 30 and last_traded_price > sma_200"
+    sort:   column name, prefixed with "-" for descending
+    limit:  maximum number of rows returned (default 50)
+    """
+    if request.method == 'POST':
+        params = request.get_json(silent=True) or {}
+    else:
+        params = request.args
+    expression = params.get('filter', '')
+    sort = params.get('sort')
+    fields = params.get('fields')
+    if isinstance(fields, str):
+        fields = [f for f in fields.split(',') if f]
+    try:
+        limit = int(params.get('limit', 50))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
+    limit = max(1, min(limit, 5000))
+
+    start = time.perf_counter()
+    try:
+        total, results = screen(expression, sort=sort, limit=limit, fields=fields)
+    except ScreenError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        'count': total,
+        'results': results,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+    })
 
 @auth_bp.route('/stock_data/<symbol>', methods=['GET'])
-def get_stock_data_of_particular():
-    from .models import StockData
-    stocks = StockData.query.all()
-    stock_data = [{
-        'company': stock.company,
-        'symbol': stock.symbol,
-        'industry': stock.industry,
-        'series': stock.series,
-        'open_price': float(stock.open_price),
-        'high_price': float(stock.high_price),
-        'low_price': float(stock.low_price),
-        'previous_close': float(stock.previous_close),
-        'last_traded_price': float(stock.last_traded_price),
-        'price_change': float(stock.price_change),
-        'percentage_change': float(stock.percentage_change),
-        'day_percentage_change': float(stock.day_percentage_change),
-        'share_volume': int(stock.share_volume),
-        'value_inr': float(stock.value_inr),
-        'week_high': float(stock.week_high),
-        'week_low': float(stock.week_low),
-        'daypercentagechange': float(stock.daypercentagechange) if stock.daypercentagechange else None
-    } for stock in stocks]
-    return jsonify(stock_data)
+def get_stock_data_of_particular(symbol):
+    # Every stock_data row of one symbol; accepts the same ?fields/sort/limit/after/format as /stock_data
+    snapshot = get_snapshot()
+    rows = snapshot.rows_for(symbol)
+    if not rows:
+        return jsonify({"error": f"Stock {symbol} not found"}), 404
+    return snapshot_response(snapshot, 'rows', rows=rows)
 
 # Function to populate sample stock data
 def populate_sample_stocks():
@@ -715,7 +867,7 @@ def populate_sample_stocks():
 
 
 # Notification endpoints
-@auth_bp.route('/api/notifications', methods=['POST','OPTIONS'])
+@auth_bp.route('/api/notifications', methods=['GET','POST','OPTIONS'])
 @jwt_required()
 def get_notifications():
     if request.method == 'OPTIONS':
@@ -728,7 +880,8 @@ def get_notifications():
         # ✅ Read query params (not JSON)
         print(user_id)
         unread_only = request.args.get('unread_only', 'false').lower() == 'true'
-        limit = request.args.get('limit', 20, type=int)
+        # Bounded so each read is one short scan of ix_notifications_user_*_created
+        limit = max(1, min(request.args.get('limit', 20, type=int), Config.NOTIFY_PAGE_MAX))
 
         query = Notification.query.filter_by(user_id=user_id)
 
@@ -744,6 +897,7 @@ def get_notifications():
 
         notifications_data = [
             {
+                'id': notif.id,
                 'user_id': notif.user_id,
                 'type': notif.type,
                 'title': notif.title,
@@ -769,6 +923,31 @@ def get_notifications():
         }), 500
 
 
+@auth_bp.route('/notifications/stream', methods=['GET'])
+@jwt_required()
+def stream_notifications():
+    """Push new notifications as Server-Sent Events; resumes after Last-Event-ID"""
+    user_id = get_jwt_identity()
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be a notification id"}), 400
+
+    return Response(
+        stream_with_context(notification_stream(user_id, last_id)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@auth_bp.route('/notifications/stream/stats', methods=['GET'])
+def get_notification_stream_stats():
+    return jsonify(notification_hub_stats())
+
+
 @auth_bp.route('/fetch_user',methods=['GET','OPTIONS'])
 @jwt_required()
 def fetch_username():
@@ -799,45 +978,38 @@ def single_notify():
     user_id = get_jwt_identity()
 
     try:
-        conn_local = psycopg2.connect(
-            host="localhost",
-            database="postgres",
-            user="postgres",
-            password="1234",
-            port="5432"
-        )
-        cur = conn_local.cursor()
-
-        # 1️⃣ Fetch latest unread notification
-        cur.execute(
-            """
-            SELECT id, message
-            FROM notifications
-            WHERE user_id = %s AND is_read = false
-            ORDER BY created_at DESC
-            LIMIT 1
-            """,
-            (user_id,)
-        )
+        with get_connection() as conn_local:
+            with conn_local.cursor() as cur:
+                # 1️⃣ Fetch latest unread notification
+                cur.execute(
+                    """
+                    SELECT id, message
+                    FROM notifications
+                    WHERE user_id = %s AND is_read = false
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                    """,
+                    (user_id,)
+                )
 
-        row = cur.fetchone()
+                row = cur.fetchone()
 
-        if not row:
-            return jsonify({"message": None}), 200
+                if not row:
+                    return jsonify({"message": None}), 200
 
-        notif_id, message = row
+                notif_id, message = row
 
-        # 2️⃣ Mark notification as read
-        cur.execute(
-            """
-            UPDATE notifications
-            SET is_read = true
-            WHERE id = %s
-            """,
-            (notif_id,)
-        )
+                # 2️⃣ Mark notification as read
+                cur.execute(
+                    """
+                    UPDATE notifications
+                    SET is_read = true
+                    WHERE id = %s
+                    """,
+                    (notif_id,)
+                )
 
-        conn_local.commit()
+            conn_local.commit()
 
         return jsonify({
             "id": notif_id,
@@ -847,12 +1019,6 @@ def single_notify():
     except Exception as e:
         print("Notification error:", e)
         return jsonify({"error": "Server error"}), 500
-
-    finally:
-        if cur:
-            cur.close()
-        if conn_local:
-            conn_local.close()    
     
 
 
@@ -867,27 +1033,20 @@ def mark_notification_read():
     user_id = get_jwt_identity()
 
     try:
-        conn = psycopg2.connect(
-            host="localhost",
-            database="postgres",
-            user="postgres",
-            password="1234",
-            port="5432"
-        )
-        cur = conn.cursor()
-
-        # ✅ Correct DELETE query
-        cur.execute(
-            """
-            DELETE FROM notifications
-            WHERE user_id = %s
-            AND created_at < NOW() - INTERVAL '1 day'
-            """,
-            (user_id,)
-        )
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                # ✅ Correct DELETE query
+                cur.execute(
+                    """
+                    DELETE FROM notifications
+                    WHERE user_id = %s
+                    AND created_at < NOW() - INTERVAL '1 day'
+                    """,
+                    (user_id,)
+                )
 
-        deleted_count = cur.rowcount
-        conn.commit()
+                deleted_count = cur.rowcount
+            conn.commit()
 
         return jsonify({
             "success": True,
@@ -898,12 +1057,6 @@ def mark_notification_read():
         print(f"Error deleting notification: {e}")
         return jsonify({"error": "Could not delete notification"}), 500
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-
 @auth_bp.route('/create_notification', methods=['POST'])
 @jwt_required()
 def create_notification():
@@ -950,6 +1103,18 @@ def create_notification():
             'message': f'Error creating notification: {str(e)}'
         }), 500
 
+@auth_bp.route('/health/db', methods=['GET'])
+def db_health():
+    """Ping the database through the shared pool and report pool-wait metrics"""
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        return jsonify({"status": "ok", "pool": pool_stats()}), 200
+    except Exception as e:
+        print(f"Database health check failed: {e}")
+        return jsonify({"status": "error", "message": str(e), "pool": pool_stats()}), 503
+
 if __name__=="__main__":  # Create tables
     populate_sample_stocks()  # Populate sample data
     auth_bp.run(debug=True,port=5173,host='0.0.0.0')
@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .db import get_connection
+from .embeddings import get_embedding
+from .rag import search_chat_messages
+from .llm import search_stock_documents, build_prompt, generate_answer, stream_answer
+from .vector_index import use_local_index, get_local_index
+from .answer_cache import answer_cache, cache_enabled, data_version
+from config import Config
+
+# -----------------------------
+# Single-pass chat pipeline
+# -----------------------------
+# embed -> (chat history + stock documents lookups in parallel) -> one prompt
+# -> generate -> persist. The question is embedded exactly once and that
+# vector drives both searches, and first the semantic answer cache: a close
+# enough earlier question over the same data skips retrieval and generation.
+
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=Config.CHAT_RETRIEVAL_WORKERS,
+    thread_name_prefix="chat-retrieval"
+)
+
+
+_stats_lock = threading.Lock()
+_stats = {
+    "streams": 0,
+    "streams_completed": 0,
+    "streams_aborted": 0,
+    "ttft_samples": 0,
+    "ttft_seconds_total": 0.0,
+    "ttft_seconds_max": 0.0,
+}
+
+
+def record_stream(ttft, completed):
+    with _stats_lock:
+        _stats["streams"] += 1
+        _stats["streams_completed" if completed else "streams_aborted"] += 1
+        if ttft is not None:
+            _stats["ttft_samples"] += 1
+            _stats["ttft_seconds_total"] += ttft
+            _stats["ttft_seconds_max"] = max(_stats["ttft_seconds_max"], ttft)
+
+
+def chat_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["ttft_seconds_avg"] = (
+        stats["ttft_seconds_total"] / stats["ttft_samples"] if stats["ttft_samples"] else 0.0
+    )
+    return stats
+
+
+def sse_event(data, event=None, event_id=None):
+    """Format one Server-Sent Events message."""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    if event:
+        prefix += f"event: {event}\n"
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def cache_metadata(hit):
+    if hit is None:
+        return {"hit": False}
+    return {
+        "hit": True,
+        "similarity": round(hit.similarity, 4),
+        "age_seconds": round(hit.age, 1),
+        "saved_ms": round(hit.saved_seconds * 1000, 2),
+    }
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings = {}
+
+    def run(self, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+
+    async def run_async(self, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            return await fn(*args)
+        finally:
+            self.timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+
+
+class ChatPipeline:
+    def __init__(self, history_k=5, documents_k=5):
+        self.history_k = history_k
+        self.documents_k = documents_k
+
+    def retrieve(self, embedding):
+        """Run the chat_messages and stock_documents lookups concurrently from one vector."""
+        history = _retrieval_executor.submit(search_chat_messages, embedding, self.history_k)
+        documents = _retrieval_executor.submit(search_stock_documents, embedding, self.documents_k)
+        return history.result(), documents.result()
+
+    def persist(self, message, embedding, response):
+        local = use_local_index()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                if local:
+                    # No vector column without pgvector; the local index holds the embedding
+                    cur.execute(
+                        """
+                        INSERT INTO chat_messages (role, content)
+                        VALUES ('user', %s)
+                        RETURNING id
+                        """,
+                        (message,)
+                    )
+                else:
+                    cur.execute(
+                        """
+                        INSERT INTO chat_messages (role, content, embedding)
+                        VALUES ('user', %s, %s)
+                        RETURNING id
+                        """,
+                        (message, embedding)
+                    )
+                message_id = cur.fetchone()[0]
+                if response is not None:
+                    cur.execute(
+                        """
+                        INSERT INTO chat_messages (role, content)
+                        VALUES ('assistant', %s)
+                        """,
+                        (response,)
+                    )
+            conn.commit()
+        if local:
+            get_local_index("chat_messages").add([embedding], [{"id": message_id, "content": message}])
+
+    def lookup_cached(self, embedding):
+        """(data version, CacheHit or None); the version is None when the cache is off or unavailable."""
+        if not cache_enabled():
+            return None, None
+        try:
+            version = data_version()
+        except Exception as e:
+            print(f"Answer cache unavailable: {e}")
+            return None, None
+        return version, answer_cache.lookup(embedding, version)
+
+    def prepare(self, message, embedding, timer):
+        """Retrieve context for an embedded message; returns the prompt."""
+        history, documents = timer.run("retrieve", self.retrieve, embedding)
+        return build_prompt(message, documents, history)
+
+    def run(self, message):
+        """Answer one message; returns (response, metadata)."""
+        timer = StageTimer()
+        total_start = time.perf_counter()
+
+        embedding = timer.run("embed", get_embedding, message)
+        version, hit = timer.run("cache", self.lookup_cached, embedding)
+        if hit is not None:
+            response = hit.answer
+        else:
+            answer_start = time.perf_counter()
+            prompt = self.prepare(message, embedding, timer)
+            response = timer.run("generate", generate_answer, prompt)
+            if version is not None:
+                answer_cache.store(embedding, response, version, time.perf_counter() - answer_start)
+        # Persisted after retrieval so the question never retrieves itself
+        timer.run("persist", self.persist, message, embedding, response)
+
+        timer.timings["total"] = round((time.perf_counter() - total_start) * 1000, 2)
+        return response, {"timings_ms": timer.timings, "cache": cache_metadata(hit)}
+
+    def stream(self, message):
+        """
+        Answer one message as Server-Sent Events.
+
+        Emits a `token` event per generated chunk and a final `done` event with
+        the timings. The conversation is stored once the stream completes; if
+        the client disconnects first only the question is kept.
+        """
+        timer = StageTimer()
+        total_start = time.perf_counter()
+        ttft = None
+        parts = []
+        completed = False
+        embedding = None
+
+        hit = None
+
+        try:
+            embedding = timer.run("embed", get_embedding, message)
+            version, hit = timer.run("cache", self.lookup_cached, embedding)
+            if hit is not None:
+                # The whole cached answer goes out as one token event
+                ttft = time.perf_counter() - total_start
+                parts.append(hit.answer)
+                yield sse_event({"token": hit.answer}, "token")
+            else:
+                answer_start = time.perf_counter()
+                prompt = self.prepare(message, embedding, timer)
+                generate_start = time.perf_counter()
+                for token in stream_answer(prompt):
+                    if ttft is None:
+                        ttft = time.perf_counter() - total_start
+                    parts.append(token)
+                    yield sse_event({"token": token}, "token")
+                timer.timings["generate"] = round((time.perf_counter() - generate_start) * 1000, 2)
+                if version is not None:
+                    answer_cache.store(embedding, "".join(parts).strip(), version, time.perf_counter() - answer_start)
+            completed = True
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event({"error": "Could not generate a response"}, "error")
+        finally:
+            record_stream(ttft, completed)
+            if embedding is not None:
+                response = "".join(parts).strip() if completed else None
+                try:
+                    timer.run("persist", self.persist, message, embedding, response)
+                except Exception as e:
+                    print(f"Chat persist error: {e}")
+
+        if completed:
+            timer.timings["total"] = round((time.perf_counter() - total_start) * 1000, 2)
+            if ttft is not None:
+                timer.timings["ttft"] = round(ttft * 1000, 2)
+            yield sse_event({"timings_ms": timer.timings, "cache": cache_metadata(hit)}, "done")
+
+
+pipeline = ChatPipeline()
@@ -1,4 +1,184 @@
 # app/db.py
+import threading
+import time
+from contextlib import contextmanager
+
 from flask_sqlalchemy import SQLAlchemy
+from psycopg2 import extensions, pool as pg_pool
+from pgvector.psycopg2 import register_vector
+from .metrics import InstrumentedConnection
+from config import Config
 
 db = SQLAlchemy()
+
+
+# -----------------------------
+# Pooled psycopg2 connections
+# -----------------------------
+class _VectorConnectionPool(pg_pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that registers the pgvector adapter on every new connection."""
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        # Deployments using the local vector index may not have the extension
+        if Config.VECTOR_BACKEND != "local":
+            register_vector(conn)
+        return conn
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of psycopg2 connections.
+
+    Callers block for up to `timeout` seconds when every connection is checked
+    out instead of failing immediately, and connections that sat idle longer
+    than `healthcheck_seconds` are pinged before being handed out.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, healthcheck_seconds, **dsn):
+        self.timeout = timeout
+        self.healthcheck_seconds = healthcheck_seconds
+        self._pool = _VectorConnectionPool(minconn, maxconn, **dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "size": maxconn,
+            "in_use": 0,
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "healthcheck_failures": 0,
+        }
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0) < self.healthcheck_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise pg_pool.PoolError(f"no database connection available after {self.timeout}s")
+
+        try:
+            conn = self._pool.getconn()
+            if not self._is_healthy(conn):
+                with self._lock:
+                    self._stats["healthcheck_failures"] += 1
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._stats["in_use"] += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        return conn
+
+    def putconn(self, conn):
+        try:
+            broken = bool(conn.closed)
+            if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                # Never hand an open or aborted transaction to the next request
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            if broken:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=broken)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["wait_seconds_avg"] = (
+            stats["wait_seconds_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        )
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    Config.DB_POOL_MIN,
+                    Config.DB_POOL_MAX,
+                    Config.DB_POOL_TIMEOUT,
+                    Config.DB_POOL_HEALTHCHECK_SECONDS,
+                    # Cursors record statement counts and timings (app/metrics.py)
+                    connection_factory=InstrumentedConnection,
+                    **Config.DB_CONFIG
+                )
+    return _pool
+
+
+@contextmanager
+def get_connection():
+    """
+    Check a connection out of the shared pool for the duration of a block.
+
+    The caller commits; anything left uncommitted is rolled back when the
+    connection is returned.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def close_pool():
+    """Close every pooled connection; the next get_connection() opens a new pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats():
+    return get_pool().stats() if _pool is not None else {}
+
+
+def sqlalchemy_engine_options():
+    """Size the SQLAlchemy engine pool from the same settings as the psycopg2 pool."""
+    return {
+        "pool_size": Config.DB_POOL_MAX,
+        "max_overflow": 0,
+        "pool_timeout": Config.DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
@@ -1,14 +1,322 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import requests
+from .metrics import outbound
+from config import Config
 
-OLLAMA_URL = "http://localhost:11434/api/embeddings"
-EMBED_MODEL = "nomic-embed-text"
+# -----------------------------
+# Embedding service
+# -----------------------------
+# Single entry point for Ollama embeddings. Lookups go memory LRU -> on-disk
+# cache -> Ollama, and every vector fetched from Ollama is written back to
+# both caches, so identical text is only ever embedded once per model.
 
-def get_embedding(text: str):
-    res = requests.post(
-        OLLAMA_URL,
-        json={
-            "model": EMBED_MODEL,
-            "prompt": text
+KEY_BYTES = 20  # sha1 digest
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(text, model):
+    return hashlib.sha1(f"{model}\x00{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class DiskEmbeddingCache:
+    """
+    Append-only file of (sha1 key, float32[dim]) records, read through a memory map.
+
+    The key index is rebuilt from the file on startup, so vectors survive
+    restarts without a separate metadata store. Several processes (gunicorn
+    workers, the ingestion worker) may share the file: appends happen under
+    an exclusive flock with the end of the file re-read inside it, and each
+    append first indexes whatever other processes wrote since.
+    """
+
+    def __init__(self, path, dim):
+        self.path = path
+        self.dim = dim
+        self.record_bytes = KEY_BYTES + dim * 4
+        self._lock = threading.Lock()
+        self._offsets = {}
+        self._indexed_size = 0
+        self._map = None
+        self._mapped_size = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        with self._locked_file() as fd:
+            self._sync(fd)
+        self._remap(self._indexed_size)
+
+    @contextmanager
+    def _locked_file(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _sync(self, fd):
+        """Index records appended by other processes; call with the file lock held."""
+        size = os.fstat(fd).st_size
+        usable = size - size % self.record_bytes
+        if usable != size:
+            # A writer died mid-record; nobody else can be writing while we hold the lock
+            os.ftruncate(fd, usable)
+        for offset in range(self._indexed_size, usable, self.record_bytes):
+            self._offsets.setdefault(os.pread(fd, KEY_BYTES, offset), offset + KEY_BYTES)
+        self._indexed_size = usable
+
+    def _remap(self, size):
+        self._map = np.memmap(self.path, dtype=np.uint8, mode="r", shape=(size,)) if size else None
+        self._mapped_size = size
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def get(self, key):
+        offset = self._offsets.get(key)
+        if offset is None:
+            return None
+        with self._lock:
+            if offset + self.dim * 4 > self._mapped_size:
+                self._remap(self._indexed_size)
+            data = self._map[offset:offset + self.dim * 4]
+        return np.frombuffer(data.tobytes(), dtype=np.float32)
+
+    def put_many(self, items):
+        with self._lock, self._locked_file() as fd:
+            self._sync(fd)
+            records = []
+            added = {}
+            for key, vector in items:
+                if key in self._offsets or key in added:
+                    continue
+                vector = np.asarray(vector, dtype=np.float32)
+                if vector.shape != (self.dim,):
+                    continue
+                added[key] = self._indexed_size + len(records) * self.record_bytes + KEY_BYTES
+                records.append(key + vector.tobytes())
+            if not records:
+                return
+            data = memoryview(b"".join(records))
+            while data:
+                data = data[os.write(fd, data):]
+            # Offsets are published only once the records are fully written
+            self._offsets.update(added)
+            self._indexed_size += len(records) * self.record_bytes
+
+
+class EmbeddingClient:
+    def __init__(self, base_url, model, dim, timeout, cache_size, cache_dir, batch_size, concurrency,
+                 use_batch_endpoint=False):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.dim = dim
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.session = requests.Session()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._batch_supported = use_batch_endpoint
+        self._disk = None
+        if cache_dir:
+            safe_model = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            self._disk = DiskEmbeddingCache(os.path.join(cache_dir, f"{safe_model}-{dim}.bin"), dim)
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "requests": 0,
+            "request_seconds_total": 0.0,
+            "errors": 0,
         }
-    )
-    return res.json()["embedding"]  # 768-dim list
+
+    # ---------- cache ----------
+    def _lru_get(self, key):
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_put(self, key, vector):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.cache_size:
+                self._lru.popitem(last=False)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def lookup(self, key):
+        vector = self._lru_get(key)
+        if vector is not None:
+            self._count("memory_hits")
+            return vector
+        if self._disk is not None:
+            vector = self._disk.get(key)
+            if vector is not None:
+                self._count("disk_hits")
+                self._lru_put(key, vector)
+                return vector
+        return None
+
+    # ---------- Ollama ----------
+    def _request_one(self, text):
+        start = time.perf_counter()
+        try:
+            with outbound("ollama"):
+                res = self.session.post(
+                    f"{self.base_url}/api/embeddings",
+                    json={"model": self.model, "prompt": text},
+                    timeout=self.timeout
+                )
+            res.raise_for_status()
+            return np.asarray(res.json()["embedding"], dtype=np.float32)
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._count("requests")
+            self._count("request_seconds_total", time.perf_counter() - start)
+
+    def _request_batch(self, texts):
+        """Embed a list of texts with Ollama's batch endpoint; returns None if unsupported."""
+        start = time.perf_counter()
+        try:
+            with outbound("ollama"):
+                res = self.session.post(
+                    f"{self.base_url}/api/embed",
+                    json={"model": self.model, "input": texts},
+                    timeout=self.timeout
+                )
+            if res.status_code == 404:
+                self._batch_supported = False
+                return None
+            res.raise_for_status()
+            return [np.asarray(v, dtype=np.float32) for v in res.json()["embeddings"]]
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._count("requests")
+            self._count("request_seconds_total", time.perf_counter() - start)
+
+    def _fetch(self, texts):
+        if self._batch_supported:
+            vectors = []
+            for i in range(0, len(texts), self.batch_size):
+                batch = self._request_batch(texts[i:i + self.batch_size])
+                if batch is None:
+                    break
+                vectors.extend(batch)
+            else:
+                return vectors
+            # Older Ollama without /api/embed: finish the rest one text at a time
+            texts = texts[len(vectors):]
+        else:
+            vectors = []
+
+        if len(texts) == 1:
+            return vectors + [self._request_one(texts[0])]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(texts))) as executor:
+            return vectors + list(executor.map(self._request_one, texts))
+
+    # ---------- public API ----------
+    def embed_many(self, texts):
+        """Return one float32 vector per text, embedding only the texts not cached yet."""
+        keys = [cache_key(t, self.model) for t in texts]
+        results = [None] * len(texts)
+        pending = OrderedDict()
+        for i, key in enumerate(keys):
+            vector = self.lookup(key)
+            if vector is not None:
+                results[i] = vector
+            else:
+                pending.setdefault(key, []).append(i)
+
+        if pending:
+            missing_texts = [normalize_text(texts[indexes[0]]) for indexes in pending.values()]
+            fetched = self._fetch(missing_texts)
+            self.remember(list(pending.keys()), fetched)
+            for indexes, vector in zip(pending.values(), fetched):
+                for i in indexes:
+                    results[i] = vector
+        return results
+
+    def remember(self, keys, vectors):
+        """Add vectors fetched outside embed_many (e.g. by the async client) to both caches."""
+        self._count("misses", len(keys))
+        for key, vector in zip(keys, vectors):
+            self._lru_put(key, vector)
+        if self._disk is not None:
+            self._disk.put_many(zip(keys, vectors))
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._lru)
+        stats["disk_entries"] = len(self._disk) if self._disk is not None else 0
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["request_seconds_avg"] = (
+            stats["request_seconds_total"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        return stats
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = EmbeddingClient(
+                    Config.OLLAMA_URL,
+                    Config.EMBED_MODEL,
+                    Config.EMBED_DIM,
+                    Config.EMBED_TIMEOUT,
+                    Config.EMBED_CACHE_SIZE,
+                    Config.EMBED_CACHE_DIR,
+                    Config.EMBED_BATCH_SIZE,
+                    Config.EMBED_CONCURRENCY,
+                    Config.EMBED_BATCH_ENDPOINT,
+                )
+    return _client
+
+
+def get_embedding(text: str):
+    return get_client().embed(text).tolist()  # 768-dim list
+
+
+def embed_many(texts):
+    return [vector.tolist() for vector in get_client().embed_many(list(texts))]
+
+
+def embedding_stats():
+    return get_client().stats() if _client is not None else {}
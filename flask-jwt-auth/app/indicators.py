@@ -0,0 +1,439 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from .db import get_connection
+from .screener import universe
+from config import Config
+
+# -----------------------------
+# Technical indicators
+# -----------------------------
+# IndicatorState keeps the rolling state of every indicator for many symbols
+# as one NumPy array per quantity (running window sums, EMAs, Wilder
+# averages, a ring buffer of recent closes). Appending a bar for any subset of
+# symbols is a fixed number of vector operations, independent of how much
+# history is behind it. A full computation is the same step replayed over the
+# history, so both paths give identical numbers.
+#
+# IndicatorEngine loads daily bars from price_bars, replays them once, then
+# follows new and revised bars incrementally. Its latest values are exposed to
+# the screener as extra columns (rsi_14 < 30 and last_traded_price > sma_200).
+
+SMA_PERIODS = (20, 50, 200)
+EMA_PERIODS = (12, 26)
+MACD_SIGNAL = 9
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+BB_PERIOD = 20
+BB_WIDTH = 2.0
+
+INDICATOR_COLUMNS = (
+    "sma_20", "sma_50", "sma_200", "ema_12", "ema_26",
+    "macd", "macd_signal", "macd_hist", "rsi_14",
+    "bb_upper", "bb_middle", "bb_lower", "atr_14",
+)
+
+# Ring buffer holds one more close than the longest window, so revising the
+# newest bar never overwrites the value about to leave a window
+_RING = max(SMA_PERIODS + (BB_PERIOD,)) + 1
+
+# Per-symbol scalars saved before each append so the newest bar can be revised
+_SCALARS = (
+    "count", "prev_close", "sumsq", "ema_12", "ema_26", "signal",
+    "avg_gain", "avg_loss", "atr", "last_close", "last_high", "last_low",
+) + tuple(f"sum_{n}" for n in SMA_PERIODS)
+
+
+class IndicatorState:
+    """Rolling indicator state for `size` symbols (rows)."""
+
+    def __init__(self, size):
+        self.size = size
+        self.ring = np.zeros((size, _RING), dtype=np.float64)
+        self.count = np.zeros(size, dtype=np.int64)
+        for name in _SCALARS:
+            if name != "count":
+                setattr(self, name, np.zeros(size, dtype=np.float64))
+        self._prev = {name: getattr(self, name).copy() for name in _SCALARS}
+
+    def step(self, rows, close, high, low, replace=None):
+        """
+        Apply one bar to each of `rows` (symbol positions).
+
+        Where `replace` is True the bar replaces that symbol's newest bar
+        instead of following it (an intraday revision of today's EOD bar).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        close = np.asarray(close, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        if replace is not None:
+            revised = rows[np.asarray(replace, dtype=bool)]
+            for name in _SCALARS:
+                getattr(self, name)[revised] = self._prev[name][revised]
+        for name in _SCALARS:
+            self._prev[name][rows] = getattr(self, name)[rows]
+
+        k = self.count[rows]
+        first = k == 0
+
+        for n in SMA_PERIODS:
+            leaving = np.where(k >= n, self.ring[rows, (k - n) % _RING], 0.0)
+            getattr(self, f"sum_{n}")[rows] += close - leaving
+        leaving = np.where(k >= BB_PERIOD, self.ring[rows, (k - BB_PERIOD) % _RING], 0.0)
+        self.sumsq[rows] += close * close - leaving * leaving
+        self.ring[rows, k % _RING] = close
+
+        emas = {}
+        for n in EMA_PERIODS:
+            ema = getattr(self, f"ema_{n}")
+            previous = ema[rows]
+            emas[n] = np.where(first, close, previous + (2.0 / (n + 1)) * (close - previous))
+            ema[rows] = emas[n]
+        macd = emas[12] - emas[26]
+        signal = self.signal[rows]
+        # The signal line starts at the first bar where MACD itself is defined
+        self.signal[rows] = np.where(
+            k + 1 <= 26, macd, signal + (2.0 / (MACD_SIGNAL + 1)) * (macd - signal)
+        )
+
+        prev_close = self.prev_close[rows]
+        change = np.where(first, 0.0, close - prev_close)
+        gain = np.maximum(change, 0.0)
+        loss = np.maximum(-change, 0.0)
+        # Wilder averages are seeded with the plain mean of the first period:
+        # the arrays hold running sums until then (changes start at bar 1)
+        for name, value in (("avg_gain", gain), ("avg_loss", loss)):
+            avg = getattr(self, name)
+            previous = avg[rows]
+            avg[rows] = np.select(
+                [k < RSI_PERIOD, k == RSI_PERIOD],
+                [previous + value, (previous + value) / RSI_PERIOD],
+                previous + (value - previous) / RSI_PERIOD
+            )
+
+        true_range = np.where(
+            first, high - low,
+            np.maximum.reduce([high - low, np.abs(high - prev_close), np.abs(low - prev_close)])
+        )
+        previous = self.atr[rows]
+        self.atr[rows] = np.select(
+            [k < ATR_PERIOD - 1, k == ATR_PERIOD - 1],
+            [previous + true_range, (previous + true_range) / ATR_PERIOD],
+            previous + (true_range - previous) / ATR_PERIOD
+        )
+
+        self.prev_close[rows] = close
+        self.last_close[rows] = close
+        self.last_high[rows] = high
+        self.last_low[rows] = low
+        self.count[rows] = k + 1
+
+    def values(self, rows=None):
+        """Current value of every indicator; NaN until a symbol has enough bars."""
+        pick = (lambda a: a) if rows is None else (lambda a: a[rows])
+        count = pick(self.count)
+        out = {}
+        for n in SMA_PERIODS:
+            out[f"sma_{n}"] = np.where(count >= n, pick(getattr(self, f"sum_{n}")) / n, np.nan)
+        for n in EMA_PERIODS:
+            out[f"ema_{n}"] = np.where(count >= n, pick(getattr(self, f"ema_{n}")), np.nan)
+
+        macd = pick(self.ema_12) - pick(self.ema_26)
+        signal = pick(self.signal)
+        ready = count >= 26 + MACD_SIGNAL - 1
+        out["macd"] = np.where(count >= 26, macd, np.nan)
+        out["macd_signal"] = np.where(ready, signal, np.nan)
+        out["macd_hist"] = np.where(ready, macd - signal, np.nan)
+
+        avg_gain = pick(self.avg_gain)
+        avg_loss = pick(self.avg_loss)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(
+                avg_loss > 0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss),
+                np.where(avg_gain > 0, 100.0, 50.0)
+            )
+        out["rsi_14"] = np.where(count > RSI_PERIOD, rsi, np.nan)
+
+        middle = out["sma_20"]
+        variance = pick(self.sumsq) / BB_PERIOD - middle * middle
+        std = np.sqrt(np.maximum(variance, 0.0))
+        out["bb_middle"] = middle
+        out["bb_upper"] = middle + BB_WIDTH * std
+        out["bb_lower"] = middle - BB_WIDTH * std
+
+        out["atr_14"] = np.where(count >= ATR_PERIOD, pick(self.atr), np.nan)
+        return out
+
+
+def compute_indicators(close, high, low, state=None):
+    """
+    Full indicator series for a (symbols, bars) panel, oldest bar first.
+
+    Shorter histories are left-padded with NaN. Returns {name: (symbols, bars)}
+    and leaves `state` (if given) positioned after the last bar.
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    high = np.atleast_2d(np.asarray(high, dtype=np.float64))
+    low = np.atleast_2d(np.asarray(low, dtype=np.float64))
+    size, bars = close.shape
+    state = state or IndicatorState(size)
+    out = {name: np.full((size, bars), np.nan) for name in INDICATOR_COLUMNS}
+    for t in range(bars):
+        rows = np.flatnonzero(~np.isnan(close[:, t]))
+        if len(rows) == 0:
+            continue
+        state.step(rows, close[rows, t], high[rows, t], low[rows, t])
+        for name, values in state.values(rows).items():
+            out[name][rows, t] = values
+    return out
+
+
+def replay(close, high, low, state=None):
+    """Advance `state` over a padded panel without materializing the series."""
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    state = state or IndicatorState(close.shape[0])
+    for t in range(close.shape[1]):
+        rows = np.flatnonzero(~np.isnan(close[:, t]))
+        if len(rows):
+            state.step(rows, close[rows, t], np.asarray(high)[rows, t], np.asarray(low)[rows, t])
+    return state
+
+
+def _panel(series):
+    """{symbol: [(ts, high, low, close), ...]} -> symbols, last ts, and padded arrays."""
+    symbols = sorted(series)
+    width = max((len(bars) for bars in series.values()), default=0)
+    close = np.full((len(symbols), width), np.nan)
+    high = np.full((len(symbols), width), np.nan)
+    low = np.full((len(symbols), width), np.nan)
+    last_ts = []
+    for i, symbol in enumerate(symbols):
+        bars = series[symbol]
+        start = width - len(bars)
+        high[i, start:] = [bar[1] for bar in bars]
+        low[i, start:] = [bar[2] for bar in bars]
+        close[i, start:] = [bar[3] for bar in bars]
+        last_ts.append(bars[-1][0])
+    return symbols, last_ts, close, high, low
+
+
+class IndicatorEngine:
+    """Latest daily indicators for every symbol in price_bars, kept current incrementally."""
+
+    names = INDICATOR_COLUMNS
+
+    def __init__(self, lookback, refresh_seconds, reload_seconds):
+        self.lookback = lookback
+        self.refresh_seconds = refresh_seconds
+        self.reload_seconds = reload_seconds
+        self._lock = threading.RLock()
+        # Held by the one caller running reload()/refresh(); not while reading
+        self._update_lock = threading.Lock()
+        self.state = None
+        self.symbols = []
+        self.index = {}
+        self.last_ts = []
+        self.version = 0
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+        self._values = None
+        self._stats = {"reloads": 0, "refreshes": 0, "bars_applied": 0, "bars_revised": 0}
+
+    def _load_series(self, cur):
+        days = int(self.lookback * 1.5) + 10  # trading days -> calendar days
+        cur.execute(
+            """
+            SELECT symbol, ts, high, low, close
+            FROM (
+                SELECT symbol, ts, high, low, close,
+                       row_number() OVER (PARTITION BY symbol ORDER BY ts DESC) AS rn
+                FROM price_bars
+                WHERE bar_interval = '1d' AND ts >= %s
+            ) recent
+            WHERE rn <= %s
+            ORDER BY symbol, ts
+            """,
+            (datetime.now(timezone.utc) - timedelta(days=days), self.lookback)
+        )
+        series = {}
+        for symbol, ts, high, low, close in cur.fetchall():
+            series.setdefault(symbol, []).append((ts, high, low, close))
+        return series
+
+    def reload(self):
+        """Rebuild the state from the last `lookback` daily bars of every symbol."""
+        start = time.perf_counter()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                series = self._load_series(cur)
+        symbols, last_ts, close, high, low = _panel(series)
+        state = replay(close, high, low)
+        with self._lock:
+            self.state = state
+            self.symbols = symbols
+            self.index = {symbol: i for i, symbol in enumerate(symbols)}
+            self.last_ts = last_ts
+            self._values = None
+            self.version += 1
+            self.loaded_at = self.refreshed_at = time.time()
+            self._stats["reloads"] += 1
+            self._stats["last_reload_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    def refresh(self):
+        """
+        Apply bars written since the last refresh, revising each symbol's newest
+        bar if it moved. Symbols new to price_bars are picked up by reload().
+        """
+        with self._lock:
+            loaded = self.state is not None
+            symbols, last_ts = list(self.symbols), list(self.last_ts)
+        if not loaded or not symbols:
+            return self.reload()
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT p.symbol, p.ts, p.high, p.low, p.close
+                    FROM price_bars p
+                    JOIN unnest(%s::text[], %s::timestamptz[]) AS s(symbol, last_ts)
+                        ON p.symbol = s.symbol AND p.ts >= s.last_ts
+                    WHERE p.bar_interval = '1d'
+                    ORDER BY p.symbol, p.ts
+                    """,
+                    (symbols, last_ts)
+                )
+                rows = cur.fetchall()
+
+        with self._lock:
+            pending = {}
+            for symbol, ts, high, low, close in rows:
+                pending.setdefault(self.index[symbol], []).append((ts, high, low, close))
+
+            applied = revised = 0
+            # Round r applies the r-th pending bar of every symbol at once
+            for r in range(max((len(bars) for bars in pending.values()), default=0)):
+                batch, replace = [], []
+                for i, bars in pending.items():
+                    if r >= len(bars):
+                        continue
+                    ts, high, low, close = bars[r]
+                    same_bar = ts == self.last_ts[i]
+                    if same_bar and (close, high, low) == (
+                        self.state.last_close[i], self.state.last_high[i], self.state.last_low[i]
+                    ):
+                        continue
+                    batch.append((i, close, high, low))
+                    replace.append(same_bar)
+                    self.last_ts[i] = ts
+                if batch:
+                    rows_, close_, high_, low_ = zip(*batch)
+                    self.state.step(rows_, close_, high_, low_, replace)
+                    revised += sum(replace)
+                    applied += len(batch) - sum(replace)
+
+            if applied or revised:
+                self._values = None
+                self.version += 1
+            self.refreshed_at = time.time()
+            self._stats["refreshes"] += 1
+            self._stats["bars_applied"] += applied
+            self._stats["bars_revised"] += revised
+
+    def _due(self):
+        """The update the state needs now (reload, refresh or None); call under _lock."""
+        now = time.time()
+        if self.state is None or now - self.loaded_at > self.reload_seconds:
+            return self.reload
+        if now - self.refreshed_at > self.refresh_seconds:
+            return self.refresh
+        return None
+
+    def ensure_fresh(self):
+        """
+        Reload or refresh when due. Staleness is decided under the lock but the
+        queries and replay run outside it; while one caller updates, the others
+        keep reading the current values (or wait, before the first load).
+        """
+        with self._lock:
+            if self._due() is None:
+                return
+            loaded = self.state is not None
+        if not self._update_lock.acquire(blocking=not loaded):
+            return
+        try:
+            with self._lock:
+                update = self._due()
+            if update is not None:
+                update()
+        finally:
+            self._update_lock.release()
+
+    def _latest(self):
+        if self._values is None:
+            self._values = self.state.values()
+        return self._values
+
+    def latest(self, symbol):
+        """{indicator: value} for one symbol, or None if it has no daily bars."""
+        self.ensure_fresh()
+        with self._lock:
+            i = self.index.get(symbol.upper())
+            if i is None:
+                return None
+            values = self._latest()
+            return {
+                "as_of": self.last_ts[i].isoformat(),
+                "bars": int(self.state.count[i]),
+                "values": {name: _float(values[name][i]) for name in INDICATOR_COLUMNS},
+            }
+
+    def columns(self):
+        """Screener column provider: (version, {symbol: row}, {name: array})."""
+        self.ensure_fresh()
+        with self._lock:
+            return self.version, self.index, self._latest()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["symbols"] = len(self.symbols)
+            stats["version"] = self.version
+        return stats
+
+
+def _float(value):
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4)
+
+
+def indicator_series(bars, history):
+    """Indicator values for the newest `history` of `bars` [(ts, high, low, close), ...]."""
+    _, _, close, high, low = _panel({"_": bars})
+    series = compute_indicators(close, high, low)
+    start = max(0, len(bars) - history)
+    return [
+        dict(
+            {"date": bars[t][0].astimezone(timezone.utc).date().isoformat(), "close": bars[t][3]},
+            **{name: _float(series[name][0, t]) for name in INDICATOR_COLUMNS}
+        )
+        for t in range(start, len(bars))
+    ]
+
+
+engine = IndicatorEngine(
+    Config.INDICATOR_LOOKBACK,
+    Config.INDICATOR_REFRESH_SECONDS,
+    Config.INDICATOR_RELOAD_SECONDS,
+)
+universe.register_columns(engine)
+
+
+def get_indicators(symbol):
+    return engine.latest(symbol)
+
+
+def indicator_stats():
+    return engine.stats()
@@ -0,0 +1,130 @@
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from .db import get_connection
+from .marketdata import get_market_client, store_series, MarketstackError
+from .notifications import update_stocks_bulk
+from .price_bars import bars_from_rows, store_bars
+from config import Config
+
+# -----------------------------
+# Market data ingestion worker
+# -----------------------------
+# Runs outside the web process (see ingest.py). Each cycle:
+#   1. fetches the latest bar for every symbol in stock_data with multi-symbol
+#      requests, records them in price_bars and applies them with one bulk
+#      update,
+#   2. refreshes the cached EOD history of watched symbols whose cache is stale,
+# so request handlers read prices and chart history from Postgres.
+
+
+class IngestionWorker:
+    def __init__(self, client, interval, history_limit):
+        self.client = client
+        self.interval = interval
+        self.history_limit = history_limit
+        self.stop_event = threading.Event()
+
+    def tracked_symbols(self):
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT DISTINCT symbol FROM stock_data ORDER BY symbol")
+                return [row[0] for row in cur.fetchall()]
+
+    def stale_watched_symbols(self):
+        """Watched symbols whose cached EOD history is missing or too old."""
+        cutoff = datetime.utcnow() - timedelta(seconds=Config.MARKET_EOD_MAX_AGE)
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT DISTINCT w.symbol_name
+                    FROM watchlist_selected_item_history w
+                    LEFT JOIN market_data_cache c
+                        ON c.symbol = w.symbol_name AND c.data_type = 'eod'
+                    WHERE w.status = 'selected'
+                      AND (c.fetched_at IS NULL OR c.fetched_at < %s OR c.bar_limit < %s)
+                    """,
+                    (cutoff, self.history_limit)
+                )
+                return [row[0] for row in cur.fetchall()]
+
+    def poll_quotes(self):
+        symbols = self.tracked_symbols()
+        quotes = self.client.latest_quotes(symbols)
+        ticks = [
+            {
+                "symbol": symbol,
+                "open": row["open"],
+                "high": row["high"],
+                "low": row["low"],
+                "close": row["close"],
+            }
+            for symbol, row in quotes.items()
+        ]
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                store_bars(cur, "1d", bars_from_rows(None, list(quotes.values())))
+            conn.commit()
+        changes = update_stocks_bulk(ticks)
+        return len(symbols), len(ticks), len(changes)
+
+    def refresh_history(self):
+        refreshed = 0
+        for symbol in self.stale_watched_symbols():
+            if self.stop_event.is_set():
+                break
+            try:
+                payload = self.client.ticker_series(symbol, "eod", self.history_limit)
+            except MarketstackError as e:
+                print(f"History refresh failed for {symbol}: {e}")
+                continue
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    store_series(cur, symbol, "eod", payload, self.history_limit)
+                conn.commit()
+            refreshed += 1
+        return refreshed
+
+    def run_once(self):
+        start = time.perf_counter()
+        tracked, quoted, changed = self.poll_quotes()
+        refreshed = self.refresh_history()
+        print(
+            f"Ingestion cycle: {quoted}/{tracked} quotes, {changed} changed, "
+            f"{refreshed} histories refreshed in {time.perf_counter() - start:.2f}s"
+        )
+
+    def run_forever(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Ingestion cycle failed: {e}")
+            self.stop_event.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Poll Marketstack and update stock_data in bulk")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    parser.add_argument("--interval", type=float, default=Config.INGEST_INTERVAL)
+    parser.add_argument("--history-limit", type=int, default=Config.INGEST_HISTORY_LIMIT)
+    args = parser.parse_args(argv)
+
+    client = get_market_client()
+    if not client.configured:
+        raise SystemExit("MARKET_STACK_API_KEY is not configured")
+
+    worker = IngestionWorker(client, args.interval, args.history_limit)
+    if args.once:
+        worker.run_once()
+    else:
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            worker.stop()
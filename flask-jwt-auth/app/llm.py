@@ -1,12 +1,11 @@
 import os
-import psycopg2
 import numpy as np
 from openai import OpenAI
 from dotenv import load_dotenv
-import requests
+from .db import get_connection
+from .metrics import outbound
+from .vector_index import tune_vector_search, use_local_index, search_local
 
-OLLAMA_URL = "http://localhost:11434/api/embeddings"
-EMBED_MODEL = "nomic-embed-text"
 load_dotenv()
 
 # -----------------------------
@@ -14,61 +13,36 @@ load_dotenv()
 # -----------------------------
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# -----------------------------
-# PostgreSQL Configuration
-# -----------------------------
-DB_CONFIG = {
-    "dbname": "postgres",
-    "user": "postgres",
-    "password": 1234,
-    "host": "localhost",
-    "port": 5432
-}
-
 # -----------------------------
 # Utility: Connect DB
 # -----------------------------
 def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
-
-# -----------------------------
-# Create Embedding
-
-def get_embedding(text: str):
-    res = requests.post(
-        OLLAMA_URL,
-        json={
-            "model": EMBED_MODEL,
-            "prompt": text
-        }
-    )
-    return res.json()["embedding"] 
-# -----------------------------
-
+    """Check a connection out of the shared pool (use as a context manager)."""
+    return get_connection()
 
 
 # -----------------------------
 # Retrieve Relevant Documents
 # -----------------------------
-def retrieve_context(query: str, top_k: int = 5):
-    query_embedding = get_embedding(query)
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT content
-        FROM stock_documents
-        ORDER BY embedding <-> %s::vector
-        LIMIT %s;
-        """,
-        (query_embedding, top_k)
-    )
-
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
+def search_stock_documents(query_embedding, top_k: int = 5, ef_search=None, probes=None):
+    """Nearest stock_documents to an already computed query embedding."""
+    if use_local_index():
+        return "\n".join(search_local("stock_documents", query_embedding, top_k))
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            tune_vector_search(cur, ef_search, probes)
+            cur.execute(
+                """
+                SELECT content
+                FROM stock_documents
+                ORDER BY embedding <-> %s::vector
+                LIMIT %s;
+                """,
+                (query_embedding, top_k)
+            )
+
+            results = cur.fetchall()
 
     return "\n".join([row[0] for row in results])
 
@@ -76,10 +50,16 @@ def retrieve_context(query: str, top_k: int = 5):
 # -----------------------------
 # GPT-5 RAG Response
 # -----------------------------
-def call_ai_model(user_query: str):
-    context = retrieve_context(user_query)
+SYSTEM_PROMPT = "You are a financial stock advisory assistant."
+
 
-    prompt = f"""
+def build_prompt(user_query: str, context: str, history: str = ""):
+    history_block = f"""
+Related conversation history:
+{history}
+""" if history else ""
+
+    return f"""
 You are a professional stock market advisor.
 
 Use ONLY the context below to answer the question.
@@ -87,21 +67,46 @@ If the context is insufficient, say you don't have enough data.
 
 Context:
 {context}
-
+{history_block}
 Question:
 {user_query}
 
 Answer:
 """
 
-    response = client.chat.completions.create(
-        model="gpt-5",
-        messages=[
-            {"role": "system", "content": "You are a financial stock advisory assistant."},
-            {"role": "user", "content": prompt}
-        ],
-    )
+
+def build_messages(prompt: str):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def generate_answer(prompt: str):
+    with outbound("openai"):
+        response = client.chat.completions.create(
+            model="gpt-5",
+            messages=build_messages(prompt),
+        )
 
     return response.choices[0].message.content.strip()
 
+
+def stream_answer(prompt: str):
+    """Yield the completion text piece by piece as the model produces it."""
+    # Timed until the last token, not just the first response bytes
+    with outbound("openai"):
+        stream = client.chat.completions.create(
+            model="gpt-5",
+            messages=build_messages(prompt),
+            stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+
+
 # cd flask-jwt-auth && .\venv\Scripts\activate && python run.py
\ No newline at end of file
@@ -1,23 +1,302 @@
+import argparse
 import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
+from .db import get_connection
+from config import Config
 
-def send_confirmation_email(receiver_email):
-    sender_email = "freeapiacc97@gmail.com"
-    password = "wijy eadx meep fxly"
-
-    msg = MIMEText("Hello! This is a confirmation email that you have successfully created an account in AI-Powered Stock Screener and Advisory platform.")
-    msg['Subject'] = "Successful Account Creation"
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-
-    try:
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
-        server.quit()
-        print("Email sent successfully!")
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+# -----------------------------
+# Email outbox
+# -----------------------------
+# Request handlers never talk to SMTP. They add an EmailOutbox row in the same
+# transaction as the change that triggers the mail (queue_email) and return
+# once it commits. The sender (mailer.py) leases due rows in batches with a
+# short FOR UPDATE SKIP LOCKED transaction, so several senders can run side by
+# side. It delivers them over one long-lived authenticated SMTP session with no
+# transaction open and records the outcome in a second short transaction.
+# Transient failures are retried with exponential backoff; permanent
+# rejections (5xx) and rows out of attempts are marked 'failed'.
+
+CONFIRMATION_SUBJECT = "Successful Account Creation"
+CONFIRMATION_BODY = (
+    "Hello! This is a confirmation email that you have successfully created an account "
+    "in AI-Powered Stock Screener and Advisory platform."
+)
+
+
+def queue_email(session, recipient, subject, body):
+    """Add an outbox row to a SQLAlchemy session; it is sent once the caller commits."""
+    from .models import EmailOutbox
+    message = EmailOutbox(recipient=recipient, subject=subject, body=body)
+    session.add(message)
+    return message
+
+
+def queue_confirmation_email(session, receiver_email):
+    return queue_email(session, receiver_email, CONFIRMATION_SUBJECT, CONFIRMATION_BODY)
+
+
+def build_message(sender, recipient, subject, body):
+    msg = MIMEText(body)
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = recipient
+    return msg
+
+
+class PermanentFailure(Exception):
+    """The server rejected this message for good; retrying will not help."""
+
+
+class SMTPSession:
+    """One SMTP connection, opened (STARTTLS + login) on first use and reused across sends."""
+
+    def __init__(self, host, port, user, password, starttls=True, timeout=30, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.connects += 1
+        return server
+
+    def send(self, sender, recipient, message):
+        """Send one message; raises PermanentFailure for 5xx rejections."""
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            # Servers drop idle sessions; reconnect rather than fail the first send
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.sendmail(sender, [recipient], message)
+        except smtplib.SMTPRecipientsRefused as e:
+            codes = [code for code, _ in e.recipients.values()]
+            if all(code >= 500 for code in codes):
+                raise PermanentFailure(str(e.recipients))
+            raise
+        except (smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+            if e.smtp_code >= 500:
+                raise PermanentFailure(f"{e.smtp_code} {e.smtp_error!r}")
+            raise
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+
+def retry_delay(attempts, base, maximum):
+    return min(maximum, base * 2 ** max(0, attempts - 1))
+
+
+class MailSender:
+    def __init__(self, session, sender, batch_size, poll_interval, max_attempts, retry_base, retry_max,
+                 lease_seconds=300):
+        self.session = session
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        self.stop_event = threading.Event()
+        self._stats = {"sent": 0, "retried": 0, "failed": 0, "batches": 0}
+
+    def deliver(self, rows):
+        """
+        Send (id, recipient, subject, body, attempts) rows over the shared session.
+
+        Returns (sent_ids, retries, failures) where retries and failures are
+        [(id, attempts, error)]. A connection-level error stops the batch; the
+        rows not yet tried are left for the next batch untouched.
+        """
+        sent, retries, failures = [], [], []
+        for message_id, recipient, subject, body, attempts in rows:
+            message = build_message(self.sender, recipient, subject, body).as_string()
+            try:
+                self.session.send(self.sender, recipient, message)
+                sent.append(message_id)
+            except PermanentFailure as e:
+                failures.append((message_id, attempts + 1, str(e)))
+            except Exception as e:
+                attempts += 1
+                target = failures if attempts >= self.max_attempts else retries
+                target.append((message_id, attempts, f"{type(e).__name__}: {e}"))
+                if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    # The connection itself failed: reconnect on the next batch
+                    self.session.close()
+                    break
+        return sent, retries, failures
+
+    def claim(self):
+        """
+        Lease one batch of due messages and commit straight away.
+
+        The claimed rows have next_attempt_at pushed lease_seconds ahead, so
+        other senders skip them while this one delivers without a transaction
+        or pooled connection open. A sender that dies mid-batch leaves its rows
+        to be picked up again once the lease runs out.
+        """
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE email_outbox
+                    SET next_attempt_at = (now() AT TIME ZONE 'utc') + make_interval(secs => %s)
+                    WHERE id IN (
+                        SELECT id
+                        FROM email_outbox
+                        WHERE status = 'pending' AND next_attempt_at <= (now() AT TIME ZONE 'utc')
+                        ORDER BY next_attempt_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, recipient, subject, body, attempts
+                    """,
+                    (self.lease_seconds, self.batch_size)
+                )
+                rows = cur.fetchall()
+            conn.commit()
+        return sorted(rows)
+
+    def record(self, claimed_ids, sent, retries, failures):
+        """Store the outcome of a delivered batch; rows left untried are released for the next one."""
+        now = datetime.utcnow()
+        tried = set(sent)
+        tried.update(message_id for message_id, _, _ in retries)
+        tried.update(message_id for message_id, _, _ in failures)
+        untried = [message_id for message_id in claimed_ids if message_id not in tried]
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                if sent:
+                    cur.execute(
+                        "UPDATE email_outbox SET status = 'sent', sent_at = %s, attempts = attempts + 1, "
+                        "last_error = NULL WHERE id = ANY(%s)",
+                        (now, sent)
+                    )
+                for message_id, attempts, error in retries:
+                    delay = retry_delay(attempts, self.retry_base, self.retry_max)
+                    cur.execute(
+                        "UPDATE email_outbox SET attempts = %s, last_error = %s, next_attempt_at = %s WHERE id = %s",
+                        (attempts, error, now + timedelta(seconds=delay), message_id)
+                    )
+                for message_id, attempts, error in failures:
+                    cur.execute(
+                        "UPDATE email_outbox SET status = 'failed', attempts = %s, last_error = %s WHERE id = %s",
+                        (attempts, error, message_id)
+                    )
+                if untried:
+                    cur.execute(
+                        "UPDATE email_outbox SET next_attempt_at = %s WHERE id = ANY(%s) AND status = 'pending'",
+                        (now, untried)
+                    )
+            conn.commit()
+
+    def run_once(self):
+        """Claim, deliver and record one batch of due messages; returns how many were attempted."""
+        rows = self.claim()
+        if not rows:
+            return 0
+        # No transaction or pooled connection is held while SMTP is in progress
+        sent, retries, failures = self.deliver(rows)
+        self.record([row[0] for row in rows], sent, retries, failures)
+        self._stats["batches"] += 1
+        self._stats["sent"] += len(sent)
+        self._stats["retried"] += len(retries)
+        self._stats["failed"] += len(failures)
+        for message_id, attempts, error in failures:
+            print(f"Email {message_id} failed permanently after {attempts} attempts: {error}")
+        return len(sent) + len(retries) + len(failures)
+
+    def run_forever(self):
+        while not self.stop_event.is_set():
+            try:
+                # Drain full batches back to back, then wait for more
+                if self.run_once() >= self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"Mail sender cycle failed: {e}")
+                self.session.close()
+            self.session.close_if_idle()
+            self.stop_event.wait(self.poll_interval)
+        self.session.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return dict(self._stats, smtp_connects=self.session.connects)
+
+
+def smtp_session_from_config():
+    return SMTPSession(
+        Config.SMTP_HOST,
+        Config.SMTP_PORT,
+        Config.SMTP_USER,
+        Config.SMTP_PASSWORD,
+        starttls=Config.SMTP_STARTTLS,
+        timeout=Config.SMTP_TIMEOUT,
+        idle_timeout=Config.MAIL_IDLE_TIMEOUT,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deliver queued email_outbox messages over SMTP")
+    parser.add_argument("--once", action="store_true", help="send one batch and exit")
+    parser.add_argument("--batch-size", type=int, default=Config.MAIL_BATCH_SIZE)
+    parser.add_argument("--poll-interval", type=float, default=Config.MAIL_POLL_INTERVAL)
+    args = parser.parse_args(argv)
+
+    from_address = Config.MAIL_SENDER or Config.SMTP_USER
+    if not from_address:
+        parser.error("set MAIL_SENDER (or SMTP_USER) in the environment or .env")
+
+    sender = MailSender(
+        smtp_session_from_config(),
+        from_address,
+        args.batch_size,
+        args.poll_interval,
+        Config.MAIL_MAX_ATTEMPTS,
+        Config.MAIL_RETRY_BASE,
+        Config.MAIL_RETRY_MAX,
+        Config.MAIL_LEASE_SECONDS,
+    )
+    if args.once:
+        print(f"Processed {sender.run_once()} queued emails")
+        sender.session.close()
+    else:
+        try:
+            sender.run_forever()
+        except KeyboardInterrupt:
+            sender.stop()
@@ -0,0 +1,351 @@
+import copy
+import json
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import requests
+from .db import get_connection
+from .metrics import outbound
+from .price_bars import INTERVALS, bars_from_rows, store_bars
+from config import Config
+
+# -----------------------------
+# Marketstack client + local market data store
+# -----------------------------
+# One requests.Session per process, every call paced by a shared token bucket.
+# Raw per-ticker responses are kept in market_data_cache so the chart endpoint
+# can answer from Postgres instead of calling Marketstack per request, and
+# their bars are added to the price_bars time series.
+
+MAX_SYMBOLS_PER_REQUEST = 100
+
+
+class MarketstackError(Exception):
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Allow `rate` requests per second on average with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return 0, or return the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        """acquire() for the event loop: waits with asyncio.sleep instead of blocking the thread."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+class MarketstackClient:
+    def __init__(self, base_url, api_key, bucket, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.bucket = bucket
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @property
+    def configured(self):
+        return bool(self.api_key) and self.api_key != "your_api_key_here"
+
+    def _get(self, path, params):
+        if not self.bucket.acquire(timeout=self.timeout):
+            raise MarketstackError("Marketstack rate limit exceeded", 429)
+        params = dict(params, access_key=self.api_key)
+        try:
+            with outbound("marketstack"):
+                res = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise MarketstackError(f"Marketstack request failed: {e}")
+        print(f"Marketstack API status: {res.status_code} ({path})")
+        if res.status_code != 200:
+            print(f"Marketstack API error response: {res.text}")
+            raise MarketstackError("Marketstack API failed", res.status_code)
+        return res.json()
+
+    def ticker_series(self, symbol, data_type="eod", limit=1):
+        """Raw /tickers/<symbol>/<eod|intraday> response, newest bar first."""
+        return self._get(ticker_series_path(symbol, data_type), {"limit": limit, "sort": "DESC"})
+
+    def latest_quotes(self, symbols, data_type="eod"):
+        """Latest bar for many symbols, MAX_SYMBOLS_PER_REQUEST per upstream call."""
+        kind = "intraday" if data_type == "intraday" else "eod"
+        quotes = {}
+        for i in range(0, len(symbols), MAX_SYMBOLS_PER_REQUEST):
+            batch = symbols[i:i + MAX_SYMBOLS_PER_REQUEST]
+            payload = self._get(f"/{kind}/latest", {"symbols": ",".join(batch)})
+            for row in series_rows(payload):
+                if is_valid_bar(row) and row.get("symbol"):
+                    quotes.setdefault(row["symbol"], row)
+        return quotes
+
+
+def ticker_series_path(symbol, data_type):
+    kind = "intraday" if data_type == "intraday" else "eod"
+    return f"/tickers/{symbol}/{kind}"
+
+
+def is_valid_bar(row):
+    return isinstance(row, dict) and isinstance(row.get("open"), (int, float)) and isinstance(row.get("close"), (int, float))
+
+
+def series_rows(payload):
+    """Bars from either Marketstack shape: data is a list, or a dict holding a list."""
+    market_data = payload.get("data") if isinstance(payload, dict) else None
+    if isinstance(market_data, list):
+        return market_data
+    if isinstance(market_data, dict):
+        for rows in market_data.values():
+            if isinstance(rows, list):
+                return rows
+    return []
+
+
+def find_latest_row(payload):
+    """First bar with numeric OHLC (responses are sorted newest first)."""
+    for row in series_rows(payload):
+        if is_valid_bar(row):
+            return row
+    return None
+
+
+def slice_series(payload, limit):
+    """Copy of a cached response trimmed to the newest `limit` bars."""
+    payload = copy.copy(payload)
+    market_data = payload.get("data")
+    if isinstance(market_data, list):
+        payload["data"] = market_data[:limit]
+    elif isinstance(market_data, dict):
+        market_data = dict(market_data)
+        for key, rows in market_data.items():
+            if isinstance(rows, list):
+                market_data[key] = rows[:limit]
+                break
+        payload["data"] = market_data
+    return payload
+
+
+def cache_max_age(data_type):
+    if data_type == "intraday":
+        return Config.MARKET_INTRADAY_MAX_AGE
+    return Config.MARKET_EOD_MAX_AGE
+
+
+def load_cached_series(symbol, data_type, limit):
+    """Cached raw response holding at least `limit` bars and still fresh, else None."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT payload, bar_limit
+                FROM market_data_cache
+                WHERE symbol = %s AND data_type = %s
+                  AND fetched_at > %s
+                """,
+                (symbol, data_type, datetime.utcnow() - timedelta(seconds=cache_max_age(data_type)))
+            )
+            row = cur.fetchone()
+    if not row or row[1] < limit:
+        return None
+    payload = row[0]
+    return json.loads(payload) if isinstance(payload, str) else payload
+
+
+def store_series(cur, symbol, data_type, payload, limit):
+    cur.execute(
+        """
+        INSERT INTO market_data_cache (symbol, data_type, bar_limit, payload, fetched_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (symbol, data_type) DO UPDATE SET
+            bar_limit = EXCLUDED.bar_limit,
+            payload = EXCLUDED.payload,
+            fetched_at = EXCLUDED.fetched_at
+        """,
+        (symbol, data_type, limit, json.dumps(payload), datetime.utcnow())
+    )
+    store_bars(cur, INTERVALS.get(data_type, "1d"), bars_from_rows(symbol, series_rows(payload)))
+
+
+def save_series(symbol, data_type, payload, limit):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            store_series(cur, symbol, data_type, payload, limit)
+        conn.commit()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_market_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MarketstackClient(
+                    Config.MARKETSTACK_BASE_URL,
+                    Config.MARKET_API_KEY,
+                    TokenBucket(Config.MARKETSTACK_RATE, Config.MARKETSTACK_BURST),
+                    Config.MARKETSTACK_TIMEOUT,
+                )
+    return _client
+
+
+# -----------------------------
+# Chart request coalescing
+# -----------------------------
+# When a ticker moves, many users open the same chart at once. Concurrent
+# requests for one (symbol, type, limit) share a single load through
+# chart_flight: one caller reads the store or calls Marketstack, saves the
+# series and runs the price update, and the rest wait for its result. The
+# response is then kept in chart_cache for CHART_CACHE_TTL_INTRADAY /
+# CHART_CACHE_TTL_EOD seconds, so repeats never leave the process.
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call for key is already running, then share its outcome.
+
+        Returns (result, shared); shared is True for callers that waited on
+        another caller's fn(). Its exception is raised in every waiter.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop (the ASGI serving mode)."""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Await fn() once per key at a time; returns (result, shared) like SingleFlight.do."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            # A task of its own, so a caller that disconnects does not cancel it for the others
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
+
+
+class TTLCache:
+    """Bounded in-process cache; each entry carries its own time to live."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if time.monotonic() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def chart_symbol(value):
+    """The symbol of a chart request as used in cache and in-flight keys, or None if missing."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return value.strip().upper()
+
+
+def chart_cache_ttl(data_type):
+    if data_type == "intraday":
+        return Config.CHART_CACHE_TTL_INTRADAY
+    return Config.CHART_CACHE_TTL_EOD
+
+
+chart_flight = SingleFlight()
+chart_cache = TTLCache(Config.CHART_CACHE_SIZE)
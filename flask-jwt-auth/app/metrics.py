@@ -0,0 +1,377 @@
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from psycopg2 import extensions
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+# -----------------------------
+# Request, database and upstream metrics
+# -----------------------------
+# init_app() times every request per endpoint and serves the totals at
+# /metrics in the Prometheus text format. SQL statements are counted and timed
+# from two places: SQLAlchemy cursor events (models) and a psycopg2 cursor
+# subclass installed on every pooled connection (raw SQL). Calls to Ollama,
+# OpenAI and Marketstack are wrapped in outbound(). Everything observed while a
+# request is running is also added to that request's RequestStats, which feeds
+# the per-request DB histograms and the slow-request log.
+#
+# Work done on helper threads (chat retrieval, background workers) has no
+# request and is counted under endpoint="background".
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# Distinct statements kept per request for the slow-request breakdown
+MAX_TRACKED_STATEMENTS = 50
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    def __init__(self, name, help_text, kind, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def _render_sample(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, "counter", labelnames)
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, "gauge", labelnames)
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, "histogram", labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, labels, value):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, labels, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            bucket_labels = _format_labels(self.labelnames + ("le",), labels + (_format_value(float(bound)),))
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        base = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+        lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by endpoint, method and status", ("endpoint", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Time to produce the response", ("endpoint",))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled", ("endpoint",))
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL per request", ("endpoint",))
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements per request", ("endpoint",), buckets=COUNT_BUCKETS
+)
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements executed", ("endpoint", "driver"))
+DB_SECONDS = Counter("db_statement_seconds_total", "Time spent executing SQL", ("endpoint", "driver"))
+OUTBOUND_SECONDS = Histogram("outbound_request_duration_seconds", "Calls to external services", ("service", "outcome"))
+CHART_REQUESTS = Counter(
+    "chart_requests_total", "Chart requests by where the series came from (memory, store, upstream, shared)", ("source",)
+)
+
+_METRICS = (
+    REQUESTS, REQUEST_SECONDS, IN_FLIGHT, REQUEST_DB_SECONDS, REQUEST_DB_STATEMENTS,
+    DB_STATEMENTS, DB_SECONDS, OUTBOUND_SECONDS, CHART_REQUESTS,
+)
+
+
+# -----------------------------
+# Per-request accounting
+# -----------------------------
+class RequestStats:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        # statement text -> [count, seconds]
+        self.queries = {}
+        # service -> [count, seconds]
+        self.outbound = {}
+
+    def add_query(self, statement, seconds):
+        self.db_statements += 1
+        self.db_seconds += seconds
+        key = _WHITESPACE.sub(" ", statement).strip()[:160]
+        entry = self.queries.get(key)
+        if entry is None:
+            if len(self.queries) >= MAX_TRACKED_STATEMENTS:
+                key = "(other statements)"
+            entry = self.queries.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def add_outbound(self, service, seconds):
+        entry = self.outbound.setdefault(service, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def record_query(driver, statement, seconds):
+    stats = _current.get()
+    endpoint = stats.endpoint if stats is not None else "background"
+    DB_STATEMENTS.inc((endpoint, driver))
+    DB_SECONDS.inc((endpoint, driver), seconds)
+    if stats is not None:
+        if isinstance(statement, bytes):
+            statement = statement.decode("utf-8", "replace")
+        stats.add_query(str(statement), seconds)
+
+
+@contextmanager
+def outbound(service):
+    """Time a call to an external service (ollama, openai, marketstack)."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        OUTBOUND_SECONDS.observe((service, outcome), elapsed)
+        stats = _current.get()
+        if stats is not None:
+            stats.add_outbound(service, elapsed)
+
+
+# -----------------------------
+# psycopg2: timed cursors on pooled connections
+# -----------------------------
+class _TimedCursorMixin:
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query("psycopg2", query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query("psycopg2", query, time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            record_query("psycopg2", sql, time.perf_counter() - start)
+
+
+_timed_classes = {}
+_timed_classes_lock = threading.Lock()
+
+
+def timed_cursor_class(factory):
+    """Subclass of a cursor class (plain, RealDictCursor, ...) that records each statement."""
+    cls = _timed_classes.get(factory)
+    if cls is None:
+        with _timed_classes_lock:
+            cls = _timed_classes.get(factory)
+            if cls is None:
+                cls = type(f"Timed{factory.__name__}", (_TimedCursorMixin, factory), {})
+                _timed_classes[factory] = cls
+    return cls
+
+
+class InstrumentedConnection(extensions.connection):
+    """psycopg2 connection whose cursors, whatever cursor_factory is asked for, are timed."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+# -----------------------------
+# SQLAlchemy: cursor events on every engine
+# -----------------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if starts:
+        record_query("sqlalchemy", statement, time.perf_counter() - starts.pop())
+
+
+# -----------------------------
+# Flask integration
+# -----------------------------
+def _before_request():
+    endpoint = request.endpoint or "unmatched"
+    stats = RequestStats(endpoint)
+    g.metrics_token = _current.set(stats)
+    g.metrics_stats = stats
+    IN_FLIGHT.inc((endpoint,))
+
+
+def _after_request(response):
+    stats = g.get("metrics_stats")
+    if stats is None:
+        return response
+    observe_request(stats, request.method, request.full_path.rstrip("?"), response.status_code)
+    return response
+
+
+def observe_request(stats, method, path, status):
+    """Record a finished request's totals, and log it when it was slow."""
+    elapsed = time.perf_counter() - stats.started
+    endpoint = stats.endpoint
+    REQUESTS.inc((endpoint, method, str(status)))
+    REQUEST_SECONDS.observe((endpoint,), elapsed)
+    REQUEST_DB_SECONDS.observe((endpoint,), stats.db_seconds)
+    REQUEST_DB_STATEMENTS.observe((endpoint,), stats.db_statements)
+    if Config.SLOW_REQUEST_SECONDS > 0 and elapsed >= Config.SLOW_REQUEST_SECONDS:
+        log_slow_request(stats, method, path, status, elapsed)
+
+
+@contextmanager
+def request_scope(endpoint):
+    """Account everything done inside the block to one request (for requests not served by Flask)."""
+    stats = RequestStats(endpoint)
+    token = _current.set(stats)
+    IN_FLIGHT.inc((endpoint,))
+    try:
+        yield stats
+    finally:
+        IN_FLIGHT.dec((endpoint,))
+        _current.reset(token)
+
+
+def _teardown_request(exc):
+    stats = g.pop("metrics_stats", None)
+    if stats is None:
+        return
+    IN_FLIGHT.dec((stats.endpoint,))
+    token = g.pop("metrics_token", None)
+    if token is not None:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Streamed responses tear down in a different context
+            _current.set(None)
+
+
+def log_slow_request(stats, method, path, status, elapsed):
+    print(
+        f"Slow request: {method} {path} -> {status} in {elapsed * 1000:.1f} ms "
+        f"({stats.db_statements} SQL statements, {stats.db_seconds * 1000:.1f} ms in DB)"
+    )
+    top = sorted(stats.queries.items(), key=lambda item: item[1][1], reverse=True)
+    for statement, (count, seconds) in top[:Config.SLOW_REQUEST_TOP_QUERIES]:
+        print(f"    {seconds * 1000:8.1f} ms  x{count:<4d} {statement}")
+    for service, (count, seconds) in sorted(stats.outbound.items()):
+        print(f"    {seconds * 1000:8.1f} ms  x{count:<4d} outbound {service}")
+
+
+_POOL_METRICS = (
+    ("db_pool_size", "size", "gauge"),
+    ("db_pool_in_use", "in_use", "gauge"),
+    ("db_pool_checkouts_total", "checkouts", "counter"),
+    ("db_pool_timeouts_total", "timeouts", "counter"),
+    ("db_pool_wait_seconds_total", "wait_seconds_total", "counter"),
+)
+
+
+def _pool_lines():
+    from .db import pool_stats
+    stats = pool_stats()
+    lines = []
+    for name, key, kind in _POOL_METRICS if stats else ():
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {_format_value(stats[key])}")
+    return lines
+
+
+def render_metrics():
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    lines.extend(_pool_lines())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
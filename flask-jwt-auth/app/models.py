@@ -81,4 +81,42 @@ class StockTransaction(db.Model):
     avg_price=db.Column(db.Numeric(10,2), nullable=False)
     current_price=db.Column(db.Numeric(10,2), nullable=False)
     profit_loss=db.Column(db.Numeric(10,2), nullable=False)
-    status=db.Column(db.String(10), nullable=False) #'buy' or 'sell'
\ No newline at end of file
+    status=db.Column(db.String(10), nullable=False) #'buy' or 'sell'
+
+class MarketDataCache(db.Model):
+    __tablename__ = 'market_data_cache'
+
+    symbol = db.Column(db.String(30), primary_key=True)
+    data_type = db.Column(db.String(10), primary_key=True)  # 'eod' or 'intraday'
+    bar_limit = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)  # raw Marketstack response
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class PriceBar(db.Model):
+    # Range-partitioned by year on ts; the table itself is created by migration
+    __tablename__ = 'price_bars'
+
+    symbol = db.Column(db.String(30), primary_key=True)
+    bar_interval = db.Column(db.String(10), primary_key=True)  # '1d' or '1h'
+    ts = db.Column(db.DateTime(timezone=True), primary_key=True)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    volume = db.Column(db.BigInteger)
+
+class EmailOutbox(db.Model):
+    # Written in the same transaction as the change that triggers the mail;
+    # delivered by the background sender (mailer.py)
+    __tablename__ = 'email_outbox'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    recipient = db.Column(db.String(200), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # 'pending', 'sent' or 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
@@ -0,0 +1,345 @@
+import asyncio
+import queue
+import select
+import threading
+from collections import OrderedDict
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from .db import get_connection
+from .chat import sse_event
+from config import Config
+
+# -----------------------------
+# Push notifications over SSE
+# -----------------------------
+# A trigger on notifications NOTIFYs once per INSERT statement with the
+# inserted id range (see migration e3b8f61a2c04). One listener thread per
+# process holds a dedicated LISTEN connection, loads the new rows for users
+# that currently have a stream open, and hands each row to those users'
+# subscriber queues. Streams resume from Last-Event-ID by replaying the rows
+# they missed.
+
+CHANNEL = "notification_events"  # must match the trigger function
+
+NOTIFICATION_COLUMNS = "id, user_id, type, title, message, symbol, data, is_read, created_at"
+
+
+def serialize_notification(row):
+    return {
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "type": row["type"],
+        "title": row["title"],
+        "message": row["message"],
+        "symbol": row["symbol"],
+        "data": row["data"],
+        "is_read": row["is_read"],
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+    }
+
+
+class Subscription:
+    def __init__(self, hub, user_id, maxsize):
+        self.hub = hub
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize)
+        # Set when the queue filled up and events were dropped; the stream
+        # then ends so the client reconnects and replays from its last id
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """A Subscription read from an event loop: the hub thread wakes the loop instead of a blocked reader."""
+
+    def __init__(self, hub, user_id, maxsize, loop):
+        super().__init__(hub, user_id, maxsize)
+        self.loop = loop
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        delivered = super().push(event)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The loop has shut down; the stream is going away with it
+            pass
+        return delivered
+
+    async def get_async(self, timeout):
+        """Every queued event, waiting up to timeout for the first; [] on timeout."""
+        if self.queue.empty():
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self.ready.clear()
+        events = []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class NotificationHub:
+    def __init__(self, channel=CHANNEL, queue_size=256, poll_timeout=5.0, recent_size=10000):
+        self.channel = channel
+        self.queue_size = queue_size
+        self.poll_timeout = poll_timeout
+        self.recent_size = recent_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        # Concurrent INSERTs can interleave ids, so a NOTIFY range may cover
+        # rows that were already delivered under another range
+        self._recent = OrderedDict()
+        self._last_id = None
+        self._stats = {
+            "notifies": 0,
+            "rows_loaded": 0,
+            "events_delivered": 0,
+            "overflows": 0,
+            "reconnects": 0,
+        }
+
+    # ---- subscribers ----
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="notification-hub", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def subscribe(self, user_id, loop=None):
+        """A queue of this user's new rows; pass the running loop to read it with get_async."""
+        self.start()
+        if loop is None:
+            subscription = Subscription(self, int(user_id), self.queue_size)
+        else:
+            subscription = AsyncSubscription(self, int(user_id), self.queue_size, loop)
+        with self._lock:
+            self._subscribers.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["subscribed_users"] = len(self._subscribers)
+            stats["streams"] = sum(len(s) for s in self._subscribers.values())
+        stats["listening"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+    # ---- listener ----
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**Config.DB_CONFIG)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel}")
+                self._catch_up(conn)
+                backoff = 1
+                self._listen(conn)
+            except Exception as e:
+                print(f"Notification listener error: {e}")
+                with self._lock:
+                    self._stats["reconnects"] += 1
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                continue
+            conn.poll()
+            ranges = []
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    first, last = (int(part) for part in notify.payload.split(":"))
+                except ValueError:
+                    continue
+                ranges.append((first, last))
+            if ranges:
+                with self._lock:
+                    self._stats["notifies"] += len(ranges)
+                self._deliver(conn, ranges)
+
+    def _catch_up(self, conn):
+        """After (re)connecting, load rows inserted while nobody was listening."""
+        with conn.cursor() as cur:
+            if self._last_id is None:
+                cur.execute("SELECT coalesce(max(id), 0) FROM notifications")
+                self._last_id = cur.fetchone()[0]
+                return
+        self._load(conn, "id > %s", [self._last_id])
+
+    def _deliver(self, conn, ranges):
+        self._last_id = max([self._last_id or 0] + [last for _, last in ranges])
+        clause = " OR ".join(["id BETWEEN %s AND %s"] * len(ranges))
+        params = [bound for pair in ranges for bound in pair]
+        self._load(conn, f"({clause})", params)
+
+    def _load(self, conn, condition, params):
+        with self._lock:
+            user_ids = list(self._subscribers)
+        if not user_ids:
+            return
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                f"""
+                SELECT {NOTIFICATION_COLUMNS}
+                FROM notifications
+                WHERE user_id = ANY(%s) AND {condition}
+                ORDER BY id
+                """,
+                [user_ids] + params
+            )
+            rows = cur.fetchall()
+        for row in rows:
+            self._last_id = max(self._last_id or 0, row["id"])
+            self._dispatch(row)
+
+    def _dispatch(self, row):
+        if row["id"] in self._recent:
+            return
+        self._recent[row["id"]] = None
+        if len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+
+        event = serialize_notification(row)
+        with self._lock:
+            self._stats["rows_loaded"] += 1
+            subscriptions = list(self._subscribers.get(row["user_id"], ()))
+        for subscription in subscriptions:
+            delivered = subscription.push(event)
+            with self._lock:
+                self._stats["events_delivered" if delivered else "overflows"] += 1
+
+
+hub = NotificationHub(queue_size=Config.NOTIFY_QUEUE_SIZE)
+
+
+def missed_notifications(user_id, after_id, limit):
+    """Rows a resuming client has not seen yet, oldest first."""
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                f"""
+                SELECT {NOTIFICATION_COLUMNS}
+                FROM notifications
+                WHERE user_id = %s AND id > %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (user_id, after_id, limit)
+            )
+            return [serialize_notification(row) for row in cur.fetchall()]
+
+
+def notification_stream(user_id, last_id=None, heartbeat=None):
+    """
+    SSE generator for one user's notifications.
+
+    Subscribes before replaying the backlog so nothing inserted in between is
+    lost; events already replayed are skipped when they arrive live.
+    """
+    heartbeat = Config.NOTIFY_HEARTBEAT if heartbeat is None else heartbeat
+    subscription = hub.subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n"
+        replayed = set()
+        if last_id is not None:
+            for event in missed_notifications(subscription.user_id, last_id, Config.NOTIFY_BACKLOG_LIMIT):
+                replayed.add(event["id"])
+                yield sse_event(event, "notification", event["id"])
+        yield sse_event({"user_id": subscription.user_id}, "ready")
+
+        while True:
+            try:
+                event = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": heartbeat\n\n"
+                continue
+            if event["id"] not in replayed:
+                yield sse_event(event, "notification", event["id"])
+            if subscription.overflowed and subscription.queue.empty():
+                # The client reconnects with Last-Event-ID and replays the rest
+                yield sse_event({"reason": "overflow"}, "reset")
+                return
+    finally:
+        subscription.close()
+
+
+async def async_notification_stream(user_id, last_id=None, heartbeat=None):
+    """
+    notification_stream for the ASGI mode, as an async generator.
+
+    The stream waits on the event loop, so an open notification bell holds a
+    coroutine rather than a thread; only the Last-Event-ID replay query runs
+    on a worker thread.
+    """
+    heartbeat = Config.NOTIFY_HEARTBEAT if heartbeat is None else heartbeat
+    subscription = hub.subscribe(user_id, asyncio.get_running_loop())
+    try:
+        yield "retry: 3000\n\n"
+        replayed = set()
+        if last_id is not None:
+            missed = await asyncio.to_thread(
+                missed_notifications, subscription.user_id, last_id, Config.NOTIFY_BACKLOG_LIMIT
+            )
+            for event in missed:
+                replayed.add(event["id"])
+                yield sse_event(event, "notification", event["id"])
+        yield sse_event({"user_id": subscription.user_id}, "ready")
+
+        while True:
+            events = await subscription.get_async(heartbeat)
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+            for event in events:
+                if event["id"] not in replayed:
+                    yield sse_event(event, "notification", event["id"])
+            if subscription.overflowed and subscription.queue.empty():
+                yield sse_event({"reason": "overflow"}, "reset")
+                return
+    finally:
+        subscription.close()
+
+
+def notification_hub_stats():
+    return hub.stats()
@@ -1,15 +1,10 @@
-import psycopg2
 from psycopg2.extras import RealDictCursor
+import csv
+import io
 import json
-from datetime import datetime
-
-DB_CONFIG = {
-    "dbname": "postgres",
-    "user": "postgres",
-    "password": 1234,
-    "host": "localhost",
-    "port": 5432
-}
+from .db import get_connection
+from .quotes import bump_version
+from .screener import apply_price_update, apply_price_updates
 
 def calculate_change(new_price, old_price):
     if not old_price:
@@ -19,6 +14,81 @@ def calculate_change(new_price, old_price):
     return round(change, 2), round(percent, 2)
 
 
+def build_price_change(symbol, old_price, new_price, requested_by=None):
+    """Describe one price move; returns None when the price did not change."""
+    price_change, percent_change = calculate_change(new_price, old_price)
+    if price_change == 0:
+        return None
+    direction = "UP" if price_change > 0 else "DOWN"
+    return {
+        "symbol": symbol,
+        "message": f"{symbol} {direction} by {price_change} ({percent_change}%)",
+        "data": {
+            "previous_price": old_price,
+            "current_price": new_price,
+            "change": price_change,
+            "change_percent": percent_change,
+            "direction": direction
+        },
+        "requested_by": requested_by,
+    }
+
+
+def fan_out_price_changes(cur, changes):
+    """
+    Insert a STOCK_ALERT for every user watching each changed symbol.
+
+    One set-based INSERT ... SELECT joins the changes to the watchlist and
+    users_info, so the cost is one statement regardless of how many symbols
+    or watchers are involved. `requested_by` (optional per change) is also
+    notified even if that user is not watching the symbol.
+    Returns the number of notifications inserted.
+    """
+    if not changes:
+        return 0
+
+    cur.execute("""
+        WITH changes AS (
+            SELECT *
+            FROM unnest(%s::text[], %s::text[], %s::text[], %s::integer[])
+                AS c(symbol, message, data, requested_by)
+        ),
+        recipients AS (
+            SELECT u.id AS user_id, c.symbol
+            FROM changes c
+            JOIN watchlist_selected_item_history w
+                ON w.symbol_name = c.symbol AND w.status = 'selected'
+            JOIN users_info u
+                ON u.email = w.email_id
+            UNION
+            SELECT c.requested_by, c.symbol
+            FROM changes c
+            WHERE c.requested_by IS NOT NULL
+        )
+        INSERT INTO notifications
+            (user_id, type, title, message, symbol, data, is_read, created_at)
+        SELECT r.user_id, 'STOCK_ALERT', 'Stock Price Update',
+               c.message, c.symbol, c.data::json, false, now() AT TIME ZONE 'utc'
+        FROM recipients r
+        JOIN changes c ON c.symbol = r.symbol
+    """, (
+        [c["symbol"] for c in changes],
+        [c["message"] for c in changes],
+        [json.dumps(c["data"]) for c in changes],
+        [int(c["requested_by"]) if c.get("requested_by") is not None else None for c in changes],
+    ))
+    return cur.rowcount
+
+
+def notify_price_changes(changes):
+    """Fan out a batch of price changes (see build_price_change) in one transaction."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            inserted = fan_out_price_changes(cur, changes)
+        conn.commit()
+    return inserted
+
+
 def update_stock_and_notify(symbol, user_id, latest):
     """
     latest = {
@@ -29,9 +99,6 @@ def update_stock_and_notify(symbol, user_id, latest):
     }
     """
 
-    conn = None
-    cur = None
-
     try:
         # ✅ Validate numeric OHLC
         for key in ("open", "high", "low", "close"):
@@ -39,88 +106,172 @@ def update_stock_and_notify(symbol, user_id, latest):
                 print(f"Invalid OHLC data for {symbol}: {latest}")
                 return
 
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        # 🔹 Fetch previous price
-        cur.execute("""
-            SELECT last_traded_price
-            FROM stock_data
-            WHERE symbol = %s
-        """, (symbol,))
-        row = cur.fetchone()
-
-        if not row:
-            print(f"Stock {symbol} not found in DB")
-            return
-
-        old_price = float(row["last_traded_price"] or 0)
-        new_price = float(latest["close"])
-
-        # 🔹 Calculate change
-        price_change, percent_change = calculate_change(new_price, old_price)
-
-        # 🔔 Insert notification ONLY if price changed
-        if price_change != 0:
-            direction = "UP" if price_change > 0 else "DOWN"
-
-            notification_payload = {
-                "previous_price": old_price,
-                "current_price": new_price,
-                "change": price_change,
-                "change_percent": percent_change,
-                "direction": direction
-            }
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # 🔹 Fetch previous price
+                cur.execute("""
+                    SELECT last_traded_price
+                    FROM stock_data
+                    WHERE symbol = %s
+                """, (symbol,))
+                row = cur.fetchone()
 
-            cur.execute("""
-                INSERT INTO notifications
-                    (user_id, type, title, message, symbol, data, is_read, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                user_id,
-                "STOCK_ALERT",
-                "Stock Price Update",
-                f"{symbol} {direction} by {price_change} ({percent_change}%)",
-                symbol,
-                json.dumps(notification_payload),
-                False,
-                datetime.utcnow()
-            ))
-
-        # 🔹 Update stock_data
-        cur.execute("""
-            UPDATE stock_data SET
-                open_price = %s,
-                high_price = %s,
-                low_price = %s,
-                previous_close = %s,
-                last_traded_price = %s,
-                price_change = %s,
-                percentage_change = %s,
-                daypercentagechange = %s
-            WHERE symbol = %s
-        """, (
-            latest["open"],
-            latest["high"],
-            latest["low"],
-            latest["open"],  # previous_close (correct)
-            new_price,
-            price_change,
-            percent_change,
-            percent_change,
-            symbol
-        ))
+                if not row:
+                    print(f"Stock {symbol} not found in DB")
+                    return
 
-        conn.commit()
-        print(f"Stock {symbol} updated & notification inserted for user {user_id} ✅")
+                old_price = float(row["last_traded_price"] or 0)
+                new_price = float(latest["close"])
+
+                # 🔹 Calculate change
+                price_change, percent_change = calculate_change(new_price, old_price)
+
+                # 🔔 Notify every watcher (and the requesting user) ONLY if price changed
+                change = build_price_change(symbol, old_price, new_price, user_id)
+                notified = fan_out_price_changes(cur, [change]) if change else 0
+
+                # 🔹 Update stock_data
+                cur.execute("""
+                    UPDATE stock_data SET
+                        open_price = %s,
+                        high_price = %s,
+                        low_price = %s,
+                        previous_close = %s,
+                        last_traded_price = %s,
+                        price_change = %s,
+                        percentage_change = %s,
+                        daypercentagechange = %s
+                    WHERE symbol = %s
+                """, (
+                    latest["open"],
+                    latest["high"],
+                    latest["low"],
+                    latest["open"],  # previous_close (correct)
+                    new_price,
+                    price_change,
+                    percent_change,
+                    percent_change,
+                    symbol
+                ))
+
+            conn.commit()
+        version = bump_version()
+        apply_price_update(symbol, {
+            "open_price": float(latest["open"]),
+            "high_price": float(latest["high"]),
+            "low_price": float(latest["low"]),
+            "previous_close": float(latest["open"]),
+            "last_traded_price": new_price,
+            "price_change": float(price_change),
+            "percentage_change": float(percent_change),
+            "daypercentagechange": float(percent_change),
+        }, version)
+        print(f"Stock {symbol} updated & {notified} notifications inserted ✅")
 
     except Exception as e:
-        if conn:
-            conn.rollback()
+        # The pool rolls back any uncommitted transaction on return
         print(f"Notification error for {symbol}: {e}")
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+
+def update_stocks_bulk(ticks):
+    """
+    Apply many OHLC ticks in one transaction and notify watchers.
+
+    ticks = [{"symbol": str, "open": float, "high": float, "low": float, "close": float}, ...]
+
+    The ticks are streamed into a session-local staging table with COPY, then
+    a single UPDATE ... FROM computes price_change/percentage_change against
+    the previous price and writes every row. Returns the price changes written
+    (see build_price_change) so notification and cache stages can consume them.
+    """
+    latest = {}
+    for tick in ticks:
+        if tick.get("symbol") and all(tick.get(key) is not None for key in ("open", "high", "low", "close")):
+            latest[tick["symbol"]] = tick
+    if not latest:
+        return []
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for symbol, tick in latest.items():
+        writer.writerow((symbol, tick["open"], tick["high"], tick["low"], tick["close"]))
+    buffer.seek(0)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Temp tables live as long as the pooled connection; rows are cleared on commit
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS stock_ticks_staging (
+                    symbol text,
+                    open_price numeric,
+                    high_price numeric,
+                    low_price numeric,
+                    close_price numeric
+                ) ON COMMIT DELETE ROWS
+            """)
+            cur.copy_expert(
+                "COPY stock_ticks_staging (symbol, open_price, high_price, low_price, close_price) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            cur.execute("""
+                UPDATE stock_data AS s SET
+                    open_price = v.open_price,
+                    high_price = v.high_price,
+                    low_price = v.low_price,
+                    previous_close = v.open_price,
+                    last_traded_price = v.close_price,
+                    price_change = v.price_change,
+                    percentage_change = v.percentage_change,
+                    daypercentagechange = v.percentage_change
+                FROM (
+                    SELECT DISTINCT ON (p.symbol)
+                        t.symbol, t.open_price, t.high_price, t.low_price, t.close_price,
+                        p.last_traded_price AS old_price,
+                        CASE WHEN COALESCE(p.last_traded_price, 0) = 0 THEN 0
+                             ELSE round(t.close_price - p.last_traded_price, 2) END AS price_change,
+                        CASE WHEN COALESCE(p.last_traded_price, 0) = 0 THEN 0
+                             ELSE round((t.close_price - p.last_traded_price) / p.last_traded_price * 100, 2)
+                        END AS percentage_change
+                    FROM stock_ticks_staging t
+                    JOIN stock_data p ON p.symbol = t.symbol
+                    ORDER BY p.symbol, p.id
+                ) AS v
+                WHERE s.symbol = v.symbol
+                RETURNING s.symbol,
+                          v.old_price::float8,
+                          v.open_price::float8,
+                          v.high_price::float8,
+                          v.low_price::float8,
+                          v.close_price::float8,
+                          v.price_change::float8,
+                          v.percentage_change::float8
+            """)
+            updated = {row[0]: row for row in cur.fetchall()}
+
+            changes = []
+            for symbol, old_price, *_ in updated.values():
+                change = build_price_change(symbol, old_price or 0, float(latest[symbol]["close"]))
+                if change:
+                    changes.append(change)
+            notified = fan_out_price_changes(cur, changes)
+        conn.commit()
+
+    if updated:
+        version = bump_version()
+        apply_price_updates({
+            symbol: {
+                "open_price": open_price,
+                "high_price": high_price,
+                "low_price": low_price,
+                "previous_close": open_price,
+                "last_traded_price": close_price,
+                "price_change": price_change,
+                "percentage_change": percentage_change,
+                "daypercentagechange": percentage_change,
+            }
+            for symbol, _, open_price, high_price, low_price, close_price, price_change, percentage_change
+            in updated.values()
+        }, version)
+    print(f"Bulk update: {len(updated)} stocks updated, {len(changes)} changed, {notified} notifications ✅")
+    return changes
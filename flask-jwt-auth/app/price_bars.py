@@ -0,0 +1,216 @@
+from datetime import datetime, timezone
+import numpy as np
+from psycopg2.extras import execute_values
+from .db import get_connection
+
+# -----------------------------
+# OHLC time-series store
+# -----------------------------
+# price_bars holds every bar Marketstack returns, keyed by
+# (symbol, bar_interval, ts) and range-partitioned by year on ts (see
+# migration f4c2a9d71e36). Upstream responses and the ingestion worker upsert
+# into it; /auth/stocks/history reads ranges back with keyset pagination or
+# downsampled to a fixed number of points.
+
+# Marketstack data_type -> bar interval stored in price_bars
+INTERVALS = {
+    "eod": "1d",
+    "intraday": "1h",
+}
+
+BAR_COLUMNS = "ts, open, high, low, close, volume"
+
+
+def bar_interval(value):
+    """Accept either a stored interval ("1d") or a Marketstack data_type ("eod")."""
+    value = (value or "1d").lower()
+    if value in INTERVALS:
+        return INTERVALS[value]
+    if value in INTERVALS.values():
+        return value
+    raise ValueError(f"Unknown interval: {value}")
+
+
+def parse_bar_time(value):
+    """Marketstack dates look like 2024-01-05T00:00:00+0000; stored as UTC."""
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        value = str(value)
+        try:
+            ts = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z")
+        except ValueError:
+            ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def bars_from_rows(symbol, rows):
+    """(symbol, ts, open, high, low, close, volume) tuples for the usable bars in a response."""
+    bars = {}
+    for row in rows:
+        if not isinstance(row, dict) or row.get("date") is None:
+            continue
+        if not all(isinstance(row.get(k), (int, float)) for k in ("open", "high", "low", "close")):
+            continue
+        try:
+            ts = parse_bar_time(row["date"])
+        except ValueError:
+            continue
+        bar_symbol = (row.get("symbol") or symbol or "").upper()
+        if not bar_symbol:
+            continue
+        volume = row.get("volume")
+        bars[(bar_symbol, ts)] = (
+            bar_symbol, ts,
+            float(row["open"]), float(row["high"]), float(row["low"]), float(row["close"]),
+            int(volume) if isinstance(volume, (int, float)) else None,
+        )
+    return list(bars.values())
+
+
+def store_bars(cur, interval, bars):
+    """Upsert bars; a re-fetched bar (e.g. today's still-moving EOD) overwrites the old one."""
+    if not bars:
+        return 0
+    execute_values(
+        cur,
+        """
+        INSERT INTO price_bars (symbol, ts, open, high, low, close, volume, bar_interval)
+        VALUES %s
+        ON CONFLICT (symbol, bar_interval, ts) DO UPDATE SET
+            open = EXCLUDED.open,
+            high = EXCLUDED.high,
+            low = EXCLUDED.low,
+            close = EXCLUDED.close,
+            volume = EXCLUDED.volume
+        """,
+        [bar + (interval,) for bar in bars],
+        page_size=1000
+    )
+    return len(bars)
+
+
+def load_bars(symbol, interval, start=None, end=None, after=None, limit=None):
+    """Bars in [start, end), oldest first, strictly after the `after` cursor."""
+    conditions = ["symbol = %s", "bar_interval = %s"]
+    params = [symbol.upper(), interval]
+    if start is not None:
+        conditions.append("ts >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("ts < %s")
+        params.append(end)
+    if after is not None:
+        conditions.append("ts > %s")
+        params.append(after)
+    query = f"SELECT {BAR_COLUMNS} FROM price_bars WHERE {' AND '.join(conditions)} ORDER BY ts"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+
+def latest_bars(symbol, interval, count):
+    """Newest `count` bars as (ts, high, low, close), oldest first."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT ts, high, low, close
+                FROM price_bars
+                WHERE symbol = %s AND bar_interval = %s
+                ORDER BY ts DESC
+                LIMIT %s
+                """,
+                (symbol.upper(), interval, count)
+            )
+            return cur.fetchall()[::-1]
+
+
+def has_bars(symbol, interval):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT 1 FROM price_bars WHERE symbol = %s AND bar_interval = %s LIMIT 1",
+                (symbol.upper(), interval)
+            )
+            return cur.fetchone() is not None
+
+
+# -----------------------------
+# Downsampling
+# -----------------------------
+# Both methods return a subset of the real bars (in time order), so the points
+# keep their exact prices and timestamps.
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` visually significant points."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # Average of the next bucket is the third triangle vertex
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """Min and max point of each of threshold/2 equal-count buckets, in time order."""
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    buckets = np.array_split(np.arange(n), threshold // 2)
+    picked = set()
+    for bucket in buckets:
+        if len(bucket):
+            values = y[bucket]
+            picked.add(int(bucket[np.argmin(values)]))
+            picked.add(int(bucket[np.argmax(values)]))
+    return np.array(sorted(picked), dtype=np.int64)
+
+
+def downsample(bars, points, method="lttb"):
+    """Reduce bars to about `points` rows using the close price."""
+    if len(bars) <= points:
+        return bars
+    x = np.array([bar[0].timestamp() for bar in bars], dtype=np.float64)
+    y = np.array([bar[4] for bar in bars], dtype=np.float64)
+    if method == "minmax":
+        indices = minmax_indices(y, points)
+    else:
+        indices = lttb_indices(x, y, points)
+    return [bars[i] for i in indices]
+
+
+def serialize_bar(bar, interval):
+    ts, open_, high, low, close, volume = bar
+    ts = ts.astimezone(timezone.utc)
+    return {
+        "date": ts.date().isoformat() if interval == "1d" else ts.isoformat(),
+        "ts": ts.isoformat(),
+        "open": open_,
+        "high": high,
+        "low": low,
+        "close": close,
+        "price": close,
+        "volume": volume,
+    }
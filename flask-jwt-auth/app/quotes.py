@@ -0,0 +1,320 @@
+import bisect
+import threading
+import time
+from decimal import Decimal
+from .db import get_connection
+from .serialization import dumps
+from config import Config
+
+# -----------------------------
+# Versioned stock_data snapshot
+# -----------------------------
+# Every writer to stock_data calls bump_version(); readers get the cached
+# snapshot (already serialized to JSON bytes) until the version moves or the
+# snapshot is older than QUOTE_SNAPSHOT_MAX_AGE, which catches writes made by
+# other processes.
+
+STOCK_COLUMNS = (
+    "company", "symbol", "industry", "series",
+    "open_price", "high_price", "low_price", "previous_close",
+    "last_traded_price", "price_change", "percentage_change",
+    "day_percentage_change", "share_volume", "value_inr",
+    "week_high", "week_low", "daypercentagechange",
+)
+
+_version = 0
+_version_lock = threading.Lock()
+_snapshot = None
+_rebuild_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "rebuilds": 0,
+    "last_rebuild_seconds": 0.0,
+    "total_rebuild_seconds": 0.0,
+    "rows": 0,
+}
+
+
+class QuoteSnapshot:
+    """Immutable view of stock_data at one version."""
+
+    def __init__(self, version, rows, stocks, built_at):
+        self.version = version
+        self.built_at = built_at
+        # /stock_data shape: one dict per row with native floats/ints
+        self.rows = rows
+        # /stocks shape: first row per symbol, Decimals left as in the ORM
+        self.stocks = stocks
+        self.by_symbol = {}
+        for row in rows:
+            self.by_symbol.setdefault(row["symbol"], row)
+        self.rows_json = dumps(rows)
+        self.stocks_json = dumps(stocks)
+        # Other encodings of this version (columnar, compressed, ...), built on demand
+        self._encoded = {}
+        self._encoded_lock = threading.Lock()
+
+    def encoded(self, key, build):
+        """Build a derived representation once per snapshot and reuse it."""
+        value = self._encoded.get(key)
+        if value is None:
+            value = build()
+            with self._encoded_lock:
+                value = self._encoded.setdefault(key, value)
+        return value
+
+    def dataset(self, name):
+        """Rows of a listing: "rows" (/stock_data) or "stocks" (/stocks)."""
+        return self.rows if name == "rows" else self.stocks
+
+    def rows_for(self, symbol):
+        """All stock_data rows of one symbol (case-insensitive)."""
+        groups = self.encoded(("rows_by_symbol",), self._group_rows)
+        return groups.get(symbol) or groups.get(symbol.upper()) or []
+
+    def _group_rows(self):
+        groups = {}
+        for row in self.rows:
+            groups.setdefault(row["symbol"], []).append(row)
+        return groups
+
+    def sort_index(self, dataset, column):
+        """(positions, keys) of a dataset in ascending (column, symbol) order, built once per column."""
+        def build():
+            rows = self.dataset(dataset)
+            keys = [_sort_key(row.get(column), row["symbol"]) for row in rows]
+            positions = sorted(range(len(rows)), key=keys.__getitem__)
+            return positions, [keys[i] for i in positions]
+        return self.encoded(("sort", dataset, column), build)
+
+    @property
+    def etag(self):
+        return f"quotes-{self.version}-{int(self.built_at * 1000)}"
+
+
+class PageError(ValueError):
+    """Raised for an unknown field or sort column, or a malformed cursor."""
+
+
+def _sort_key(value, symbol):
+    # NULLs sort first; the symbol breaks ties, so a cursor names one position
+    # (stock_data holds one row per symbol in practice)
+    return (value is not None, value if value is not None else 0, symbol or "")
+
+
+def _value_type(rows, column):
+    # Cursor values are parsed back into the column's own type: a float cursor
+    # would not compare equal to the Decimal it was printed from
+    for row in rows:
+        value = row.get(column)
+        if isinstance(value, (Decimal, float)):
+            return type(value)
+        if isinstance(value, int):
+            return int
+        if value is not None:
+            return str
+    return str
+
+
+def page_cursor(row, column):
+    """Keyset cursor for the row a page ended on: SYMBOL, or SYMBOL:value for other sorts."""
+    if column == "symbol":
+        return row["symbol"]
+    value = row.get(column)
+    return f"{row['symbol']}:{'' if value is None else value}"
+
+
+def _parse_cursor(after, column, value_type):
+    if column == "symbol":
+        return _sort_key(after, after)
+    symbol, _, raw = after.partition(":")
+    if not raw:
+        return _sort_key(None, symbol)
+    try:
+        return _sort_key(value_type(raw), symbol)
+    except (ValueError, ArithmeticError):
+        raise PageError(f"after: expected SYMBOL:<number> for sort={column}")
+
+
+def page_rows(snapshot, dataset, sort="symbol", after=None, limit=None, fields=None, rows=None):
+    """
+    One page of a snapshot listing, ordered by `sort` ("-column" for descending).
+
+    Keyset pagination: `after` is the cursor of the last row of the previous
+    page (see page_cursor), located with a bisect into the per-column sort
+    index, so a page costs O(log n + limit) regardless of universe size.
+    `rows` restricts the page to a subset (e.g. one symbol's rows), sorted directly.
+    Returns (rows, next_cursor or None).
+    """
+    source = snapshot.dataset(dataset)
+    columns = list(source[0]) if source else list(STOCK_COLUMNS)
+    for field in fields or ():
+        if field not in columns:
+            raise PageError(f"Unknown field: {field}")
+    descending = sort.startswith("-")
+    column = sort.lstrip("-")
+    if column not in columns:
+        raise PageError(f"Unknown sort column: {column}")
+
+    if rows is None:
+        positions, keys = snapshot.sort_index(dataset, column)
+        ordered = source
+    else:
+        ordered = rows
+        row_keys = [_sort_key(row.get(column), row["symbol"]) for row in rows]
+        positions = sorted(range(len(rows)), key=row_keys.__getitem__)
+        keys = [row_keys[i] for i in positions]
+
+    if after is None:
+        start, end = 0, len(keys)
+    else:
+        cursor = _parse_cursor(after, column, _value_type(source, column))
+        if descending:
+            start, end = 0, bisect.bisect_left(keys, cursor)
+        else:
+            start, end = bisect.bisect_right(keys, cursor), len(keys)
+
+    if descending:
+        lo = start if limit is None else max(start, end - limit)
+        selected = positions[lo:end][::-1]
+        more = lo > start
+    else:
+        hi = end if limit is None else min(end, start + limit)
+        selected = positions[start:hi]
+        more = hi < end
+
+    page = [ordered[i] for i in selected]
+    next_cursor = page_cursor(page[-1], column) if more and page else None
+    if fields:
+        page = [{field: row.get(field) for field in fields} for row in page]
+    return page, next_cursor
+
+
+def bump_version():
+    """Mark the snapshot stale; call after committing any write to stock_data."""
+    global _version
+    with _version_lock:
+        _version += 1
+        return _version
+
+
+def current_version():
+    return _version
+
+
+def _record(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _serialize_row(row):
+    record = dict(zip(STOCK_COLUMNS, row))
+    for key in STOCK_COLUMNS[4:]:
+        if key == "share_volume":
+            record[key] = int(record[key])
+        elif key == "daypercentagechange":
+            record[key] = float(record[key]) if record[key] else None
+        else:
+            record[key] = float(record[key])
+    return record
+
+
+def _build_snapshot(version):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT {', '.join(STOCK_COLUMNS)} FROM stock_data ORDER BY id")
+            raw_rows = cur.fetchall()
+
+    rows = []
+    stocks = []
+    seen_symbols = set()
+    for raw in raw_rows:
+        rows.append(_serialize_row(raw))
+        record = dict(zip(STOCK_COLUMNS, raw))
+        if record["symbol"] not in seen_symbols:
+            seen_symbols.add(record["symbol"])
+            stocks.append({
+                'symbol': record["symbol"],
+                'name': record["company"],
+                'price': record["last_traded_price"],
+                'change': record["price_change"],
+                'changePercent': record["percentage_change"],
+                'volume': record["share_volume"],
+                'marketCap': record["value_inr"],
+                'industry': record["industry"] or 'Unknown'
+            })
+    return QuoteSnapshot(version, rows, stocks, time.time())
+
+
+def _is_fresh(snapshot):
+    return (
+        snapshot is not None
+        and snapshot.version == _version
+        and time.time() - snapshot.built_at < Config.QUOTE_SNAPSHOT_MAX_AGE
+    )
+
+
+def get_snapshot():
+    """Return the current snapshot, rebuilding it once if it is stale."""
+    global _snapshot
+    snapshot = _snapshot
+    if _is_fresh(snapshot):
+        _record("hits")
+        return snapshot
+
+    with _rebuild_lock:
+        # Another thread may have rebuilt while we waited for the lock
+        snapshot = _snapshot
+        if _is_fresh(snapshot):
+            _record("hits")
+            return snapshot
+
+        _record("misses")
+        start = time.perf_counter()
+        snapshot = _build_snapshot(_version)
+        elapsed = time.perf_counter() - start
+        _snapshot = snapshot
+
+    with _stats_lock:
+        _stats["rebuilds"] += 1
+        _stats["last_rebuild_seconds"] = elapsed
+        _stats["total_rebuild_seconds"] += elapsed
+        _stats["rows"] = len(snapshot.rows)
+    return snapshot
+
+
+def snapshot_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["version"] = _version
+    return stats
+
+
+def stock_payload(row):
+    """The /auth/stock/<symbol> shape for one snapshot row."""
+    return dict(
+        row,
+        name=row["company"],
+        price=row["last_traded_price"],
+        change=row["price_change"],
+        changePercent=row["percentage_change"],
+        volume=row["share_volume"],
+        marketCap=row["value_inr"],
+        industry=row["industry"] or 'N/A',
+        series=row["series"] or 'N/A',
+    )
+
+
+def get_quotes(symbols):
+    """{symbol: quote} for each requested symbol found in the snapshot (exact match, then upper case)."""
+    snapshot = get_snapshot()
+    quotes = {}
+    for symbol in symbols:
+        row = snapshot.by_symbol.get(symbol) or snapshot.by_symbol.get(symbol.upper())
+        if row is not None:
+            quotes[symbol] = stock_payload(row)
+    return quotes
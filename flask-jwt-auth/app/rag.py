@@ -1,16 +1,17 @@
-from flask import current_app
-from .db import db
-from .embeddings import get_embedding
+from .db import get_connection
+from .vector_index import tune_vector_search, use_local_index, search_local
 
-def retrieve_context(query, k=5):
-    embedding = get_embedding(query)
+def search_chat_messages(embedding, k=5, ef_search=None, probes=None):
+    """Nearest chat_messages to an already computed query embedding."""
+    if use_local_index():
+        return "\n".join(search_local("chat_messages", embedding, k))
 
     # Convert embedding list to string for PostgreSQL vector compatibility
     embedding_str = '[' + ','.join(map(str, embedding)) + ']'
 
-    conn = db.engine.raw_connection()
-    try:
+    with get_connection() as conn:
         with conn.cursor() as cur:
+            tune_vector_search(cur, ef_search, probes)
             cur.execute(
                 """
                 SELECT content
@@ -23,9 +24,4 @@ def retrieve_context(query, k=5):
 
             rows = cur.fetchall()
 
-        return "\n".join([r[0] for r in rows])
-    finally:
-        conn.close()
-"""Fetch stock data from external source"""
-# def fetch_data_from_source(query):
-        
+    return "\n".join([r[0] for r in rows])
@@ -0,0 +1,137 @@
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from .db import get_connection
+from config import Config
+
+# -----------------------------
+# Notification retention
+# -----------------------------
+# Runs outside the web process (see retention.py). Each cycle finds the
+# notification types present (a loose index scan over the (type, created_at)
+# index, so it costs one probe per type, not a table scan) and deletes each
+# type's rows older than its TTL in batches of NOTIFY_RETENTION_BATCH, one
+# short transaction per batch. Locks stay short, the notification stream and
+# inserts are never blocked for long, and autovacuum reclaims the space
+# between batches.
+
+_DISTINCT_TYPES = """
+    WITH RECURSIVE t AS (
+        SELECT min(type) AS type FROM notifications
+        UNION ALL
+        SELECT (SELECT min(type) FROM notifications WHERE type > t.type)
+        FROM t WHERE t.type IS NOT NULL
+    )
+    SELECT type FROM t WHERE type IS NOT NULL
+"""
+
+_DELETE_BATCH = """
+    DELETE FROM notifications
+    WHERE id IN (
+        SELECT id FROM notifications
+        WHERE type = %s AND created_at < %s
+        ORDER BY created_at
+        LIMIT %s
+    )
+"""
+
+
+def parse_ttls(spec):
+    """{"price_alert": 7.0, ...} from "price_alert=7,ai_signal=30"."""
+    ttls = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, days = part.partition("=")
+        try:
+            ttls[name.strip()] = float(days)
+        except ValueError:
+            raise ValueError(f"NOTIFY_TTL_BY_TYPE: bad entry {part!r}, expected type=days")
+    return ttls
+
+
+class RetentionWorker:
+    def __init__(self, default_ttl_days, ttl_by_type, batch_size, pause, interval):
+        self.default_ttl_days = default_ttl_days
+        self.ttl_by_type = ttl_by_type
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def ttl_days(self, notification_type):
+        return self.ttl_by_type.get(notification_type, self.default_ttl_days)
+
+    def notification_types(self):
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_DISTINCT_TYPES)
+                return [row[0] for row in cur.fetchall()]
+
+    def purge_type(self, notification_type, cutoff):
+        """Delete one type's rows created before `cutoff`; returns the count."""
+        deleted = 0
+        while not self.stop_event.is_set():
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(_DELETE_BATCH, (notification_type, cutoff, self.batch_size))
+                    count = cur.rowcount
+                conn.commit()
+            deleted += count
+            if count < self.batch_size:
+                break
+            self.stop_event.wait(self.pause)
+        return deleted
+
+    def run_once(self):
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        summary = {}
+        for notification_type in self.notification_types():
+            days = self.ttl_days(notification_type)
+            if days <= 0:
+                continue
+            deleted = self.purge_type(notification_type, now - timedelta(days=days))
+            if deleted:
+                summary[notification_type] = deleted
+        print(
+            f"Notification retention: deleted {sum(summary.values())} rows {summary} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        return summary
+
+    def run_forever(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Notification retention failed: {e}")
+            self.stop_event.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete notifications older than their per-type TTL")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    parser.add_argument("--interval", type=float, default=Config.NOTIFY_RETENTION_INTERVAL)
+    parser.add_argument("--batch-size", type=int, default=Config.NOTIFY_RETENTION_BATCH)
+    args = parser.parse_args(argv)
+
+    worker = RetentionWorker(
+        Config.NOTIFY_TTL_DAYS,
+        parse_ttls(Config.NOTIFY_TTL_BY_TYPE),
+        args.batch_size,
+        Config.NOTIFY_RETENTION_PAUSE,
+        args.interval,
+    )
+    if args.once:
+        worker.run_once()
+    else:
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            worker.stop()
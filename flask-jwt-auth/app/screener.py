@@ -0,0 +1,328 @@
+import ast
+import functools
+import operator
+import threading
+import time
+import numpy as np
+from . import quotes
+from config import Config
+
+# -----------------------------
+# Vectorized stock screener
+# -----------------------------
+# The stock_data universe is held as one NumPy array per column. A filter such
+# as "percentage_change > 2 and share_volume > 1e6" is parsed once into an AST
+# and evaluated as boolean masks over those arrays, so screening thousands of
+# symbols costs a handful of vector operations instead of a Python loop.
+
+NUMERIC_COLUMNS = (
+    "open_price", "high_price", "low_price", "previous_close",
+    "last_traded_price", "price_change", "percentage_change",
+    "day_percentage_change", "share_volume", "value_inr",
+    "week_high", "week_low", "daypercentagechange",
+)
+TEXT_COLUMNS = ("symbol", "company", "industry", "series")
+
+_COMPARE_OPS = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+# name -> (function, number of arguments)
+_FUNCTIONS = {
+    "abs": (np.abs, 1),
+}
+
+
+class ScreenError(ValueError):
+    """Raised for filter or sort expressions the screener cannot evaluate."""
+
+
+@functools.lru_cache(maxsize=256)
+def _parse(expression):
+    try:
+        return ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ScreenError(f"Invalid filter expression: {e.msg}")
+
+
+def _is_text(value):
+    return isinstance(value, str) or getattr(value, "dtype", None) == object
+
+
+class ScreenerUniverse:
+    """Column arrays for every symbol in stock_data, kept in step with quote updates."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.loaded_at = 0.0
+        self.columns = {}
+        self.rows = []
+        self.index = {}
+        self.load_count = 0
+        self.providers = []
+        self._provided = {}
+
+    def _is_current(self):
+        return (
+            self.version == quotes.current_version()
+            and time.time() - self.loaded_at < Config.QUOTE_SNAPSHOT_MAX_AGE
+        )
+
+    def load(self, snapshot):
+        """Rebuild every column array from a quote snapshot."""
+        rows = snapshot.rows
+        columns = {}
+        for name in NUMERIC_COLUMNS:
+            columns[name] = np.array(
+                [np.nan if row[name] is None else row[name] for row in rows],
+                dtype=np.float64
+            )
+        for name in TEXT_COLUMNS:
+            columns[name] = np.array([row[name] or "" for row in rows], dtype=object)
+
+        with self._lock:
+            self.columns = columns
+            self.rows = [dict(row) for row in rows]
+            self.index = {}
+            for i, row in enumerate(rows):
+                self.index.setdefault(row["symbol"], i)
+            self.version = snapshot.version
+            self.loaded_at = time.time()
+            self.load_count += 1
+
+    def ensure_loaded(self):
+        with self._lock:
+            if self._is_current():
+                return
+        self.load(quotes.get_snapshot())
+
+    def apply_updates(self, updates, version):
+        """
+        Write new prices for many symbols into the arrays in place.
+
+        `updates` maps symbol -> {column: value}. `version` is the quote version
+        produced by the write. The update is only applied on top of the version
+        directly before it; anything else means another write was missed and
+        the next screen does a full reload.
+        """
+        with self._lock:
+            positions = [self.index.get(symbol) for symbol in updates]
+            if self.version != version - 1 or any(i is None for i in positions):
+                self.version = None
+                return
+            positions = np.asarray(positions, dtype=np.int64)
+            names = {name for values in updates.values() for name in values}
+            for name in names & set(self.columns):
+                column = self.columns[name]
+                new_values = [values.get(name, column[i]) for i, values in zip(positions, updates.values())]
+                column[positions] = [np.nan if v is None else v for v in new_values]
+            for i, values in zip(positions, updates.values()):
+                self.rows[i].update(values)
+            self.version = version
+
+    def apply_update(self, symbol, values, version):
+        self.apply_updates({symbol: values}, version)
+
+    def register_columns(self, provider):
+        """
+        Add computed columns from another module (e.g. indicators).
+
+        `provider.names` lists the columns and `provider.columns()` returns
+        (version, {symbol: position}, {name: array}). The arrays are aligned
+        to this universe by symbol and reused until either side changes.
+        """
+        with self._lock:
+            self.providers.append(provider)
+
+    def _provided_columns(self, provider, provided):
+        """`provided` is what provider.columns() returned, fetched once per screen."""
+        version, index, columns = provided
+        key = (version, self.load_count)
+        cached = self._provided.get(id(provider))
+        if cached and cached[0] == key:
+            return cached[1]
+        positions = np.array([index.get(row["symbol"], -1) for row in self.rows], dtype=np.int64)
+        found = positions >= 0
+        aligned = {}
+        for name in provider.names:
+            column = np.full(len(self.rows), np.nan)
+            column[found] = columns[name][positions[found]]
+            aligned[name] = column
+        self._provided[id(provider)] = (key, aligned)
+        return aligned
+
+    # -----------------------------
+    # Expression evaluation
+    # -----------------------------
+    def _screen_columns(self, provided):
+        """Own columns plus every provider's, aligned to this universe."""
+        columns = dict(self.columns)
+        for provider, snapshot in provided:
+            columns.update(self._provided_columns(provider, snapshot))
+        return columns
+
+    @staticmethod
+    def _column(columns, name):
+        if name in columns:
+            return columns[name]
+        raise ScreenError(f"Unknown column: {name}")
+
+    @staticmethod
+    def _field(columns, row, i, name):
+        if name in row:
+            return row[name]
+        if name in columns:
+            value = float(columns[name][i])
+            return None if np.isnan(value) else value
+        return None
+
+    def _eval(self, node, columns):
+        if isinstance(node, ast.Expression):
+            return self._eval(node.body, columns)
+        if isinstance(node, ast.BoolOp):
+            values = [np.asarray(self._eval(v, columns), dtype=bool) for v in node.values]
+            if isinstance(node.op, ast.And):
+                return np.logical_and.reduce(values)
+            return np.logical_or.reduce(values)
+        if isinstance(node, ast.UnaryOp):
+            operand = self._eval(node.operand, columns)
+            if isinstance(node.op, ast.Not):
+                return np.logical_not(operand)
+            if _is_text(operand):
+                raise ScreenError("Arithmetic is only supported on numeric columns")
+            if isinstance(node.op, ast.USub):
+                return -operand
+            if isinstance(node.op, ast.UAdd):
+                return operand
+        if isinstance(node, ast.Compare):
+            left = self._eval(node.left, columns)
+            mask = None
+            for op, comparator in zip(node.ops, node.comparators):
+                fn = _COMPARE_OPS.get(type(op))
+                if fn is None:
+                    raise ScreenError(f"Unsupported comparison: {type(op).__name__}")
+                right = self._eval(comparator, columns)
+                with np.errstate(invalid="ignore"):
+                    result = np.asarray(fn(left, right), dtype=bool)
+                mask = result if mask is None else mask & result
+                left = right
+            return mask
+        if isinstance(node, ast.BinOp):
+            fn = _BINARY_OPS.get(type(node.op))
+            if fn is None:
+                raise ScreenError(f"Unsupported operator: {type(node.op).__name__}")
+            left, right = self._eval(node.left, columns), self._eval(node.right, columns)
+            # Checked before applying, so "a" * 10**9 never builds the string
+            if _is_text(left) or _is_text(right):
+                raise ScreenError("Arithmetic is only supported on numeric columns")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return fn(left, right)
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS or node.keywords:
+                raise ScreenError("Unsupported function call")
+            fn, arity = _FUNCTIONS[node.func.id]
+            if len(node.args) != arity:
+                raise ScreenError(f"{node.func.id}() takes exactly {arity} argument{'s' if arity != 1 else ''}")
+            args = [self._eval(arg, columns) for arg in node.args]
+            if any(_is_text(arg) for arg in args):
+                raise ScreenError(f"{node.func.id}() only accepts numeric values")
+            return fn(*args)
+        if isinstance(node, ast.Name):
+            return self._column(columns, node.id)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+            return node.value
+        raise ScreenError(f"Unsupported expression: {type(node).__name__}")
+
+    def _evaluate(self, tree, columns):
+        """_eval with NumPy and operator errors reported as ScreenError."""
+        try:
+            return self._eval(tree, columns)
+        except ScreenError:
+            raise
+        except (TypeError, ValueError, ArithmeticError) as e:
+            # e.g. comparing a text column with a number (numpy's
+            # UFuncTypeError is a TypeError)
+            raise ScreenError(f"Cannot evaluate filter expression: {e}")
+
+    def _mask(self, expression, size, columns):
+        if not expression:
+            return np.ones(size, dtype=bool)
+        mask = self._evaluate(_parse(expression), columns)
+        if np.ndim(mask) == 0:
+            return np.full(size, bool(mask))
+        if np.asarray(mask).dtype != bool:
+            raise ScreenError("Filter expression must evaluate to a condition")
+        return mask
+
+    def _order(self, matches, sort, limit, columns):
+        descending = sort.startswith("-")
+        keys = self._column(columns, sort.lstrip("-+"))[matches]
+        if keys.dtype == object:
+            order = np.argsort(keys, kind="stable")
+            if descending:
+                order = order[::-1]
+            return matches[order[:limit]]
+
+        keys = -keys if descending else keys
+        # NaN sorts last in either direction
+        keys = np.where(np.isnan(keys), np.inf, keys)
+        if limit < len(keys):
+            top = np.argpartition(keys, limit - 1)[:limit]
+            return matches[top[np.argsort(keys[top], kind="stable")]]
+        return matches[np.argsort(keys, kind="stable")]
+
+    def screen(self, expression, sort=None, limit=50, fields=None):
+        """
+        Evaluate `expression` over the universe and return the ranked rows.
+
+        `sort` names a column, prefixed with "-" for descending order.
+        """
+        self.ensure_loaded()
+        # Once per screen and outside the lock: a provider may refresh itself
+        provided = [(provider, provider.columns()) for provider in self.providers]
+        with self._lock:
+            columns = self._screen_columns(provided)
+            size = len(self.rows)
+            mask = self._mask(expression, size, columns)
+            matches = np.flatnonzero(mask)
+            total = len(matches)
+            if sort:
+                selected = self._order(matches, sort, limit, columns)
+            else:
+                selected = matches[:limit]
+
+            results = []
+            for i in selected:
+                row = self.rows[i]
+                if fields:
+                    row = {f: self._field(columns, row, i, f) for f in fields}
+                else:
+                    row = dict(row)
+                results.append(row)
+            return total, results
+
+
+universe = ScreenerUniverse()
+
+
+def apply_price_update(symbol, values, version):
+    universe.apply_update(symbol, values, version)
+
+
+def apply_price_updates(updates, version):
+    universe.apply_updates(updates, version)
+
+
+def screen(expression, sort=None, limit=50, fields=None):
+    return universe.screen(expression, sort=sort, limit=limit, fields=fields)
@@ -0,0 +1,108 @@
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:  # stdlib json is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # only gzip is offered
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # ?format=msgpack answers 406
+    msgpack = None
+
+# -----------------------------
+# Response encodings for list endpoints
+# -----------------------------
+# format=json      list of row objects (the default, unchanged shape)
+# format=columnar  {"columns": [...], "data": {column: [values...]}}, which
+#                  does not repeat every key name for every row
+# format=msgpack   the columnar document as MessagePack, for the mobile client
+# Bodies are encoded with orjson when installed, and gzip/brotli compressed
+# when the client accepts it. Snapshot-backed endpoints cache each variant on
+# the snapshot, so the work happens once per quote version.
+
+FORMATS = ("json", "columnar", "msgpack")
+MIMETYPES = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "msgpack": "application/msgpack",
+}
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class UnsupportedFormat(ValueError):
+    """Raised for a format that is unknown or whose library is not installed."""
+
+
+def _default(value):
+    # Decimals from the ORM-shaped /stocks rows, as the stdlib path did
+    return str(value)
+
+
+def dumps(payload):
+    """JSON bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def columnar(rows, columns=None):
+    if columns is None:
+        columns = list(rows[0]) if rows else []
+    return {
+        "columns": list(columns),
+        "data": {column: [row.get(column) for row in rows] for column in columns},
+    }
+
+
+def encode(rows, fmt="json", columns=None):
+    """Serialize a list of row dicts; returns (body, mimetype)."""
+    if fmt == "json":
+        if columns is not None:
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return dumps(rows), MIMETYPES[fmt]
+    if fmt == "columnar":
+        return dumps(columnar(rows, columns)), MIMETYPES[fmt]
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise UnsupportedFormat("msgpack is not installed on this server")
+        return msgpack.packb(columnar(rows, columns), default=_default, use_bin_type=True), MIMETYPES[fmt]
+    raise UnsupportedFormat(f"Unknown format: {fmt}; expected one of {', '.join(FORMATS)}")
+
+
+def negotiate_encoding(accept_encoding, size):
+    """Best content coding the client accepts: br, then gzip, else None."""
+    if size < COMPRESS_MIN_BYTES or not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
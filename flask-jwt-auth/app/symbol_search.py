@@ -0,0 +1,212 @@
+import bisect
+import re
+import threading
+import numpy as np
+from .quotes import get_snapshot
+
+# -----------------------------
+# Symbol / company autocomplete
+# -----------------------------
+# Prefix matching uses sorted key arrays searched with bisect (a flattened
+# prefix trie) over symbols, full company names and company-name words, so
+# "mot" finds TATAMOTORS through "Tata Motors". Within a prefix range the
+# largest companies (value_inr) are picked with one vectorized partition.
+# When exact and prefix hits do not fill the page, a trigram index adds fuzzy
+# matches for typos ("relaince"). Ranking: exact > symbol prefix > name prefix
+# > word prefix > fuzzy.
+#
+# The index only depends on which symbols and names exist, so it is rebuilt
+# when that set changes, not on every price tick; prices are read from the
+# current snapshot at query time.
+
+EXACT, SYMBOL_PREFIX, NAME_PREFIX, WORD_PREFIX, FUZZY = range(5)
+MATCH_NAMES = {EXACT: "exact", SYMBOL_PREFIX: "prefix", NAME_PREFIX: "prefix", WORD_PREFIX: "prefix", FUZZY: "fuzzy"}
+FUZZY_THRESHOLD = 0.3
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _normalize(text):
+    return " ".join(_WORD.findall((text or "").lower()))
+
+
+def _symbol_key(symbol):
+    """Symbols are matched without their punctuation: "M&M" -> "mm", "BAJAJ-AUTO" -> "bajajauto"."""
+    return _normalize(symbol).replace(" ", "")
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _PrefixIndex:
+    """Sorted keys with the entry each belongs to and that entry's weight."""
+
+    def __init__(self, pairs, weights):
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.entries = np.array([entry for _, entry in pairs], dtype=np.int64)
+        self.weights = weights[self.entries] if len(pairs) else np.zeros(0)
+
+    def top(self, prefix, limit):
+        """Up to `limit` entries with a key starting with `prefix`, heaviest first."""
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\uffff", lo)
+        if hi - lo <= limit:
+            order = np.argsort(-self.weights[lo:hi], kind="stable")
+        else:
+            top = np.argpartition(-self.weights[lo:hi], limit - 1)[:limit]
+            order = top[np.argsort(-self.weights[lo:hi][top], kind="stable")]
+        return self.entries[lo:hi][order].tolist()
+
+
+class SymbolIndex:
+    def __init__(self, rows):
+        self.symbols = []
+        self.by_symbol = {}
+        self.by_key = {}
+        self.by_name = {}
+        weights = []
+        symbol_keys, name_keys, word_keys = [], [], []
+        # Trigram documents: each symbol, full name and name word separately,
+        # so a typo in one word is not diluted by the rest of the name
+        postings = {}
+        doc_entries, doc_sizes = [], []
+
+        for row in rows:
+            symbol = row["symbol"]
+            if not symbol or symbol.upper() in self.by_symbol:
+                continue
+            entry = len(self.symbols)
+            self.symbols.append(symbol)
+            self.by_symbol[symbol.upper()] = entry
+            weights.append(float(row.get("value_inr") or 0))
+
+            symbol_key = _symbol_key(symbol)
+            if symbol_key:
+                self.by_key.setdefault(symbol_key, entry)
+            name_key = _normalize(row.get("company"))
+            if symbol_key:
+                symbol_keys.append((symbol_key, entry))
+            if name_key:
+                self.by_name.setdefault(name_key, entry)
+                name_keys.append((name_key, entry))
+            words = set(name_key.split())
+            for word in words - {name_key.split()[0] if name_key else ""}:
+                word_keys.append((word, entry))
+
+            for text in {symbol_key, name_key} | words:
+                if not text:
+                    continue
+                grams = _trigrams(text)
+                doc = len(doc_entries)
+                doc_entries.append(entry)
+                doc_sizes.append(len(grams))
+                for gram in grams:
+                    postings.setdefault(gram, []).append(doc)
+
+        weights = np.array(weights, dtype=np.float64)
+        self._weights = weights
+        self._symbols = _PrefixIndex(symbol_keys, weights)
+        self._names = _PrefixIndex(name_keys, weights)
+        self._words = _PrefixIndex(word_keys, weights)
+        self._postings = {gram: np.array(docs, dtype=np.int64) for gram, docs in postings.items()}
+        self._doc_entries = np.array(doc_entries, dtype=np.int64)
+        self._doc_sizes = np.array(doc_sizes, dtype=np.float64)
+        self._entry_count = len(self.symbols)
+
+    def lookup(self, symbol):
+        """Exact, case-insensitive symbol match; returns the stored symbol."""
+        entry = self.by_symbol.get((symbol or "").strip().upper())
+        return None if entry is None else self.symbols[entry]
+
+    def _fuzzy(self, query, limit):
+        grams = _trigrams(query)
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self._doc_entries))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(grams) + self._doc_sizes[candidates] - shared[candidates])
+        # Best document per entry
+        best = np.zeros(self._entry_count)
+        np.maximum.at(best, self._doc_entries[candidates], similarity)
+        matches = np.flatnonzero(best >= FUZZY_THRESHOLD)
+        # Most similar first, larger companies first among ties
+        order = matches[np.lexsort((-self._weights[matches], -best[matches]))]
+        return order[:limit].tolist()
+
+    def search(self, query, limit=10):
+        """Ranked [(symbol, match kind)] for an autocomplete query."""
+        raw = (query or "").strip().upper()
+        query = _normalize(query)
+        if not query:
+            return []
+        symbol_query = query.replace(" ", "")
+
+        ranked = {}
+
+        def add(entries, rank):
+            for entry in entries:
+                ranked.setdefault(entry, rank)
+
+        # The symbol as typed first, so "M&M" beats another symbol that also reduces to "mm"
+        exact = (self.by_symbol.get(raw), self.by_key.get(symbol_query), self.by_name.get(query))
+        add([e for e in exact if e is not None], EXACT)
+        add(self._symbols.top(symbol_query, limit), SYMBOL_PREFIX)
+        add(self._names.top(query, limit), NAME_PREFIX)
+        add(self._words.top(query, limit), WORD_PREFIX)
+        if len(ranked) < limit:
+            add(self._fuzzy(query, limit), FUZZY)
+
+        # dicts keep insertion order, which is already rank then weight
+        return [(self.symbols[entry], MATCH_NAMES[rank]) for entry, rank in list(ranked.items())[:limit]]
+
+
+def _fingerprint(snapshot):
+    return hash(tuple((row["symbol"], row["company"]) for row in snapshot.rows))
+
+
+_index = None
+_index_key = None
+_indexed_snapshot = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """(index, snapshot); the index is rebuilt only when symbols or names change."""
+    global _index, _index_key, _indexed_snapshot
+    snapshot = get_snapshot()
+    if snapshot is not _indexed_snapshot:
+        with _index_lock:
+            if snapshot is not _indexed_snapshot:
+                key = _fingerprint(snapshot)
+                if key != _index_key:
+                    _index = SymbolIndex(snapshot.rows)
+                    _index_key = key
+                _indexed_snapshot = snapshot
+    return _index, snapshot
+
+
+def search_symbols(query, limit=10):
+    index, snapshot = get_index()
+    results = []
+    for symbol, match in index.search(query, limit):
+        row = snapshot.by_symbol[symbol]
+        results.append({
+            "symbol": symbol,
+            "name": row["company"],
+            "industry": row["industry"],
+            "price": row["last_traded_price"],
+            "changePercent": row["percentage_change"],
+            "match": match,
+        })
+    return results
+
+
+def lookup_symbol(symbol):
+    """Snapshot row for an exact (case-insensitive) symbol, or None."""
+    index, snapshot = get_index()
+    found = index.lookup(symbol)
+    return None if found is None else snapshot.by_symbol[found]
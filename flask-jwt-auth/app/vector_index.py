@@ -0,0 +1,361 @@
+import fcntl
+import argparse
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from .db import get_connection
+from config import Config
+
+# -----------------------------
+# Vector search tuning + local ANN fallback
+# -----------------------------
+# With pgvector the HNSW/IVFFlat indexes are created by migration and tuned per
+# query with SET LOCAL. Deployments without pgvector can set
+# VECTOR_BACKEND=local and use LocalVectorIndex instead: an IVF index (k-means
+# coarse quantizer + inverted lists) over a memory-mapped float32 matrix.
+# Web workers only append the chat messages they persist, so an index is
+# first built from the existing rows with `python reindex.py`.
+
+
+def tune_vector_search(cur, ef_search=None, probes=None):
+    """Apply per-query ANN recall/speed knobs to the current transaction."""
+    ef_search = Config.VECTOR_EF_SEARCH if ef_search is None else ef_search
+    probes = Config.VECTOR_PROBES if probes is None else probes
+    if ef_search:
+        cur.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    if probes:
+        cur.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+
+
+def use_local_index():
+    return Config.VECTOR_BACKEND == "local"
+
+
+def _kmeans(data, nlist, iterations=10, seed=0):
+    """Plain Lloyd's k-means on inner-product space; returns (nlist, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroids(data, centroids, 1)[:, 0]
+        for c in range(nlist):
+            members = data[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                centroids[c] = data[rng.integers(len(data))]
+    return centroids
+
+
+def _nearest_centroids(data, centroids, n, chunk=65536):
+    # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty((len(data), n), dtype=np.int64)
+    for start in range(0, len(data), chunk):
+        scores = data[start:start + chunk] @ centroids.T - half_norms
+        if n == 1:
+            out[start:start + chunk, 0] = np.argmax(scores, axis=1)
+        else:
+            out[start:start + chunk] = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    return out
+
+
+class LocalVectorIndex:
+    """
+    Append-only vector store with an IVF index for approximate search.
+
+    `metric` is "cosine" (vectors are normalized on insert and scored by inner
+    product) or "l2". Below `exact_threshold` rows every search is exact.
+
+    Several processes may open the same files. Appends take an exclusive
+    flock on `{path}.lock` and first pick up the rows other processes added;
+    searches notice a grown or replaced file and load the new rows under a
+    shared lock.
+    """
+
+    def __init__(self, path, dim, metric="cosine", exact_threshold=20000, nprobe=8):
+        self.path = path
+        self.dim = dim
+        self.metric = metric
+        self.exact_threshold = exact_threshold
+        self.nprobe = nprobe
+        self.row_bytes = dim * 4
+        self._lock = threading.RLock()
+        self._vectors_path = f"{path}.f32"
+        self._payloads_path = f"{path}.jsonl"
+        self._lock_path = f"{path}.lock"
+        self._file_id = None
+        self._file_size = 0
+        self._payload_offset = 0
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._payloads = []
+        self._size = 0
+        self._centroids = None
+        self._lists = None
+        self._trained_size = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock, self._locked(fcntl.LOCK_EX):
+            for p in (self._vectors_path, self._payloads_path):
+                if not os.path.exists(p):
+                    open(p, "wb").close()
+            self._sync(repair=True)
+
+    def __len__(self):
+        self.refresh()
+        return self._size
+
+    @contextmanager
+    def _locked(self, mode):
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            os.close(fd)
+
+    def _sync(self, repair=False):
+        """
+        Load rows appended (or a file swapped in) by any process; call with the file lock held.
+
+        A row counts once both its vector and its payload line are complete.
+        With `repair` (exclusive lock only) a half-written tail left by a
+        crashed writer is cut off so the next append starts in step.
+        """
+        stat = os.stat(self._vectors_path)
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id:
+            # First load, or rebuild_local_index swapped in new files
+            self._file_id = file_id
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._payloads = []
+            self._payload_offset = 0
+            self._size = 0
+            self._centroids = None
+            self._lists = None
+            self._trained_size = 0
+        self._file_size = stat.st_size
+        rows = stat.st_size // self.row_bytes
+        with open(self._payloads_path, "rb") as f:
+            f.seek(self._payload_offset)
+            for line in f:
+                if len(self._payloads) >= rows or not line.endswith(b"\n"):
+                    break
+                self._payloads.append(json.loads(line))
+                self._payload_offset += len(line)
+        if repair:
+            if stat.st_size != len(self._payloads) * self.row_bytes:
+                os.truncate(self._vectors_path, len(self._payloads) * self.row_bytes)
+                self._file_size = len(self._payloads) * self.row_bytes
+            if os.path.getsize(self._payloads_path) != self._payload_offset:
+                os.truncate(self._payloads_path, self._payload_offset)
+
+        first, self._size = self._size, len(self._payloads)
+        if self._size == first:
+            return
+        self._remap()
+        if self._centroids is not None:
+            new_ids = np.arange(first, self._size, dtype=np.int64)
+            assignment = _nearest_centroids(np.asarray(self._matrix[first:]), self._centroids, 1)[:, 0]
+            for c in np.unique(assignment):
+                self._lists[c] = np.concatenate([self._lists[c], new_ids[assignment == c]])
+        self._maybe_train()
+
+    def refresh(self):
+        """Pick up rows other processes have added since the last look (one stat when nothing changed)."""
+        with self._lock:
+            stat = os.stat(self._vectors_path)
+            if (stat.st_dev, stat.st_ino) == self._file_id and stat.st_size == self._file_size:
+                return
+            with self._locked(fcntl.LOCK_SH):
+                self._sync()
+
+    def _remap(self):
+        if self._size:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                     shape=(self._size, self.dim))
+        else:
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+    def _prepare(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if self.metric == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def add(self, vectors, payloads):
+        """Append vectors with their payloads (any JSON-serializable value)."""
+        vectors = self._prepare(vectors)
+        if len(vectors) != len(payloads):
+            raise ValueError("vectors and payloads must have the same length")
+        with self._lock, self._locked(fcntl.LOCK_EX):
+            # The files may have grown (or been replaced) since this process last looked
+            self._sync(repair=True)
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._payloads_path, "ab") as f:
+                f.write("".join(json.dumps(payload) + "\n" for payload in payloads).encode("utf-8"))
+            self._sync()
+
+    def swap_in(self, rebuilt, after_id):
+        """
+        Replace this index's files with those of `rebuilt`, atomically for every process.
+
+        Rows added here with a payload id above `after_id` (written while the
+        rebuild ran) are carried over first so they are not lost.
+        """
+        with self._lock, self._locked(fcntl.LOCK_EX):
+            self._sync(repair=True)
+            newer = [r for r in range(self._size) if self._payloads[r].get("id", 0) > after_id]
+            if newer:
+                rebuilt.add(np.asarray(self._matrix[newer]), [self._payloads[r] for r in newer])
+            os.replace(rebuilt._payloads_path, self._payloads_path)
+            os.replace(rebuilt._vectors_path, self._vectors_path)
+            self._sync()
+        os.remove(rebuilt._lock_path)
+
+    def _maybe_train(self):
+        if self._size < self.exact_threshold:
+            return
+        if self._centroids is not None and self._size < 4 * self._trained_size:
+            return
+        self.train()
+
+    def train(self, nlist=None, sample_size=100000):
+        """(Re)build the coarse quantizer and inverted lists."""
+        with self._lock:
+            nlist = nlist or max(1, int(np.sqrt(self._size)))
+            rng = np.random.default_rng(0)
+            sample_ids = rng.choice(self._size, min(sample_size, self._size), replace=False)
+            sample = np.asarray(self._matrix[np.sort(sample_ids)])
+            self._centroids = _kmeans(sample, min(nlist, len(sample)))
+            assignment = _nearest_centroids(np.asarray(self._matrix), self._centroids, 1)[:, 0]
+            order = np.argsort(assignment, kind="stable")
+            bounds = np.searchsorted(assignment[order], np.arange(len(self._centroids) + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self._centroids))]
+            self._trained_size = self._size
+
+    def _score(self, candidates, query):
+        if self.metric == "cosine":
+            return candidates @ query
+        diff = candidates - query
+        return -np.einsum("ij,ij->i", diff, diff)
+
+    def search(self, query, k=5, nprobe=None, exact=False):
+        """Return up to k (payload, score) pairs, best first; higher score is closer."""
+        query = self._prepare(query)[0]
+        self.refresh()
+        with self._lock:
+            if self._size == 0:
+                return []
+            if exact or self._centroids is None:
+                ids = None
+                scores = self._score(self._matrix, query)
+            else:
+                probe = min(nprobe or self.nprobe, len(self._centroids))
+                nearest = _nearest_centroids(query[None, :], self._centroids, probe)[0]
+                ids = np.sort(np.concatenate([self._lists[c] for c in nearest]))
+                if len(ids) == 0:
+                    return []
+                scores = self._score(self._matrix[ids], query)
+
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            rows = top if ids is None else ids[top]
+            return [(self._payloads[r], float(scores[t])) for r, t in zip(rows, top)]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Metric per table, matching the operators used against pgvector
+INDEX_METRICS = {
+    "chat_messages": "cosine",
+    "stock_documents": "l2",
+}
+
+
+def get_local_index(name):
+    if name not in _indexes:
+        with _indexes_lock:
+            if name not in _indexes:
+                _indexes[name] = LocalVectorIndex(
+                    os.path.join(Config.VECTOR_INDEX_DIR, name),
+                    Config.EMBED_DIM,
+                    metric=INDEX_METRICS.get(name, "cosine"),
+                    nprobe=Config.VECTOR_PROBES or 8,
+                )
+    return _indexes[name]
+
+
+def search_local(name, embedding, k):
+    """Content strings of the k nearest payloads in a local index."""
+    return [payload["content"] for payload, _ in get_local_index(name).search(embedding, k)]
+
+
+# -----------------------------
+# Rebuilding from Postgres
+# -----------------------------
+# Rows each local index is built from, as (id, content); the same rows the
+# pgvector queries search
+INDEX_SOURCES = {
+    "chat_messages": "SELECT id, content FROM chat_messages WHERE role = 'user' ORDER BY id",
+    "stock_documents": "SELECT id, content FROM stock_documents ORDER BY id",
+}
+
+
+def rebuild_local_index(name, batch_size=256):
+    """
+    Re-embed every source row of `name` into a fresh index and swap it in.
+
+    Running web workers keep serving the old files until the swap and pick
+    up the new ones on their next search. Returns the number of rows.
+    """
+    from .embeddings import embed_many
+
+    index = get_local_index(name)
+    rebuilt_path = f"{index.path}.rebuild"
+    for suffix in (".f32", ".jsonl", ".lock"):
+        if os.path.exists(rebuilt_path + suffix):
+            os.remove(rebuilt_path + suffix)
+    rebuilt = LocalVectorIndex(rebuilt_path, index.dim, metric=index.metric, nprobe=index.nprobe)
+
+    last_id = 0
+    with get_connection() as conn:
+        # Named cursor: rows are streamed in batches instead of loaded at once
+        with conn.cursor(name=f"reindex_{name}") as cur:
+            cur.itersize = batch_size
+            cur.execute(INDEX_SOURCES[name])
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                rows = [(row_id, content) for row_id, content in rows if content]
+                if rows:
+                    vectors = embed_many([content for _, content in rows])
+                    rebuilt.add(vectors, [{"id": row_id, "content": content} for row_id, content in rows])
+                    last_id = rows[-1][0]
+
+    index.swap_in(rebuilt, last_id)
+    return len(index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the local vector indexes (VECTOR_BACKEND=local) from the rows in Postgres"
+    )
+    parser.add_argument("names", nargs="*", help=f"indexes to rebuild: {', '.join(sorted(INDEX_SOURCES))} (default: all)")
+    parser.add_argument("--batch-size", type=int, default=256, help="rows embedded per batch")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(INDEX_SOURCES)
+    if unknown:
+        parser.error(f"unknown index: {', '.join(sorted(unknown))}")
+
+    for name in args.names or sorted(INDEX_SOURCES):
+        start = time.perf_counter()
+        count = rebuild_local_index(name, args.batch_size)
+        print(f"Rebuilt {name}: {count} rows in {time.perf_counter() - start:.1f}s")
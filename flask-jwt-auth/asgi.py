@@ -0,0 +1,8 @@
+from app.asgi import create_asgi_app
+
+# Async serving mode: uvicorn asgi:application --host 0.0.0.0 --port 5000
+application = create_asgi_app()
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host="127.0.0.1", port=5000)
@@ -0,0 +1,386 @@
+"""
+Local stand-ins for Ollama, OpenAI and Marketstack, with configurable latency.
+
+Each fake answers the request shapes the backend sends:
+  ollama       POST /api/embeddings, POST /api/embed
+  openai       POST /v1/chat/completions (plain and stream=true)
+  marketstack  GET /v2/tickers/<symbol>/eod|intraday, GET /v2/eod|intraday/latest
+  smtp         EHLO/MAIL/RCPT/DATA/RSET/QUIT, without TLS or auth (FakeSMTPServer)
+Embeddings and price series are deterministic per input, so runs are comparable.
+
+Used by load_bench.py; can also be run on its own to point a dev server at:
+
+    python benchmarks/fake_services.py --ollama-ms 20 --openai-ms 300 --marketstack-ms 80 --smtp-connect-ms 300
+"""
+import argparse
+import hashlib
+import json
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+EMBED_DIM = 768
+ANSWER = (
+    "Based on the provided context the stock shows steady momentum with moderate volatility. "
+    "Consider position sizing and your risk tolerance before acting; this is not financial advice."
+)
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+def fake_embedding(text, dim=EMBED_DIM):
+    rng = np.random.default_rng(_seed(text))
+    vector = rng.normal(size=dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_bars(symbol, kind, limit, now=None):
+    """`limit` bars for a symbol, newest first, as Marketstack returns them."""
+    now = now or datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if kind == "intraday":
+        step = timedelta(hours=1)
+    else:
+        step = timedelta(days=1)
+        now = now.replace(hour=0)
+    rng = np.random.default_rng(_seed(f"{symbol}:{kind}"))
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, size=limit)))
+    bars = []
+    for i, close in enumerate(closes[::-1]):
+        close = round(float(close), 2)
+        spread = round(close * 0.01, 2)
+        bars.append({
+            "open": round(close - spread / 2, 2),
+            "high": round(close + spread, 2),
+            "low": round(close - spread, 2),
+            "close": close,
+            "volume": 1000000 + 1000 * i,
+            "date": (now - i * step).strftime("%Y-%m-%dT%H:%M:%S+0000"),
+            "symbol": symbol,
+            "exchange": "XNSE",
+        })
+    return bars
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None  # set on the per-server subclass
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_one_request(self):
+        self._counted = False
+        try:
+            super().handle_one_request()
+        finally:
+            if self._counted:
+                self.service.leave()
+
+    def parse_request(self):
+        # Only parsed requests count as in flight, not idle keep-alive connections
+        ok = super().parse_request()
+        if ok:
+            self._counted = True
+            self.service.enter()
+        return ok
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        self.service.record()
+        if self.service.latency:
+            time.sleep(self.service.latency)
+
+
+class _OllamaHandler(_Handler):
+    def do_POST(self):
+        self._delay()
+        body = self._body()
+        if self.path == "/api/embeddings":
+            self._send_json({"embedding": fake_embedding(body.get("prompt", ""))})
+        elif self.path == "/api/embed":
+            texts = body.get("input") or []
+            texts = [texts] if isinstance(texts, str) else texts
+            self._send_json({"model": body.get("model"), "embeddings": [fake_embedding(t) for t in texts]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            return self._send_json({"error": {"message": "not found"}}, 404)
+        self._delay()
+        body = self._body()
+        created = int(time.time())
+        if not body.get("stream"):
+            return self._send_json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ANSWER},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, token in enumerate(ANSWER.split(" ")):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": token if i == 0 else " " + token}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.service.token_latency:
+                time.sleep(self.service.token_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class _MarketstackHandler(_Handler):
+    def do_GET(self):
+        self._delay()
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        if parts and parts[0] == "v2":
+            parts = parts[1:]
+        limit = max(1, min(int(params.get("limit", 100)), 1000))
+
+        if len(parts) == 3 and parts[0] == "tickers" and parts[2] in ("eod", "intraday"):
+            bars = fake_bars(parts[1], parts[2], limit)
+            return self._send_json({"pagination": {"limit": limit, "count": len(bars)}, "data": bars})
+        if len(parts) == 2 and parts[0] in ("eod", "intraday") and parts[1] == "latest":
+            symbols = [s for s in params.get("symbols", "").split(",") if s]
+            bars = [fake_bars(symbol, parts[0], 2)[0] for symbol in symbols]
+            return self._send_json({"pagination": {"count": len(bars)}, "data": bars})
+        self._send_json({"error": {"code": "not_found"}}, 404)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # async_bench.py opens hundreds of connections at once
+    request_queue_size = 1024
+
+
+class FakeService:
+    """One fake upstream on its own port and thread."""
+
+    def __init__(self, name, handler, latency=0.0, token_latency=0.0, host="127.0.0.1", port=0):
+        self.name = name
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        handler_class = type(f"{handler.__name__}_{name}", (handler,), {"service": self})
+        self.server = _Server((host, port), handler_class)
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"fake-{name}", daemon=True)
+
+    def record(self):
+        with self._lock:
+            self.requests += 1
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def reset_peak(self):
+        with self._lock:
+            self.max_in_flight = self.in_flight
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: no TLS, no auth, messages are counted and dropped."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        server = self.server
+        # Stands in for the TCP + STARTTLS + AUTH round trips of a real relay
+        if server.connect_latency:
+            time.sleep(server.connect_latency)
+        server.record("connections")
+        self.reply("220 fake-smtp ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-fake-smtp")
+                self.reply("250 8BITMIME")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.partition(":")[2].strip("<> ")
+                if address.startswith("bounce"):
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                if server.message_latency:
+                    time.sleep(server.message_latency)
+                server.record("messages")
+                self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """Local SMTP stand-in with per-connection and per-message latency; counts connections and messages."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_ms=300, message_ms=20, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.connect_latency = connect_ms / 1000
+        self.message_latency = message_ms / 1000
+        self.counts = {"connections": 0, "messages": 0}
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, name="fake-smtp", daemon=True)
+
+    def record(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeServices:
+    """Ollama, OpenAI, Marketstack and SMTP fakes, and the env vars that point the app at them."""
+
+    def __init__(self, ollama_ms=20, openai_ms=300, openai_token_ms=5, marketstack_ms=80,
+                 smtp_connect_ms=300, smtp_message_ms=20, ports=(0, 0, 0, 0)):
+        self.ollama = FakeService("ollama", _OllamaHandler, ollama_ms / 1000, port=ports[0])
+        self.openai = FakeService("openai", _OpenAIHandler, openai_ms / 1000, openai_token_ms / 1000, port=ports[1])
+        self.marketstack = FakeService("marketstack", _MarketstackHandler, marketstack_ms / 1000, port=ports[2])
+        self.smtp = FakeSMTPServer(smtp_connect_ms, smtp_message_ms, port=ports[3])
+
+    def start(self):
+        for service in (self.ollama, self.openai, self.marketstack, self.smtp):
+            service.start()
+        return self
+
+    def stop(self):
+        for service in (self.ollama, self.openai, self.marketstack, self.smtp):
+            service.stop()
+
+    def environ(self):
+        return {
+            "OLLAMA_URL": self.ollama.url,
+            "OPENAI_BASE_URL": f"{self.openai.url}/v1",
+            "OPENAI_API_KEY": "fake-key",
+            "MARKETSTACK_BASE_URL": f"{self.marketstack.url}/v2",
+            "MARKET_STACK_API_KEY": "fake-key",
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(self.smtp.port),
+            "SMTP_STARTTLS": "false",
+            "SMTP_USER": "",
+        }
+
+    def request_counts(self):
+        counts = {s.name: s.requests for s in (self.ollama, self.openai, self.marketstack)}
+        counts["smtp_connections"] = self.smtp.counts["connections"]
+        counts["smtp_messages"] = self.smtp.counts["messages"]
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ollama-ms", type=float, default=20)
+    parser.add_argument("--openai-ms", type=float, default=300, help="time to first token")
+    parser.add_argument("--openai-token-ms", type=float, default=5)
+    parser.add_argument("--marketstack-ms", type=float, default=80)
+    parser.add_argument("--smtp-connect-ms", type=float, default=300, help="connection + handshake time")
+    parser.add_argument("--smtp-message-ms", type=float, default=20)
+    parser.add_argument("--ports", type=int, nargs=4, default=(11434, 18080, 18081, 1025),
+                        metavar=("OLLAMA", "OPENAI", "MARKETSTACK", "SMTP"))
+    args = parser.parse_args()
+
+    services = FakeServices(args.ollama_ms, args.openai_ms, args.openai_token_ms, args.marketstack_ms,
+                            args.smtp_connect_ms, args.smtp_message_ms, args.ports)
+    services.start()
+    for key, value in services.environ().items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == "__main__":
+    main()
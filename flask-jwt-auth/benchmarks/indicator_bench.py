@@ -0,0 +1,111 @@
+"""
+Full indicator recompute vs incremental update.
+
+Builds a synthetic daily OHLC panel (default 2,000 symbols x 5 years), then
+times:
+  full         compute_indicators over the whole panel (every bar, every symbol)
+  replay       rebuilding the rolling state from history (what a reload costs)
+  append       IndicatorState.step for one new bar on every symbol
+  revise       replacing that newest bar (an intraday EOD revision)
+and checks that the incremental values match the full recompute.
+
+    python benchmarks/indicator_bench.py --symbols 2000 --years 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.indicators import compute_indicators, replay  # noqa: E402
+
+
+def make_panel(symbols, bars, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.015, size=(symbols, bars))
+    close = 100 * np.exp(np.cumsum(returns, axis=1))
+    spread = np.abs(rng.normal(0, 0.01, size=(symbols, bars))) * close
+    high = close + spread
+    low = close - spread
+    # Younger listings: left-pad a tenth of the symbols with NaN
+    for i in range(0, symbols, 10):
+        start = rng.integers(bars // 2)
+        close[i, :start] = high[i, :start] = low[i, :start] = np.nan
+    return close, high, low
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    bars = int(args.years * 252)
+    close, high, low = make_panel(args.symbols, bars + 1)
+    history = (close[:, :-1], high[:, :-1], low[:, :-1])
+    new_bar = (close[:, -1], high[:, -1], low[:, -1])
+    rows = np.arange(args.symbols)
+
+    full_seconds, full = timed(lambda: compute_indicators(close, high, low), args.repeat)
+    replay_seconds, _ = timed(lambda: replay(*history), args.repeat)
+
+    append_times, revise_times = [], []
+    for _ in range(args.repeat):
+        state = replay(*history)
+        start = time.perf_counter()
+        state.step(rows, *new_bar)
+        append_times.append(time.perf_counter() - start)
+    replace = np.ones(args.symbols, dtype=bool)
+    for _ in range(20):
+        start = time.perf_counter()
+        state.step(rows, *new_bar, replace=replace)
+        revise_times.append(time.perf_counter() - start)
+
+    values = state.values()
+    max_error = max(
+        float(np.nanmax(np.abs(values[name] - full[name][:, -1]))) for name in values
+    )
+
+    append_seconds = min(append_times)
+    revise_seconds = min(revise_times)
+    results = {
+        "symbols": args.symbols,
+        "bars": bars,
+        "full_recompute_seconds": round(full_seconds, 4),
+        "replay_seconds": round(replay_seconds, 4),
+        "append_one_bar_ms": round(append_seconds * 1000, 3),
+        "revise_one_bar_ms": round(revise_seconds * 1000, 3),
+        "speedup_vs_full": round(full_seconds / append_seconds, 1),
+        "max_abs_error": max_error,
+    }
+
+    print(f"{args.symbols} symbols x {bars} bars")
+    print(f"  full recompute:   {full_seconds * 1000:10.1f} ms")
+    print(f"  state replay:     {replay_seconds * 1000:10.1f} ms")
+    print(f"  append one bar:   {append_seconds * 1000:10.3f} ms  ({results['speedup_vs_full']}x faster than full)")
+    print(f"  revise one bar:   {revise_seconds * 1000:10.3f} ms")
+    print(f"  max |incremental - full|: {max_error:.2e}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Sending N emails with a fresh SMTP connection each vs one reused session.
+
+Runs against the local SMTP stand-in from fake_services.py, whose connection
+latency stands in for TCP + STARTTLS + AUTH to a real relay:
+  per_message  connect, send, quit for every email (the old inline signup path)
+  session      MailSender.deliver over one SMTPSession, as mailer.py sends a batch
+A recipient starting with "bounce" gets a 550, to check that permanent
+rejections are reported without dropping the session.
+
+    python benchmarks/mail_bench.py --emails 200 --connect-ms 300 --message-ms 20
+"""
+import argparse
+import json
+import os
+import smtplib
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_services import FakeSMTPServer  # noqa: E402
+from app.mail import MailSender, SMTPSession, build_message  # noqa: E402
+
+SENDER = "noreply@example.com"
+
+
+def per_message(port, rows):
+    for _, recipient, subject, body, _ in rows:
+        server = smtplib.SMTP("127.0.0.1", port)
+        try:
+            server.sendmail(SENDER, [recipient], build_message(SENDER, recipient, subject, body).as_string())
+        except smtplib.SMTPRecipientsRefused:
+            pass
+        server.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--connect-ms", type=float, default=300)
+    parser.add_argument("--message-ms", type=float, default=20)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    smtp = FakeSMTPServer(args.connect_ms, args.message_ms).start()
+    rows = [
+        (i, f"bounce{i}@example.com" if i % 50 == 0 else f"user{i}@example.com", "Welcome", "Hello!", 0)
+        for i in range(1, args.emails + 1)
+    ]
+    try:
+        start = time.perf_counter()
+        per_message(smtp.port, rows)
+        per_message_seconds = time.perf_counter() - start
+        per_message_connections = smtp.counts["connections"]
+
+        session = SMTPSession("127.0.0.1", smtp.port, "", "", starttls=False)
+        sender = MailSender(session, SENDER, len(rows), 1, max_attempts=8, retry_base=30, retry_max=3600)
+        start = time.perf_counter()
+        sent, retries, failures = sender.deliver(rows)
+        session_seconds = time.perf_counter() - start
+        session.close()
+    finally:
+        smtp.stop()
+
+    results = {
+        "emails": args.emails,
+        "connect_ms": args.connect_ms,
+        "message_ms": args.message_ms,
+        "per_message_seconds": round(per_message_seconds, 3),
+        "per_message_connections": per_message_connections,
+        "session_seconds": round(session_seconds, 3),
+        "session_connections": session.connects,
+        "session_sent": len(sent),
+        "session_retries": len(retries),
+        "session_permanent_failures": len(failures),
+        "speedup": round(per_message_seconds / session_seconds, 1),
+    }
+    print(f"{args.emails} emails, {args.connect_ms:.0f} ms connect, {args.message_ms:.0f} ms per message")
+    print(f"  per-message connections: {per_message_seconds:7.2f}s  ({per_message_connections} connections)")
+    print(f"  reused session:          {session_seconds:7.2f}s  ({session.connects} connection, "
+          f"{len(sent)} sent, {len(failures)} rejected, {len(retries)} to retry)")
+    print(f"  speedup: {results['speedup']}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
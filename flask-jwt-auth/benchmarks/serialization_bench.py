@@ -0,0 +1,95 @@
+"""
+Payload size and serialization time for the stock listing endpoints.
+
+Compares, for N synthetic stock_data rows (default 5,000):
+  legacy          per-row dict building with float()/int() + stdlib json (the old get_stock_data)
+  json            the same rows encoded by app.serialization (orjson when installed)
+  columnar        {"columns", "data"} via app.serialization
+  msgpack         columnar as MessagePack (skipped if msgpack is not installed)
+each uncompressed, gzip and brotli (skipped if brotli is not installed).
+
+    python benchmarks/serialization_bench.py --rows 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import serialization  # noqa: E402
+from app.quotes import _serialize_row  # noqa: E402
+
+
+def make_raw_rows(n, seed=0):
+    """Tuples as psycopg2 returns them from stock_data (numerics as Decimal)."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        price = Decimal(f"{rng.uniform(10, 5000):.2f}")
+        rows.append((
+            f"Company {i} Ltd", f"SYM{i}", rng.choice(["Banking", "IT", "Auto", "Pharma"]), "EQ",
+            price, price, price, price, price,
+            Decimal(f"{rng.uniform(-50, 50):.2f}"), Decimal(f"{rng.uniform(-5, 5):.2f}"),
+            Decimal(f"{rng.uniform(-5, 5):.2f}"), rng.randint(1000, 10 ** 8),
+            Decimal(f"{rng.uniform(1e6, 1e12):.2f}"), price, price, Decimal("0.00"),
+        ))
+    return rows
+
+
+def legacy(raw_rows):
+    rows = [_serialize_row(raw) for raw in raw_rows]
+    return json.dumps(rows).encode("utf-8")
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    raw_rows = make_raw_rows(args.rows)
+    rows = [_serialize_row(raw) for raw in raw_rows]
+
+    cases = {"legacy": lambda: legacy(raw_rows)}
+    for fmt in serialization.FORMATS:
+        if fmt == "msgpack" and serialization.msgpack is None:
+            continue
+        cases[fmt] = lambda fmt=fmt: serialization.encode(rows, fmt)[0]
+
+    codings = ["gzip"] + (["br"] if serialization.brotli is not None else [])
+    results = {"rows": args.rows, "orjson": serialization.orjson is not None, "cases": {}}
+    print(f"{args.rows} rows (orjson={'yes' if serialization.orjson else 'no'})")
+    print(f"  {'case':<10} {'encode ms':>10} {'bytes':>10}" + "".join(f" {c + ' bytes':>11} {c + ' ms':>8}" for c in codings))
+    for name, fn in cases.items():
+        seconds, body = timed(fn, args.repeat)
+        entry = {"encode_ms": round(seconds * 1000, 2), "bytes": len(body)}
+        line = f"  {name:<10} {seconds * 1000:10.2f} {len(body):10d}"
+        for coding in codings:
+            compress_seconds, compressed = timed(lambda: serialization.compress(body, coding), args.repeat)
+            entry[coding] = {"bytes": len(compressed), "compress_ms": round(compress_seconds * 1000, 2)}
+            line += f" {len(compressed):11d} {compress_seconds * 1000:8.2f}"
+        results["cases"][name] = entry
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
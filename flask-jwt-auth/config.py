@@ -3,6 +3,8 @@ from datetime import timedelta
 from dotenv import load_dotenv
 load_dotenv()
 
+basedir = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
@@ -13,3 +15,143 @@ class Config:
     REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.getenv("REFRESH_EXPIRES_DAYS", "60")))
 
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+    # PostgreSQL connection used by the raw psycopg2 paths
+    DB_CONFIG = {
+        "dbname": os.getenv("DB_NAME", "postgres"),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", "1234"),
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", "5432")),
+    }
+
+    # Connection pool sizing, shared by psycopg2 and the SQLAlchemy engine
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+
+    # Async serving mode (asgi.py): /auth/chat, /auth/chat/stream,
+    # /auth/api/chart and /auth/notifications/stream run on one event loop with
+    # these pools; every other route runs on the Flask app in
+    # ASYNC_WSGI_THREADS threads, which caps the Flask requests in flight
+    ASYNC_DB_POOL_MIN = int(os.getenv("ASYNC_DB_POOL_MIN", "2"))
+    ASYNC_DB_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", "20"))
+    ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "500"))
+    ASYNC_WSGI_THREADS = int(os.getenv("ASYNC_WSGI_THREADS", "32"))
+
+    # Outgoing mail (app/mail.py): queued in email_outbox, sent by mailer.py
+    SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    # Credentials come from the environment or .env, never from this file.
+    # Login is skipped when SMTP_USER is empty (e.g. a local relay)
+    SMTP_USER = os.getenv("SMTP_USER", "")
+    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+    # Defaults to SMTP_USER when unset
+    MAIL_SENDER = os.getenv("MAIL_SENDER", "")
+    MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+    MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "1"))
+    # Claimed rows are hidden from other senders this long; keep it above the
+    # time one batch takes to send
+    MAIL_LEASE_SECONDS = float(os.getenv("MAIL_LEASE_SECONDS", "300"))
+    # The SMTP session is closed after this many idle seconds and reopened on demand
+    MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "60"))
+    # Retry delay doubles from MAIL_RETRY_BASE up to MAIL_RETRY_MAX seconds
+    MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "8"))
+    MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", "30"))
+    MAIL_RETRY_MAX = float(os.getenv("MAIL_RETRY_MAX", "3600"))
+
+    # Requests slower than this are logged with their SQL and upstream breakdown
+    # (app/metrics.py); 0 disables the log
+    SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+    SLOW_REQUEST_TOP_QUERIES = int(os.getenv("SLOW_REQUEST_TOP_QUERIES", "5"))
+
+    # Seconds a stock_data snapshot may be served before it is rebuilt even
+    # without a local version bump (covers writes from other processes)
+    QUOTE_SNAPSHOT_MAX_AGE = float(os.getenv("QUOTE_SNAPSHOT_MAX_AGE", "30"))
+
+    # Ollama embedding service
+    OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+    EMBED_MODEL = os.getenv("EMBED_MODEL", "nomic-embed-text")
+    EMBED_DIM = int(os.getenv("EMBED_DIM", "768"))
+    EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "60"))
+    EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+    # Directory for the persistent embedding cache; set to "" to disable it
+    EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(basedir, "instance", "embedding_cache"))
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+    EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    # Ollama's /api/embed batches texts but returns L2-normalized vectors, unlike
+    # /api/embeddings; only enable it once stored vectors were built the same way
+    EMBED_BATCH_ENDPOINT = os.getenv("EMBED_BATCH_ENDPOINT", "false").lower() == "true"
+
+    # Threads used to run the chat history and document lookups in parallel
+    CHAT_RETRIEVAL_WORKERS = int(os.getenv("CHAT_RETRIEVAL_WORKERS", "8"))
+
+    # Semantic answer cache in front of the completion (app/answer_cache.py);
+    # ANSWER_CACHE_SIZE=0 disables it
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    # Minimum cosine similarity between questions for a cached answer to be reused
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "900"))
+    # Seconds between checks of stock_documents for new documents
+    ANSWER_CACHE_DOCUMENTS_CHECK = float(os.getenv("ANSWER_CACHE_DOCUMENTS_CHECK", "60"))
+
+    # Vector search: "pgvector" (HNSW/IVFFlat indexes in Postgres) or "local"
+    # (in-process IVF index over memory-mapped files, no pgvector required)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pgvector")
+    VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(basedir, "instance", "vector_index"))
+    # Per-query recall/speed knobs: hnsw.ef_search and ivfflat.probes
+    VECTOR_EF_SEARCH = int(os.getenv("VECTOR_EF_SEARCH", "40"))
+    VECTOR_PROBES = int(os.getenv("VECTOR_PROBES", "10"))
+
+    # Marketstack market data
+    MARKET_API_KEY = os.getenv("MARKET_STACK_API_KEY", "your_api_key_here")
+    MARKETSTACK_BASE_URL = os.getenv("MARKETSTACK_BASE_URL", "https://api.marketstack.com/v2")
+    MARKETSTACK_TIMEOUT = float(os.getenv("MARKETSTACK_TIMEOUT", "10"))
+    # Token bucket shared by every upstream call in a process
+    MARKETSTACK_RATE = float(os.getenv("MARKETSTACK_RATE", "5"))
+    MARKETSTACK_BURST = int(os.getenv("MARKETSTACK_BURST", "5"))
+    # How long a cached raw response may be served by /auth/api/chart
+    MARKET_EOD_MAX_AGE = int(os.getenv("MARKET_EOD_MAX_AGE", "21600"))
+    MARKET_INTRADAY_MAX_AGE = int(os.getenv("MARKET_INTRADAY_MAX_AGE", "300"))
+    # In-process cache of /api/chart responses, in seconds per interval
+    # (0 disables it; concurrent identical requests are coalesced regardless)
+    CHART_CACHE_TTL_INTRADAY = int(os.getenv("CHART_CACHE_TTL_INTRADAY", "15"))
+    CHART_CACHE_TTL_EOD = int(os.getenv("CHART_CACHE_TTL_EOD", "3600"))
+    CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "2000"))
+
+    # Background ingestion worker (ingest.py)
+    INGEST_INTERVAL = float(os.getenv("INGEST_INTERVAL", "60"))
+    INGEST_HISTORY_LIMIT = int(os.getenv("INGEST_HISTORY_LIMIT", "365"))
+    # /auth/stocks/history backfills a quoted symbol with no bars at most once
+    # per this many seconds, whether or not the fetch found anything
+    HISTORY_BACKFILL_RETRY_SECONDS = float(os.getenv("HISTORY_BACKFILL_RETRY_SECONDS", "3600"))
+    HISTORY_BACKFILL_CACHE_SIZE = int(os.getenv("HISTORY_BACKFILL_CACHE_SIZE", "10000"))
+
+    # Push notifications (/auth/notifications/stream)
+    # Seconds between SSE heartbeat comments on an idle stream
+    NOTIFY_HEARTBEAT = float(os.getenv("NOTIFY_HEARTBEAT", "15"))
+    # Missed notifications replayed when a client resumes with Last-Event-ID
+    NOTIFY_BACKLOG_LIMIT = int(os.getenv("NOTIFY_BACKLOG_LIMIT", "100"))
+    # Events buffered per subscriber before a slow client is disconnected
+    NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "256"))
+
+    # Notification retention job (retention.py)
+    # Days a notification is kept; 0 keeps a type forever
+    NOTIFY_TTL_DAYS = float(os.getenv("NOTIFY_TTL_DAYS", "30"))
+    # Per-type overrides, e.g. "price_alert=7,ai_signal=30,risk_alert=90"
+    NOTIFY_TTL_BY_TYPE = os.getenv("NOTIFY_TTL_BY_TYPE", "price_alert=7")
+    # Rows deleted per transaction, and the pause between batches
+    NOTIFY_RETENTION_BATCH = int(os.getenv("NOTIFY_RETENTION_BATCH", "5000"))
+    NOTIFY_RETENTION_PAUSE = float(os.getenv("NOTIFY_RETENTION_PAUSE", "0.1"))
+    NOTIFY_RETENTION_INTERVAL = float(os.getenv("NOTIFY_RETENTION_INTERVAL", "3600"))
+    # Largest page /auth/api/notifications returns
+    NOTIFY_PAGE_MAX = int(os.getenv("NOTIFY_PAGE_MAX", "100"))
+
+    # Technical indicators (app/indicators.py), computed from daily price_bars
+    INDICATOR_LOOKBACK = int(os.getenv("INDICATOR_LOOKBACK", "400"))
+    # Seconds between incremental refreshes and full rebuilds of the state
+    INDICATOR_REFRESH_SECONDS = float(os.getenv("INDICATOR_REFRESH_SECONDS", "60"))
+    INDICATOR_RELOAD_SECONDS = float(os.getenv("INDICATOR_RELOAD_SECONDS", "3600"))
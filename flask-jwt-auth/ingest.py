@@ -0,0 +1,4 @@
+from app.ingestion import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Index notifications for per-user reads and retention deletes
+
+Revision ID: a7e19c4d2b58
+Revises: f4c2a9d71e36
+Create Date: 2026-10-18 17:21:09.463118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e19c4d2b58'
+down_revision = 'f4c2a9d71e36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Unread badge / single_notify: WHERE user_id AND is_read ORDER BY created_at DESC LIMIT n
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_user_read_created "
+        "ON notifications (user_id, is_read, created_at DESC)"
+    )
+    # Full list (both read states): WHERE user_id ORDER BY created_at DESC LIMIT n
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_user_created "
+        "ON notifications (user_id, created_at DESC)"
+    )
+    # Retention job: per-type range deletes and the loose scan over types
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_type_created "
+        "ON notifications (type, created_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_notifications_type_created")
+    op.execute("DROP INDEX IF EXISTS ix_notifications_user_created")
+    op.execute("DROP INDEX IF EXISTS ix_notifications_user_read_created")
@@ -0,0 +1,57 @@
+"""Add ANN indexes on chat_messages and stock_documents embeddings
+
+Revision ID: b7d41e2c9a10
+Revises: 39569d1183f9
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+import os
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d41e2c9a10'
+down_revision = '39569d1183f9'
+branch_labels = None
+depends_on = None
+
+# VECTOR_INDEX_TYPE=ivfflat builds IVFFlat instead of HNSW (faster to build,
+# lower recall at the same latency); lists should be ~rows/1000.
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw")
+HNSW_M = int(os.getenv("VECTOR_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", "64"))
+IVFFLAT_LISTS = int(os.getenv("VECTOR_IVFFLAT_LISTS", "100"))
+
+# (index name, table, operator class matching the operator used by the queries)
+INDEXES = [
+    ('chat_messages_embedding_idx', 'chat_messages', 'vector_cosine_ops'),
+    ('stock_documents_embedding_idx', 'stock_documents', 'vector_l2_ops'),
+]
+
+
+def _table_exists(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    if INDEX_TYPE == 'ivfflat':
+        method = 'ivfflat'
+        options = f"lists = {IVFFLAT_LISTS}"
+    else:
+        method = 'hnsw'
+        options = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+
+    for name, table, opclass in INDEXES:
+        # stock_documents is loaded outside of these migrations
+        if not _table_exists(table):
+            continue
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            f"USING {method} (embedding {opclass}) WITH ({options})"
+        )
+
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,43 @@
+"""Add email_outbox for the background mail sender
+
+Revision ID: c3f8a2e6d914
+Revises: a7e19c4d2b58
+Create Date: 2026-10-18 18:40:12.305517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a2e6d914'
+down_revision = 'a7e19c4d2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Naive UTC timestamps, like the model's datetime.utcnow defaults
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.BigInteger(), primary_key=True),
+        sa.Column('recipient', sa.String(length=200), nullable=False),
+        sa.Column('subject', sa.String(length=200), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=sa.text("(now() AT TIME ZONE 'utc')")),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text("(now() AT TIME ZONE 'utc')")),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+    )
+    # The sender only ever scans due, pending rows
+    op.execute(
+        "CREATE INDEX ix_email_outbox_pending ON email_outbox (next_attempt_at) "
+        "WHERE status = 'pending'"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_email_outbox_pending")
+    op.drop_table('email_outbox')
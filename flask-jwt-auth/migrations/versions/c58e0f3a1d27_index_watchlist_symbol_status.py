@@ -0,0 +1,28 @@
+"""Index watchlist by symbol for notification fan-out
+
+Revision ID: c58e0f3a1d27
+Revises: b7d41e2c9a10
+Create Date: 2026-10-18 11:04:52.718340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58e0f3a1d27'
+down_revision = 'b7d41e2c9a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Price-change fan-out joins changed symbols to their watchers
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_watchlist_history_symbol_status "
+        "ON watchlist_selected_item_history (symbol_name, status)"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_watchlist_history_symbol_status")
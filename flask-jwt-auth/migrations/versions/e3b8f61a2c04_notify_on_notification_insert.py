@@ -0,0 +1,46 @@
+"""Announce new notifications with NOTIFY
+
+Revision ID: e3b8f61a2c04
+Revises: d91a7c4be3f5
+Create Date: 2026-10-18 14:21:09.511274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b8f61a2c04'
+down_revision = 'd91a7c4be3f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # One NOTIFY per INSERT statement, carrying the inserted id range, so a
+    # fan-out of thousands of rows costs one message. Delivered on commit.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_notification_insert() RETURNS trigger AS $$
+        DECLARE
+            first_id integer;
+            last_id integer;
+        BEGIN
+            SELECT min(id), max(id) INTO first_id, last_id FROM new_rows;
+            IF first_id IS NOT NULL THEN
+                PERFORM pg_notify('notification_events', first_id || ':' || last_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER notifications_notify_insert
+        AFTER INSERT ON notifications
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_notification_insert()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS notifications_notify_insert ON notifications")
+    op.execute("DROP FUNCTION IF EXISTS notify_notification_insert()")
@@ -0,0 +1,47 @@
+"""Add price_bars OHLC time series, partitioned by year
+
+Revision ID: f4c2a9d71e36
+Revises: e3b8f61a2c04
+Create Date: 2026-10-18 15:02:37.840195
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c2a9d71e36'
+down_revision = 'e3b8f61a2c04'
+branch_labels = None
+depends_on = None
+
+FIRST_YEAR = 2000
+LAST_YEAR = 2035
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE price_bars (
+            symbol varchar(30) NOT NULL,
+            bar_interval varchar(10) NOT NULL,
+            ts timestamptz NOT NULL,
+            open double precision NOT NULL,
+            high double precision NOT NULL,
+            low double precision NOT NULL,
+            close double precision NOT NULL,
+            volume bigint,
+            PRIMARY KEY (symbol, bar_interval, ts)
+        ) PARTITION BY RANGE (ts)
+    """)
+    # One partition per year keeps range scans and retention (DROP TABLE of an
+    # old year) cheap; the default partition catches anything outside the range
+    for year in range(FIRST_YEAR, LAST_YEAR + 1):
+        op.execute(
+            f"CREATE TABLE price_bars_{year} PARTITION OF price_bars "
+            f"FOR VALUES FROM ('{year}-01-01 00:00+00') TO ('{year + 1}-01-01 00:00+00')"
+        )
+    op.execute("CREATE TABLE price_bars_default PARTITION OF price_bars DEFAULT")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS price_bars CASCADE")
@@ -0,0 +1,4 @@
+from app.vector_index import main
+
+if __name__ == '__main__':
+    main()
@@ -47,11 +47,66 @@ export default function NotificationBell() {
     return `${days}d ago`;
   };
 
-  // Fetch on mount + poll every 30s
+  // Fetch on mount, then receive new notifications over SSE
   useEffect(() => {
+    const controller = new AbortController();
+    let lastEventId = null;
+    let retryTimer = null;
+
+    const handleEvent = (block) => {
+      let id = null;
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('id:')) id = line.slice(3).trim();
+        else if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (event !== 'notification' || !data) return;
+      const notification = JSON.parse(data);
+      lastEventId = id;
+      setNotifications((prev) =>
+        prev.some((n) => n.id === notification.id) ? prev : [notification, ...prev].slice(0, 10)
+      );
+      if (!notification.is_read) setUnreadCount((count) => count + 1);
+    };
+
+    const connect = async () => {
+      try {
+        const token = localStorage.getItem('access_token');
+        const headers = { 'Authorization': `Bearer ${token}` };
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+        const res = await fetch('http://localhost:5000/auth/notifications/stream', {
+          headers,
+          signal: controller.signal,
+        });
+        if (!res.ok) throw new Error('Notification stream failed');
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const blocks = buffer.split('\n\n');
+          buffer = blocks.pop();
+          blocks.forEach(handleEvent);
+        }
+      } catch (err) {
+        if (controller.signal.aborted) return;
+        console.error('Notification stream error:', err);
+      }
+      // Stream ended (server restart, overflow reset): resume from the last id
+      retryTimer = setTimeout(connect, 3000);
+    };
+
     fetchNotifications();
-    const interval = setInterval(fetchNotifications, 30000);
-    return () => clearInterval(interval);
+    connect();
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+    };
   }, []);
 
   // Close dropdown if clicked outside
@@ -58,7 +58,7 @@ export default function Trading() {
         quantity: item.quantity,
         avgPrice: Number(item.avg_price ?? 0),
         currentPrice: Number(item.current_price ?? 0),
-        profit: Number(item.profit_loss ?? 0),
+        profit: Number(item.unrealized_pnl ?? item.profit_loss ?? 0),
       }));
 
       const totalInvestment = holdings.reduce(
@@ -107,26 +107,16 @@ export default function Watchlist() {
     if (!authHeaders) return;
 
     try {
-      const res = await fetch(`${API_BASE}/auth/favorite-stocks`, { headers: authHeaders });
+      // One request: the watchlist with each symbol's quote attached
+      const res = await fetch(`${API_BASE}/auth/favorite-stocks?expand=quote`, { headers: authHeaders });
       if (!res.ok) throw new Error("Favorite stocks fetch failed");
       const data = await res.json();
 
       // Filter only selected favorites
       const selectedFavorites = data.filter(fav => fav.status === 'selected');
-
-      // Fetch full stock data for each favorite
-      const favoriteStockData = [];
-      for (const fav of selectedFavorites) {
-        try {
-          const stockRes = await fetch(`${API_BASE}/auth/stock/${fav.symbol}`, { headers: authHeaders });
-          if (stockRes.ok) {
-            const stockData = await stockRes.json();
-            favoriteStockData.push(stockData);
-          }
-        } catch (err) {
-          console.error(`Failed to fetch stock data for ${fav.symbol}:`, err);
-        }
-      }
+      const favoriteStockData = selectedFavorites
+        .map(fav => fav.quote)
+        .filter(Boolean);
 
       setFavoriteStocks(favoriteStockData);
       setFavoriteSymbols(selectedFavorites.map(fav => fav.symbol.toUpperCase()));